@@ -3,6 +3,12 @@ ASGI config for WellLog project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving the site through ASGI (see "Deploying with ASGI" in the README) lets
+the async views, such as AI advice generation, wait for slow upstream calls
+on the event loop instead of holding a worker process or thread. Every
+middleware in settings.MIDDLEWARE is async-capable, so requests stay on the
+event loop until they reach a synchronous view.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -40,7 +40,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # WhiteNoise, able to run in an async middleware chain (see WellLog/asgi.py)
+    "WellLog.middleware.AsyncWhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     # "debug_toolbar.middleware.DebugToolbarMiddleware",  # Django Debug Toolbar
@@ -75,6 +76,7 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 
 WSGI_APPLICATION = 'WellLog.wsgi.application'
+ASGI_APPLICATION = 'WellLog.asgi.application'
 
 DATABASES = {
     'default': {
@@ -84,6 +86,10 @@ DATABASES = {
         'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
         'HOST': os.environ.get('DATABASE_HOST', ''),
         'PORT': os.environ.get('DATABASE_PORT', ''),
+        # Keep connections open between requests, and in the ANALYSIS_FETCH_WORKERS threads between
+        # fetches, instead of opening one per request and per advice source; checked before reuse
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
         'TEST': {
             'NAME': 'test',
             'SERIALIZE': False,
@@ -93,6 +99,25 @@ DATABASES = {
     }
 }
 
+# Shared by every web worker and the import job runner, so a write invalidates cached history pages
+# in all of them (create the table with `python manage.py createcachetable`).
+# A user holds 7 version keys plus one snapshot per history page and date range viewed within
+# HEALTH_HISTORY_CACHE_TIMEOUT, about 40 entries for an active hour, so MAX_ENTRIES keeps the
+# snapshots of some 2,500 users active in the same hour. Past it, expired entries and then a third
+# of the rest (CULL_FREQUENCY) are deleted; Django's default of 300 entries would cull them almost
+# at once. Every set (one per saved record) also counts the table's rows: on a busy site, use a
+# Redis or Memcached backend instead (health/cache.py only needs get, set and add).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CULL_FREQUENCY': 3,
+        },
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -143,12 +168,58 @@ ACCOUNT_AUTHENTICATION_METHOD = "email"
 ACCOUNT_EMAIL_REQUIRED = True
 ACCOUNT_UNIQUE_EMAIL = True
 
+# Maximum number of points sent to a health history chart (longer series are downsampled)
+HEALTH_CHART_MAX_POINTS = 365
+
+# Seconds a health history page's stats and chart series stay cached (writes invalidate them sooner)
+HEALTH_HISTORY_CACHE_TIMEOUT = 60 * 60
+# History pages are not cached in a process-local cache (LocMemCache), where a write would only
+# invalidate the copy of the process handling it, unless this is set (a single process, e.g. runserver)
+HEALTH_HISTORY_CACHE_LOCAL_MEMORY = False
+
+# Run CSV import jobs in a thread of the web worker that received the upload. Set to False to
+# leave them to `python manage.py run_import_jobs --poll 5` instead.
+HEALTH_IMPORT_IN_PROCESS = True
+
+# Running import jobs whose worker sent no heartbeat (one per written batch) for this many seconds
+# are marked as failed, e.g. after the web worker running them was restarted
+HEALTH_IMPORT_STALE_AFTER = 15 * 60
+
+# Import jobs of plain CSV files of at least this many bytes are parsed by a pool of this many
+# processes (fewer than 2 always parses in the job's own thread). Off until the throughput of the
+# pool has been measured on a multi-core host: on the single core measured so far it was slower
+HEALTH_IMPORT_PARALLEL_WORKERS = 0
+HEALTH_IMPORT_PARALLEL_MIN_SIZE = 32 * 1024 * 1024
+
+# Threads fetching the AI advice data sources concurrently, shared by all requests (each keeps a
+# database connection open for CONN_MAX_AGE seconds, so a process holds at most this many more)
+ANALYSIS_FETCH_WORKERS = 9
+
+# Seconds generated AI advice is returned again, instead of asking the AI service, while the user's
+# statistics are unchanged (0 always generates new advice)
+ANALYSIS_ADVICE_CACHE_TTL = 24 * 60 * 60
+
+# AI service calls (see analysis/llm.py): calls in flight per process (more wait for a slot, at most
+# the queue timeout in seconds), attempts after a failed call, and pooled keep-alive connections
+ANALYSIS_LLM_BASE_URL = 'https://api.deepseek.com'
+ANALYSIS_LLM_MAX_CONCURRENCY = 20
+ANALYSIS_LLM_QUEUE_TIMEOUT = 10.0
+ANALYSIS_LLM_MAX_RETRIES = 2
+ANALYSIS_LLM_MAX_CONNECTIONS = 20
+# Keep one client, with the pool and the limit above, per event loop. Only for ASGI, where a process
+# has one long-lived loop: under WSGI every request has a loop of its own, and each call uses a
+# client of its own that is closed afterwards
+ANALYSIS_LLM_SHARED_CLIENT = False
+
 # Media files (Images, Videos, etc.)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
+# Files uploaded for import jobs (see health/storage.py): outside MEDIA_ROOT, so they are never served
+HEALTH_IMPORT_ROOT = os.path.join(BASE_DIR, 'private')
+
 ALIYUN_OSS = {
     'ACCESS_KEY_ID': os.environ.get('ALIYUN_ACCESS_KEY_ID', ''),
     'ACCESS_KEY_SECRET': os.environ.get('ALIYUN_ACCESS_KEY_SECRET', ''),
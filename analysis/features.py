@@ -0,0 +1,337 @@
+"""Health data the AI advice prompt is built from, fetched concurrently.
+
+The advice needs nine independent lookups: the seven record types of the
+last 30 days, the user's profile and their health goal. ``gather_advice_data``
+runs them at the same time with ``asyncio.gather``. They do not go through
+thread-sensitive ``sync_to_async``, which runs every call on one shared
+thread, one after another; each runs on ``FETCH_EXECUTOR`` instead, a small
+thread pool whose threads each keep their own database connection. As Django
+does around requests, a connection is only closed between fetches once it is
+broken or older than ``CONN_MAX_AGE``; with the default of 0 every fetch
+would open and close a connection of its own. So the stage takes about as
+long as its slowest query rather than the sum of all nine.
+
+Every source's latency is measured in its thread and returned with the
+data; the advice view logs it and sends it in a ``Server-Timing`` header.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from health.models import (
+    RunningRecord, 
+    StepsRecord, 
+    SleepRecord, 
+    DietRecord, 
+    MoodRecord,
+    TrainingRecord,
+    HealthGoal,
+    WeightRecord
+)
+
+# Threads (and so at most this many database connections) fetching advice data, shared by all requests
+FETCH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ANALYSIS_FETCH_WORKERS', 9), thread_name_prefix='advice-fetch'
+)
+
+def get_running_data(user, start_date):
+    """Get running records data for a user since start_date"""
+    return list(RunningRecord.objects.filter(
+        user=user, 
+        date__gte=start_date
+    ).order_by('-date').values('id', 'date', 'distance', 'duration_minutes', 'calories_burned'))
+
+def get_sleep_data(user, start_date):
+    """Get sleep records data for a user since start_date"""
+    return list(SleepRecord.objects.filter(
+        user=user, 
+        date__gte=start_date
+    ).order_by('-date').values('id', 'date', 'hours', 'minutes', 'quality'))
+
+def get_steps_data(user, start_date):
+    """Get steps records data for a user since start_date"""
+    return list(StepsRecord.objects.filter(
+        user=user, 
+        date__gte=start_date
+    ).order_by('-date').values('id', 'date', 'steps_count'))
+
+def get_diet_data(user, start_date):
+    """Get diet records data for a user since start_date"""
+    return list(DietRecord.objects.filter(
+        user=user, 
+        date__gte=start_date
+    ).order_by('-date').values('id', 'date', 'calories', 'protein', 'carbs', 'fat'))
+
+def get_mood_data(user, start_date):
+    """Get mood records data for a user since start_date"""
+    return list(MoodRecord.objects.filter(
+        user=user, 
+        date__gte=start_date
+    ).order_by('-date').values('id', 'date', 'mood', 'stress_level'))
+
+def get_training_data(user, start_date):
+    """Get training records data for a user since start_date"""
+    return list(TrainingRecord.objects.filter(
+        user=user, 
+        date__gte=start_date
+    ).order_by('-date').values('id', 'date', 'exercise_type', 'sets', 'reps', 'weight', 'duration_minutes'))
+
+def get_weight_data(user, start_date):
+    """Get weight records data for a user since start_date"""
+    weight_records = list(WeightRecord.objects.filter(
+        user=user, 
+        date__gte=start_date
+    ).order_by('-date').values('id', 'date', 'weight', 'height', 'notes'))
+    
+    # Calculate BMI
+    for record in weight_records:
+        if record['height'] and record['weight']:
+            # BMI = weight(kg) / (height(m))^2
+            height_in_meters = record['height'] / 100
+            record['bmi'] = round(record['weight'] / (height_in_meters * height_in_meters), 1)
+    
+    return weight_records
+
+def get_profile(user):
+    """Get the user's profile, creating it if the user has none"""
+    from accounts.models import Profile
+    profile, _ = Profile.objects.get_or_create(user=user)
+    return profile
+
+def get_health_goal(user):
+    """Get the user's health goal, or None if they have not set one"""
+    try:
+        return HealthGoal.objects.get(user=user)
+    except (HealthGoal.DoesNotExist, HealthGoal.MultipleObjectsReturned):
+        return None
+
+# Source name -> fetch function taking (user, start_date)
+ADVICE_SOURCES = {
+    'running': get_running_data,
+    'sleep': get_sleep_data,
+    'steps': get_steps_data,
+    'diet': get_diet_data,
+    'mood': get_mood_data,
+    'training': get_training_data,
+    'weight_records': get_weight_data,
+    'profile': lambda user, start_date: get_profile(user),
+    'goal': lambda user, start_date: get_health_goal(user),
+}
+
+def _timed_fetch(fetch, user, start_date):
+    """Run one fetch in an executor thread; return its result and latency in milliseconds"""
+    # Drops the thread's connection only if it is broken or has outlived CONN_MAX_AGE
+    close_old_connections()
+    started = time.perf_counter()
+    try:
+        return fetch(user, start_date), (time.perf_counter() - started) * 1000
+    finally:
+        close_old_connections()
+
+async def gather_advice_data(user, start_date):
+    """Fetch every advice source concurrently
+    
+    Returns (data, timings): the result of every source by name, and the
+    latency of every source in milliseconds plus 'total' for the whole stage.
+    """
+    started = time.perf_counter()
+    fetch = sync_to_async(_timed_fetch, thread_sensitive=False, executor=FETCH_EXECUTOR)
+    results = await asyncio.gather(*(fetch(source, user, start_date) for source in ADVICE_SOURCES.values()))
+    
+    data = {}
+    timings = {}
+    for name, (result, elapsed) in zip(ADVICE_SOURCES, results):
+        data[name] = result
+        timings[name] = elapsed
+    timings['total'] = (time.perf_counter() - started) * 1000
+    return data, timings
+
+def server_timing(timings):
+    """Server-Timing header value for the latencies of gather_advice_data"""
+    return ', '.join(f'{name};dur={elapsed:.1f}' for name, elapsed in timings.items())
+
+def advice_features(data):
+    """Statistics the advice prompt is filled in with, computed from the data of gather_advice_data"""
+    running_data = data['running']
+    sleep_data = data['sleep']
+    steps_data = data['steps']
+    diet_data = data['diet']
+    mood_data = data['mood']
+    training_data = data['training']
+    weight_data = data['weight_records']
+
+    # Convert date objects to strings
+    for data_list in [running_data, sleep_data, steps_data, diet_data, mood_data, training_data, weight_data]:
+        for item in data_list:
+            if 'date' in item:
+                item['date'] = item['date'].strftime('%Y-%m-%d')
+
+    # Calculate user data statistics to fill in the prompt
+    # Get user information
+    user_profile = data['profile']
+
+    user_age = user_profile.age if hasattr(user_profile, 'age') else "Unknown"
+    user_gender = user_profile.get_gender_display() if hasattr(user_profile, 'gender') else "Unknown"
+
+    # Get the latest weight record
+    latest_weight = None
+    height = None
+    bmi = None
+    if len(data['weight_records']) > 0:
+        latest_weight = data['weight_records'][0].get('weight', None)
+        height = data['weight_records'][0].get('height', None)
+        bmi = data['weight_records'][0].get('bmi', None)
+
+    # Calculate average steps
+    avg_steps = 0
+    if len(steps_data) > 0:
+        avg_steps = sum(item.get('steps_count', 0) for item in steps_data) // len(steps_data)
+
+    # Calculate average sleep
+    avg_sleep_hours = 0
+    if len(sleep_data) > 0:
+        avg_sleep_hours = sum(item.get('hours', 0) for item in sleep_data) / len(sleep_data)
+        avg_sleep_minutes = sum(item.get('minutes', 0) for item in sleep_data) / len(sleep_data)
+        avg_sleep_hours += avg_sleep_minutes / 60
+        avg_sleep_hours = round(avg_sleep_hours, 1)
+
+    # Calculate running data
+    avg_running_distance = 0
+    avg_running_pace = 0
+    running_sessions = len(running_data)
+    if running_sessions > 0:
+        avg_running_distance = sum(item.get('distance', 0) for item in running_data) / running_sessions
+        avg_running_distance = round(avg_running_distance, 1)
+        # Calculate average pace (minutes/km)
+        if sum(item.get('distance', 0) for item in running_data) > 0:
+            total_minutes = sum(item.get('duration_minutes', 0) for item in running_data)
+            total_distance = sum(item.get('distance', 0) for item in running_data)
+            avg_running_pace = total_minutes / total_distance
+            avg_running_pace = round(avg_running_pace, 1)
+
+    # Calculate diet data
+    avg_calories = 0
+    avg_protein = 0
+    if len(diet_data) > 0:
+        avg_calories = sum(item.get('calories', 0) for item in diet_data) // len(diet_data)
+        protein_values = [item.get('protein', 0) for item in diet_data if item.get('protein') is not None]
+        if protein_values:
+            avg_protein = sum(protein_values) / len(protein_values)
+            avg_protein = round(avg_protein, 1)
+
+    # Calculate training frequency
+    training_sessions = len(training_data)
+
+    # Calculate active days (any one activity record day)
+    all_dates = set()
+    for data_list in [running_data, steps_data, training_data]:
+        all_dates.update(item.get('date') for item in data_list)
+    active_days = len(all_dates)
+
+    # Get main mood status
+    predominant_mood = "Not recorded"
+    if len(mood_data) > 0:
+        mood_counts = {}
+        for item in mood_data:
+            mood = item.get('mood')
+            if mood:
+                mood_counts[mood] = mood_counts.get(mood, 0) + 1
+        if mood_counts:
+            predominant_mood = max(mood_counts.items(), key=lambda x: x[1])[0]
+
+    # Get target value
+    health_goal = data['goal']
+    if health_goal is not None:
+        weight_target = health_goal.target_weight
+        steps_target = health_goal.daily_steps_goal
+        sleep_target_hours = health_goal.daily_sleep_hours_goal
+        sleep_target_minutes = health_goal.daily_sleep_minutes_goal
+        running_distance_goal = health_goal.weekly_running_distance_goal
+        training_sessions_goal = health_goal.weekly_training_sessions_goal
+        calories_goal = health_goal.daily_calories_goal
+
+        # Calculate the difference from the target
+        weight_diff = ""
+        if latest_weight and weight_target:
+            diff = latest_weight - weight_target
+            weight_diff = f"+{diff:.1f}" if diff > 0 else f"{diff:.1f}"
+    else:
+        weight_target = "Not set"
+        steps_target = "Not set"
+        sleep_target_hours = "Not set"
+        sleep_target_minutes = "Not set"
+        running_distance_goal = "Not set"
+        training_sessions_goal = "Not set"
+        calories_goal = "Not set"
+        weight_diff = "Unknown"
+
+    # Calculate sleep target complete representation
+    sleep_target = "Not set"
+    if sleep_target_hours != "Not set":
+        sleep_target = f"{sleep_target_hours}h {sleep_target_minutes}min"
+
+    # Determine user achievements
+    achievements = []
+    if avg_steps > 0 and steps_target != "Not set" and avg_steps >= steps_target:
+        achievements.append(f"Average steps reached target ({avg_steps} steps/day)")
+    if running_sessions > 0:
+        achievements.append(f"Maintain running habit (Weekly {running_sessions} times)")
+    if avg_sleep_hours > 7:
+        achievements.append(f"Good sleep time (Average {avg_sleep_hours} hours/night)")
+    if latest_weight and weight_target and abs(latest_weight - weight_target) < 3:
+        achievements.append(f"Weight close to target value ({latest_weight} kg)")
+    if avg_calories > 0 and calories_goal != "Not set":
+        achievements.append(f"Maintain diet record habit")
+    if active_days >= 5:
+        achievements.append(f"Weekly maintain {active_days}/7 active days")
+
+    # If there are not enough achievements, add some default ones
+    if len(achievements) < 2:
+        if len(steps_data) > 0:
+            achievements.append("Continuous record steps data")
+        if len(sleep_data) > 0:
+            achievements.append("Continuous record sleep data")
+        if len(running_data) > 0:
+            achievements.append("Stick to running exercise")
+        if len(training_data) > 0:
+            achievements.append("Stick to strength training")
+
+    # Select top 3 achievements
+    achievements = achievements[:3]
+    achievements_text = ", ".join(achievements)
+    
+    return {
+        'achievements_text': achievements_text,
+        'user_age': user_age,
+        'user_gender': user_gender,
+        'height': height,
+        'latest_weight': latest_weight,
+        'bmi': bmi,
+        'weight_target': weight_target,
+        'weight_diff': weight_diff,
+        'steps_target': steps_target,
+        'sleep_target': sleep_target,
+        'running_distance_goal': running_distance_goal,
+        'training_sessions_goal': training_sessions_goal,
+        'calories_goal': calories_goal,
+        'avg_steps': avg_steps,
+        'avg_sleep_hours': avg_sleep_hours,
+        'running_sessions': running_sessions,
+        'avg_running_distance': avg_running_distance,
+        'avg_running_pace': avg_running_pace,
+        'training_sessions': training_sessions,
+        'avg_calories': avg_calories,
+        'avg_protein': avg_protein,
+        'predominant_mood': predominant_mood,
+        'active_days': active_days,
+    }
+
+def feature_hash(features):
+    """SHA-256 of the advice features: equal hashes mean the same prompt, so the same advice can be reused"""
+    return hashlib.sha256(json.dumps(features, sort_keys=True, default=str).encode()).hexdigest()
@@ -0,0 +1,264 @@
+"""Process-wide client for the AI service (DeepSeek's OpenAI-compatible API).
+
+``llm`` is shared by every request of the process instead of a new
+``AsyncOpenAI`` per request:
+
+* HTTP connections are pooled and kept alive (``httpx.Limits``), so repeat
+  calls skip the TCP and TLS handshakes;
+* at most ``ANALYSIS_LLM_MAX_CONCURRENCY`` calls are in flight; later ones
+  queue for a slot, and give up with ``LLMQueueTimeout`` after
+  ``ANALYSIS_LLM_QUEUE_TIMEOUT`` seconds;
+* connection errors, timeouts, rate limits and server errors are retried
+  up to ``ANALYSIS_LLM_MAX_RETRIES`` times with full-jitter exponential
+  backoff, so a burst of failed calls does not retry in lockstep;
+* ``metrics()`` reports the queue depth, in-flight calls, failures and the
+  latency of queueing, of upstream calls and, for streamed calls, of the
+  first content.
+
+Connections and semaphores belong to an event loop. Under ASGI the process
+has one long-lived loop, and with ``ANALYSIS_LLM_SHARED_CLIENT`` the client
+and the slots are kept for it, so the pool and the limit are process-wide.
+Under WSGI every request runs in a loop of its own that is thrown away
+afterwards: a kept client would keep the loop and its sockets alive, so
+each call uses a client of its own, closed when the call ends, and only the
+retries and metrics apply.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+
+import httpx
+from django.conf import settings
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
+
+# Failures worth another attempt (APIConnectionError includes timeouts)
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+# Latencies kept for the percentiles of metrics()
+LATENCY_SAMPLES = 1000
+
+
+class LLMQueueTimeout(Exception):
+    """No call slot became free within the queue timeout"""
+
+
+def _summary(samples):
+    """Count, mean, median, 95th percentile and maximum of latencies in milliseconds"""
+    if not samples:
+        return {'count': 0, 'avg_ms': None, 'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'avg_ms': round(sum(ordered) / len(ordered), 1),
+        'p50_ms': round(ordered[len(ordered) // 2], 1),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        'max_ms': round(ordered[-1], 1),
+    }
+
+
+class LLMClientManager:
+    """Pooled AsyncOpenAI clients with bounded concurrency, queueing, retries and metrics"""
+
+    def __init__(self, base_url, api_key=None, max_concurrency=20, queue_timeout=10.0, max_retries=2,
+                 backoff=0.5, max_backoff=8.0, max_connections=20, keepalive_expiry=60.0, request_timeout=30.0,
+                 shared=False):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.request_timeout = request_timeout
+        self.shared = shared
+        self._loops = weakref.WeakKeyDictionary()  # event loop -> (client, semaphore)
+        self._lock = threading.Lock()
+        self._counters = {'calls': 0, 'failures': 0, 'retries': 0, 'queue_timeouts': 0}
+        self._queued = 0
+        self._max_queued = 0
+        self._in_flight = 0
+        self._queue_waits = deque(maxlen=LATENCY_SAMPLES)
+        self._upstream = deque(maxlen=LATENCY_SAMPLES)
+        self._first_content = deque(maxlen=LATENCY_SAMPLES)
+
+    def _http_client(self):
+        return httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        ))
+
+    def _openai(self, http_client):
+        return AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            timeout=self.request_timeout,
+            # Retries are done here, with jitter
+            max_retries=0,
+            http_client=http_client,
+        )
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Loops closed since (the clients' sockets are closed with them once unreferenced)
+            for closed in [other for other in self._loops if other.is_closed()]:
+                del self._loops[closed]
+            state = self._loops.get(loop)
+            if state is None:
+                client = self._openai(self._http_client())
+                state = self._loops[loop] = (client, asyncio.Semaphore(self.max_concurrency))
+        return state
+
+    @asynccontextmanager
+    async def _call_state(self):
+        """(client, semaphore) of a call: the running loop's if clients are shared, else new ones closed afterwards"""
+        if self.shared:
+            yield self._loop_state()
+            return
+        http_client = self._http_client()
+        try:
+            yield self._openai(http_client), asyncio.Semaphore(self.max_concurrency)
+        finally:
+            await http_client.aclose()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    async def _acquire(self, semaphore):
+        """Take a call slot, waiting at most queue_timeout seconds if none is free"""
+        started = time.perf_counter()
+        if semaphore.locked():
+            with self._lock:
+                self._queued += 1
+                self._max_queued = max(self._max_queued, self._queued)
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._count('queue_timeouts')
+                raise LLMQueueTimeout(f"no AI service slot free within {self.queue_timeout:g}s") from None
+            finally:
+                with self._lock:
+                    self._queued -= 1
+        else:
+            await semaphore.acquire()
+        with self._lock:
+            self._in_flight += 1
+            self._queue_waits.append((time.perf_counter() - started) * 1000)
+
+    def _release(self, semaphore):
+        with self._lock:
+            self._in_flight -= 1
+        semaphore.release()
+
+    def backoff_delay(self, attempt):
+        """Full jitter: a random delay up to the exponential backoff of the attempt"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def _create(self, client, **kwargs):
+        """client.chat.completions.create, retried on RETRYABLE_ERRORS; return the result and its start time"""
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                return await client.chat.completions.create(**kwargs), started
+            except RETRYABLE_ERRORS as e:
+                self._record_upstream(started)
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    raise
+                delay = self.backoff_delay(attempt)
+                print(f"AI service call failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                self._count('retries')
+                attempt += 1
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Other API errors, and cancellation by the caller's timeout
+                self._record_upstream(started)
+                self._count('failures')
+                raise
+
+    async def chat(self, **kwargs):
+        """Create a chat completion (the arguments of client.chat.completions.create) in a call slot"""
+        async with self._call_state() as (client, semaphore):
+            await self._acquire(semaphore)
+            try:
+                self._count('calls')
+                response, started = await self._create(client, **kwargs)
+                self._record_upstream(started)
+                return response
+            finally:
+                self._release(semaphore)
+
+    async def stream_chat(self, **kwargs):
+        """Yield the content of a streamed chat completion piece by piece, in a call slot
+
+        Opening the stream is retried like chat(); an error once content has
+        been yielded is raised to the caller, which has already used it.
+        """
+        async with self._call_state() as (client, semaphore):
+            await self._acquire(semaphore)
+            try:
+                self._count('calls')
+                stream, started = await self._create(client, stream=True, **kwargs)
+                first = True
+                try:
+                    async for chunk in stream:
+                        content = chunk.choices[0].delta.content if chunk.choices else None
+                        if not content:
+                            continue
+                        if first:
+                            first = False
+                            with self._lock:
+                                self._first_content.append((time.perf_counter() - started) * 1000)
+                        yield content
+                except Exception:
+                    self._count('failures')
+                    raise
+                finally:
+                    self._record_upstream(started)
+                    await stream.close()
+            finally:
+                self._release(semaphore)
+
+    def _record_upstream(self, started):
+        with self._lock:
+            self._upstream.append((time.perf_counter() - started) * 1000)
+
+    def metrics(self):
+        """Queue depth, in-flight calls, counters and latencies of this process"""
+        with self._lock:
+            return {
+                'queued': self._queued,
+                'max_queued': self._max_queued,
+                'in_flight': self._in_flight,
+                'max_concurrency': self.max_concurrency,
+                'event_loops': len(self._loops),
+                **self._counters,
+                'queue_wait': _summary(self._queue_waits),
+                'upstream_latency': _summary(self._upstream),
+                'first_content_latency': _summary(self._first_content),
+            }
+
+
+def _create_manager():
+    return LLMClientManager(
+        base_url=getattr(settings, 'ANALYSIS_LLM_BASE_URL', 'https://api.deepseek.com'),
+        api_key=os.environ.get('AI_API_KEY'),
+        max_concurrency=getattr(settings, 'ANALYSIS_LLM_MAX_CONCURRENCY', 20),
+        queue_timeout=getattr(settings, 'ANALYSIS_LLM_QUEUE_TIMEOUT', 10.0),
+        max_retries=getattr(settings, 'ANALYSIS_LLM_MAX_RETRIES', 2),
+        max_connections=getattr(settings, 'ANALYSIS_LLM_MAX_CONNECTIONS', 20),
+        shared=getattr(settings, 'ANALYSIS_LLM_SHARED_CLIENT', False),
+    )
+
+
+# Used by the whole process
+llm = _create_manager()
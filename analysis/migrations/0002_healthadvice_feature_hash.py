@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='healthadvice',
+            options={'ordering': ['-created_at'], 'verbose_name': 'Health Advice', 'verbose_name_plural': 'Health Advice'},
+        ),
+        migrations.AddField(
+            model_name='healthadvice',
+            name='feature_hash',
+            field=models.CharField(blank=True, default='', help_text='Hash of the health statistics the advice was generated from', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='healthadvice',
+            name='content',
+            field=models.TextField(help_text='AI-generated health advice content'),
+        ),
+    ]
@@ -7,6 +7,8 @@ class HealthAdvice(models.Model):
     """Store AI-generated health advice"""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     content = models.TextField(help_text="AI-generated health advice content")
+    feature_hash = models.CharField(max_length=64, blank=True, default='',
+                                    help_text="Hash of the health statistics the advice was generated from")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -0,0 +1,64 @@
+"""Formatting of AI advice into paragraphs, all at once or as it is streamed.
+
+Advice is stored and shown as one ``<p>`` per paragraph of the model's
+text (paragraphs are separated by blank lines). ``ParagraphStream`` does the
+same split while the text is still arriving: every piece of text it returns
+belongs to a numbered paragraph, so the browser can append it to the right
+``<p>`` straight away, and once the stream is closed ``html()`` is exactly
+what ``format_advice`` returns for the whole text.
+"""
+import json
+
+
+def format_advice(text):
+    """Wrap every paragraph of the advice text in a <p> tag"""
+    formatted_advice = ""
+    for para in text.split('\n\n'):
+        if para.strip():
+            formatted_advice += f"<p>{para.strip()}</p>"
+    return formatted_advice
+
+
+class ParagraphStream:
+    """Split streamed advice text into paragraphs piece by piece
+
+    ``feed`` and ``close`` return (paragraph index, text) pieces. Whitespace
+    that may still turn out to end a paragraph is held back until the text
+    after it arrives.
+    """
+
+    def __init__(self):
+        self.open = ''  # text of the paragraph still being written
+        self.sent = 0  # characters of it already returned
+        self.paragraphs = []  # finished, non-empty paragraphs
+
+    def _pieces(self, paragraph, finished):
+        visible = paragraph.strip()
+        pieces = [(len(self.paragraphs), visible[self.sent:])] if len(visible) > self.sent else []
+        if finished:
+            if visible:
+                self.paragraphs.append(visible)
+            self.sent = 0
+        else:
+            self.sent = len(visible)
+        return pieces
+
+    def feed(self, text):
+        *finished, self.open = (self.open + text).split('\n\n')
+        pieces = []
+        for paragraph in finished:
+            pieces += self._pieces(paragraph, finished=True)
+        return pieces + self._pieces(self.open, finished=False)
+
+    def close(self):
+        pieces = self._pieces(self.open, finished=True)
+        self.open = ''
+        return pieces
+
+    def html(self):
+        return ''.join(f"<p>{paragraph}</p>" for paragraph in self.paragraphs)
+
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
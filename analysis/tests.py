@@ -1,4 +1,4 @@
-from django.test import TestCase, Client, override_settings
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -112,7 +112,7 @@ class DataRetrievalFunctionsTest(TestCase):
     
     def test_get_running_data(self):
         """Test getting running data for a user"""
-        from .views import get_running_data
+        from .features import get_running_data
         
         data = get_running_data(self.user, self.week_ago)
         self.assertEqual(len(data), 1)
@@ -122,7 +122,7 @@ class DataRetrievalFunctionsTest(TestCase):
     
     def test_get_sleep_data(self):
         """Test getting sleep data for a user"""
-        from .views import get_sleep_data
+        from .features import get_sleep_data
         
         data = get_sleep_data(self.user, self.week_ago)
         self.assertEqual(len(data), 1)
@@ -132,7 +132,7 @@ class DataRetrievalFunctionsTest(TestCase):
     
     def test_get_steps_data(self):
         """Test getting steps data for a user"""
-        from .views import get_steps_data
+        from .features import get_steps_data
         
         data = get_steps_data(self.user, self.week_ago)
         self.assertEqual(len(data), 1)
@@ -140,7 +140,7 @@ class DataRetrievalFunctionsTest(TestCase):
     
     def test_get_diet_data(self):
         """Test getting diet data for a user"""
-        from .views import get_diet_data
+        from .features import get_diet_data
         
         data = get_diet_data(self.user, self.week_ago)
         self.assertEqual(len(data), 1)
@@ -151,7 +151,7 @@ class DataRetrievalFunctionsTest(TestCase):
     
     def test_no_data_before_start_date(self):
         """Test that no data is returned for dates before start_date"""
-        from .views import get_running_data
+        from .features import get_running_data
         
         # Data from today should not include yesterday's record
         data = get_running_data(self.user, self.today)
@@ -278,3 +278,362 @@ class CorrelationAnalysisTest(TestCase):
         self.assertEqual(steps_count, 10)
         self.assertEqual(weight_count, 10)
         self.assertEqual(sleep_count, 10)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   MEDIA_ROOT='/tmp/test-media',
+                   DEBUG=True)
+class AdviceDataFetchTest(TransactionTestCase):
+    """Test cases for the concurrent fetch of the advice data (committed data, since it is read from other threads)"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = get_user_model().objects.create_user(
+            username='fetchuser',
+            email='fetch@example.com',
+            password='testpass123'
+        )
+        self.yesterday = timezone.now().date() - timedelta(days=1)
+        RunningRecord.objects.create(user=self.user, date=self.yesterday, distance=5.0, duration_minutes=30)
+        StepsRecord.objects.create(user=self.user, date=self.yesterday, steps_count=8000)
+    
+    def test_gather_advice_data(self):
+        """Test every source is fetched, with its latency"""
+        from asgiref.sync import async_to_sync
+        from .features import ADVICE_SOURCES, gather_advice_data
+        
+        data, timings = async_to_sync(gather_advice_data)(self.user, self.yesterday - timedelta(days=30))
+        self.assertEqual(data['running'][0]['distance'], 5.0)
+        self.assertEqual(data['steps'][0]['steps_count'], 8000)
+        self.assertEqual(data['sleep'], [])
+        self.assertIsNone(data['goal'])
+        # The profile is created on first use
+        self.assertEqual(data['profile'].user_id, self.user.pk)
+        self.assertEqual(list(timings), [*ADVICE_SOURCES, 'total'])
+    
+    def test_fetch_threads_keep_their_connections(self):
+        """Test the fetch threads reuse their database connections within CONN_MAX_AGE instead of opening one per source"""
+        from asgiref.sync import async_to_sync
+        from django.db import connection
+        from django.db.backends.signals import connection_created
+        from .features import FETCH_EXECUTOR, gather_advice_data
+        
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('in-memory SQLite connections are never closed')
+        opened = []
+        def count(sender, connection, **kwargs):
+            opened.append(connection)
+        
+        connection_created.connect(count)
+        try:
+            # The settings are shared by the connections of every thread
+            with patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 60}):
+                for _ in range(3):
+                    async_to_sync(gather_advice_data)(self.user, self.yesterday)
+        finally:
+            connection_created.disconnect(count)
+            # Let the threads close them at their next fetch
+            for thread_connection in opened:
+                thread_connection.close_at = 0
+        self.assertTrue(opened)
+        self.assertLessEqual(len(opened), FETCH_EXECUTOR._max_workers)
+    
+    @patch('analysis.llm.AsyncOpenAI')
+    def test_generate_advice_reports_fetch_timings(self, client_class):
+        """Test the advice response carries the per-source latencies in a Server-Timing header"""
+        from unittest.mock import AsyncMock
+        
+        completion = MagicMock()
+        completion.choices[0].message.content = 'Great job.\n\nKeep running.'
+        client_class.return_value.chat.completions.create = AsyncMock(return_value=completion)
+        
+        client = Client()
+        client.login(username='fetchuser', password='testpass123')
+        response = client.post(reverse('analysis:generate_advice'))
+        self.assertEqual(response.json()['advice'], '<p>Great job.</p><p>Keep running.</p>')
+        self.assertIn('running;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+        
+        # The prompt was built from the fetched records
+        prompt = client_class.return_value.chat.completions.create.call_args.kwargs['messages'][1]['content']
+        self.assertIn('Steps: 8000 steps/day', prompt)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   MEDIA_ROOT='/tmp/test-media',
+                   DEBUG=True)
+class AsgiAdviceTest(TransactionTestCase):
+    """Test cases for serving advice generation natively under ASGI"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = get_user_model().objects.create_user(username='asgiuser', password='testpass123')
+    
+    def test_middleware_chain_is_async(self):
+        """Test no middleware makes the ASGI handler run views in a thread"""
+        from django.core.handlers.asgi import ASGIHandler
+        
+        with self.assertNoLogs('django.request', level='DEBUG'):
+            ASGIHandler()
+    
+    @patch('analysis.llm.AsyncOpenAI')
+    async def test_generate_advice_async_client(self, client_class):
+        """Test the advice view answers an async request and saves the advice"""
+        from unittest.mock import AsyncMock
+        from django.test import AsyncClient
+        
+        completion = MagicMock()
+        completion.choices[0].message.content = 'Keep going.'
+        client_class.return_value.chat.completions.create = AsyncMock(return_value=completion)
+        
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.post(reverse('analysis:generate_advice'))
+        self.assertEqual(response.json()['advice'], '<p>Keep going.</p>')
+        self.assertEqual(await HealthAdvice.objects.filter(user=self.user).acount(), 1)
+        
+        # Other methods are refused
+        response = await client.get(reverse('analysis:generate_advice'))
+        self.assertEqual(response.status_code, 405)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   MEDIA_ROOT='/tmp/test-media',
+                   DEBUG=True)
+class AdviceCacheTest(TransactionTestCase):
+    """Test cases for reusing advice generated from unchanged statistics"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = get_user_model().objects.create_user(username='cacheuser', password='testpass123')
+        StepsRecord.objects.create(user=self.user, date=timezone.now().date() - timedelta(days=1), steps_count=8000)
+        self.client = Client()
+        self.client.login(username='cacheuser', password='testpass123')
+    
+    def generate(self, client_class, content):
+        from unittest.mock import AsyncMock
+        
+        completion = MagicMock()
+        completion.choices[0].message.content = content
+        client_class.return_value.chat.completions.create = AsyncMock(return_value=completion)
+        return self.client.post(reverse('analysis:generate_advice')).json()
+    
+    @patch('analysis.llm.AsyncOpenAI')
+    def test_unchanged_data_reuses_advice(self, client_class):
+        """Test a repeat request returns the stored advice without calling the AI service"""
+        first = self.generate(client_class, 'First advice.')
+        self.assertNotIn('cached', first)
+        
+        second = self.generate(client_class, 'Second advice.')
+        self.assertEqual((second['advice'], second['cached']), ('<p>First advice.</p>', True))
+        client_class.return_value.chat.completions.create.assert_not_called()
+        self.assertEqual(HealthAdvice.objects.filter(user=self.user).count(), 1)
+        
+        # New data changes the statistics
+        StepsRecord.objects.create(user=self.user, date=timezone.now().date(), steps_count=12000)
+        third = self.generate(client_class, 'Third advice.')
+        self.assertEqual(third['advice'], '<p>Third advice.</p>')
+    
+    @patch('analysis.llm.AsyncOpenAI')
+    def test_expired_or_disabled_cache(self, client_class):
+        """Test advice older than the TTL, or any advice with a TTL of 0, is generated again"""
+        self.generate(client_class, 'First advice.')
+        HealthAdvice.objects.filter(user=self.user).update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.generate(client_class, 'Second advice.')['advice'], '<p>Second advice.</p>')
+        
+        with override_settings(ANALYSIS_ADVICE_CACHE_TTL=0):
+            self.assertEqual(self.generate(client_class, 'Third advice.')['advice'], '<p>Third advice.</p>')
+
+
+class LLMClientManagerTest(TestCase):
+    """Test cases for the shared AI service client"""
+    
+    def manager(self, **options):
+        from .llm import LLMClientManager
+        
+        return LLMClientManager('https://llm.example.com', api_key='test', backoff=0, **options)
+    
+    @patch('analysis.llm.AsyncOpenAI')
+    def test_retries_and_reuses_client(self, client_class):
+        """Test connection errors are retried, and one client serves every call of an event loop"""
+        import asyncio
+        import httpx
+        from unittest.mock import AsyncMock
+        from openai import APIConnectionError
+        
+        error = APIConnectionError(request=httpx.Request('POST', 'https://llm.example.com'))
+        create = client_class.return_value.chat.completions.create = AsyncMock(side_effect=[error, 'first', 'second'])
+        manager = self.manager(max_retries=1, shared=True)
+        
+        async def calls():
+            return [await manager.chat(model='m', messages=[]), await manager.chat(model='m', messages=[])]
+        
+        self.assertEqual(asyncio.run(calls()), ['first', 'second'])
+        self.assertEqual(create.call_count, 3)
+        self.assertEqual(client_class.call_count, 1)
+        metrics = manager.metrics()
+        self.assertEqual((metrics['calls'], metrics['retries'], metrics['failures']), (2, 1, 0))
+        self.assertEqual(metrics['upstream_latency']['count'], 3)
+        
+        # Out of retries
+        create.side_effect = [error, error]
+        with self.assertRaises(APIConnectionError):
+            asyncio.run(manager.chat(model='m', messages=[]))
+        self.assertEqual(manager.metrics()['failures'], 1)
+    
+    @patch('analysis.llm.AsyncOpenAI')
+    def test_queue_timeout(self, client_class):
+        """Test calls beyond the concurrency limit queue, and give up after the queue timeout"""
+        import asyncio
+        from .llm import LLMQueueTimeout
+        
+        async def slow_call(**kwargs):
+            await asyncio.sleep(0.2)
+            return 'done'
+        
+        client_class.return_value.chat.completions.create = slow_call
+        manager = self.manager(max_concurrency=1, queue_timeout=0.05, shared=True)
+        
+        async def calls():
+            return await asyncio.gather(*(manager.chat(model='m', messages=[]) for _ in range(2)),
+                                        return_exceptions=True)
+        
+        first, second = asyncio.run(calls())
+        self.assertEqual(first, 'done')
+        self.assertIsInstance(second, LLMQueueTimeout)
+        metrics = manager.metrics()
+        self.assertEqual((metrics['queue_timeouts'], metrics['max_queued'], metrics['queued'], metrics['in_flight']),
+                         (1, 1, 0, 0))
+    
+    @patch('analysis.llm.AsyncOpenAI')
+    def test_short_lived_loops_are_not_kept(self, client_class):
+        """Test calls from throwaway event loops, as under WSGI, keep neither the loops nor their clients"""
+        from unittest.mock import AsyncMock
+        from asgiref.sync import async_to_sync
+        
+        client_class.return_value.chat.completions.create = AsyncMock(return_value='done')
+        for shared in [False, True]:
+            manager = self.manager(shared=shared)
+            for _ in range(5):
+                self.assertEqual(async_to_sync(manager.chat)(model='m', messages=[]), 'done')
+            self.assertLessEqual(manager.metrics()['event_loops'], 1)
+        
+        # Unshared clients are closed after their call
+        manager = self.manager()
+        async_to_sync(manager.chat)(model='m', messages=[])
+        self.assertTrue(client_class.call_args.kwargs['http_client'].is_closed)
+        self.assertEqual(manager.metrics()['event_loops'], 0)
+    
+    def test_metrics_view_requires_staff(self):
+        """Test only staff can read the client metrics"""
+        user = get_user_model().objects.create_user(username='metricsuser', password='testpass123')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('analysis:llm_metrics')).status_code, 302)
+        
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('analysis:llm_metrics'))
+        self.assertIn('upstream_latency', response.json())
+
+
+class ParagraphStreamTest(TestCase):
+    """Test cases for formatting streamed advice into paragraphs"""
+    
+    def test_matches_format_advice_for_any_chunking(self):
+        """Test streamed pieces add up to the paragraphs of format_advice, however the text is cut"""
+        import random
+        from .streaming import ParagraphStream, format_advice
+        
+        text = "\n Great job with your steps!\n\nYou might consider \nmore sleep.\n\n\n\n  Keep going. \n\n"
+        rng = random.Random(7)
+        for _ in range(50):
+            cuts = sorted(rng.sample(range(1, len(text)), 8))
+            chunks = [text[start:end] for start, end in zip([0, *cuts], [*cuts, len(text)])]
+            
+            stream = ParagraphStream()
+            pieces = [piece for chunk in chunks for piece in stream.feed(chunk)] + stream.close()
+            shown = {}
+            for index, piece in pieces:
+                shown[index] = shown.get(index, '') + piece
+            
+            self.assertEqual(stream.html(), format_advice(text))
+            self.assertEqual(''.join(f'<p>{shown[index]}</p>' for index in sorted(shown)), format_advice(text))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   MEDIA_ROOT='/tmp/test-media',
+                   DEBUG=True)
+class StreamAdviceTest(TransactionTestCase):
+    """Test cases for streaming advice as server-sent events"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = get_user_model().objects.create_user(username='streamuser', password='testpass123')
+        StepsRecord.objects.create(user=self.user, date=timezone.now().date() - timedelta(days=1), steps_count=8000)
+        self.client = Client()
+        self.client.login(username='streamuser', password='testpass123')
+    
+    def events(self, response):
+        """(event, data) of every server-sent event of a response"""
+        from asgiref.sync import async_to_sync
+        
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        
+        body = async_to_sync(read)().decode()
+        events = []
+        for block in body.strip().split('\n\n'):
+            event, data = block.split('\n')
+            events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+        return events
+    
+    @patch('analysis.llm.AsyncOpenAI')
+    def test_stream_advice(self, client_class):
+        """Test pieces of text are sent as they arrive, then the whole advice, which is saved"""
+        from unittest.mock import AsyncMock
+        
+        class FakeStream:
+            def __init__(self, pieces):
+                self.pieces = pieces
+            
+            async def __aiter__(self):
+                for piece in self.pieces:
+                    chunk = MagicMock()
+                    chunk.choices[0].delta.content = piece
+                    yield chunk
+            
+            async def close(self):
+                pass
+        
+        create = client_class.return_value.chat.completions.create = AsyncMock(
+            return_value=FakeStream(['Great ', 'job.\n', '\nKeep ', None, 'going.'])
+        )
+        response = self.client.post(reverse('analysis:stream_advice'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = self.events(response)
+        self.assertTrue(create.call_args.kwargs['stream'])
+        
+        deltas = [(data['paragraph'], data['text']) for event, data in events if event == 'delta']
+        self.assertEqual(deltas, [(0, 'Great'), (0, ' job.'), (1, 'Keep'), (1, ' going.')])
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(events[-1][1]['advice'], '<p>Great job.</p><p>Keep going.</p>')
+        self.assertEqual(HealthAdvice.objects.get(user=self.user).content, '<p>Great job.</p><p>Keep going.</p>')
+        
+        # Unchanged data: the saved advice comes back at once
+        events = self.events(self.client.post(reverse('analysis:stream_advice')))
+        self.assertEqual([event for event, _ in events], ['done'])
+        self.assertTrue(events[0][1]['cached'])
+        self.assertEqual(create.call_count, 1)
+    
+    @patch('analysis.llm.AsyncOpenAI')
+    def test_stream_advice_error(self, client_class):
+        """Test an AI service error is sent as an error event and nothing is saved"""
+        from unittest.mock import AsyncMock
+        
+        client_class.return_value.chat.completions.create = AsyncMock(side_effect=ValueError('bad request'))
+        events = self.events(self.client.post(reverse('analysis:stream_advice')))
+        self.assertEqual([event for event, _ in events], ['error'])
+        self.assertIn('bad request', events[0][1]['error'])
+        # Shown in the error alert, not as advice
+        self.assertNotIn('advice', events[0][1])
+        self.assertFalse(HealthAdvice.objects.filter(user=self.user).exists())
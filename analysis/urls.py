@@ -5,5 +5,7 @@ app_name = 'analysis'
 
 urlpatterns = [
     path('ai-advice/', views.ai_advice, name='ai_advice'),
-    path('ai-advice/generate/', views.generate_advice, name='generate_advice'),
+    path('ai-advice/generate/', views.generate_advice_async, name='generate_advice'),
+    path('ai-advice/stream/', views.stream_advice, name='stream_advice'),
+    path('ai-advice/metrics/', views.llm_metrics, name='llm_metrics'),
 ] 
\ No newline at end of file
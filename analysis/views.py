@@ -1,14 +1,17 @@
-import os
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.utils import timezone
 from datetime import timedelta
-import json
 import asyncio
-from openai import AsyncOpenAI
+import time
 from asgiref.sync import sync_to_async
 from .models import HealthAdvice
+from .llm import LLMQueueTimeout, llm
+from .streaming import ParagraphStream, format_advice, sse_event
+from .features import advice_features, feature_hash, gather_advice_data, server_timing
 
 from health.models import (
     RunningRecord, 
@@ -16,68 +19,53 @@ from health.models import (
     SleepRecord, 
     DietRecord, 
     MoodRecord,
-    TrainingRecord,
-    HealthGoal,
-    WeightRecord
+    TrainingRecord
 )
 
-def get_running_data(user, start_date):
-    """Get running records data for a user since start_date"""
-    return list(RunningRecord.objects.filter(
-        user=user, 
-        date__gte=start_date
-    ).order_by('-date').values('id', 'date', 'distance', 'duration_minutes', 'calories_burned'))
+# Prompt for DeepSeek API, filled in with advice_features
+ADVICE_PROMPT = """
+Generate a personalized fitness recommendation based on the following user data in 200-300 English words. Structure it in 2-3 cohesive paragraphs without any markdown formatting.
 
-def get_sleep_data(user, start_date):
-    """Get sleep records data for a user since start_date"""
-    return list(SleepRecord.objects.filter(
-        user=user, 
-        date__gte=start_date
-    ).order_by('-date').values('id', 'date', 'hours', 'minutes', 'quality'))
+Begin by positively acknowledging their recent achievements in {achievements_text}. Then provide specific suggestions addressing these key areas:
 
-def get_steps_data(user, start_date):
-    """Get steps records data for a user since start_date"""
-    return list(StepsRecord.objects.filter(
-        user=user, 
-        date__gte=start_date
-    ).order_by('-date').values('id', 'date', 'steps_count'))
+Goal Alignment: Current goals are weight target: {weight_target} kg, daily steps goal: {steps_target} steps, sleep goal: {sleep_target}, weekly running distance goal: {running_distance_goal} km, weekly training sessions goal: {training_sessions_goal}, suggest incremental improvements based on their height: {height} cm, weight: {latest_weight} kg, and consistency.
 
-def get_diet_data(user, start_date):
-    """Get diet records data for a user since start_date"""
-    return list(DietRecord.objects.filter(
-        user=user, 
-        date__gte=start_date
-    ).order_by('-date').values('id', 'date', 'calories', 'protein', 'carbs', 'fat'))
+Activity Optimization: Recommend exercise types/duration considering their running sessions: {running_sessions} per week, running pace: {avg_running_pace} min/km, training sessions: {training_sessions} per week.
 
-def get_mood_data(user, start_date):
-    """Get mood records data for a user since start_date"""
-    return list(MoodRecord.objects.filter(
-        user=user, 
-        date__gte=start_date
-    ).order_by('-date').values('id', 'date', 'mood', 'stress_level'))
+Diet & Recovery Strategy: Address sleep patterns (current {avg_sleep_hours} hours/night), diet (current {avg_calories} calories/day, {avg_protein} g protein/day), predominant mood: {predominant_mood}, and rest days.
 
-def get_training_data(user, start_date):
-    """Get training records data for a user since start_date"""
-    return list(TrainingRecord.objects.filter(
-        user=user, 
-        date__gte=start_date
-    ).order_by('-date').values('id', 'date', 'exercise_type', 'sets', 'reps', 'weight', 'duration_minutes'))
+Progress Tracking: Suggest 2-3 measurable metrics to monitor across different health aspects.
 
-def get_weight_data(user, start_date):
-    """Get weight records data for a user since start_date"""
-    weight_records = list(WeightRecord.objects.filter(
-        user=user, 
-        date__gte=start_date
-    ).order_by('-date').values('id', 'date', 'weight', 'height', 'notes'))
-    
-    # Calculate BMI
-    for record in weight_records:
-        if record['height'] and record['weight']:
-            # BMI = weight(kg) / (height(m))^2
-            height_in_meters = record['height'] / 100
-            record['bmi'] = round(record['weight'] / (height_in_meters * height_in_meters), 1)
-    
-    return weight_records
+Maintain an encouraging tone using phrases like "Great job with..." and "You might consider...". Include 1-2 motivational quotes from famous athletes. Conclude by emphasizing sustainable habit-building. Add brief disclaimer to consult healthcare provider before major changes.
+
+User Data:
+Demographics: Age: {user_age}, Gender: {user_gender}, Height: {height} cm, Weight: {latest_weight} kg, BMI: {bmi}
+Current Goals: Weight target: {weight_target} kg, Daily steps target: {steps_target}, Sleep target: {sleep_target}, Weekly running distance: {running_distance_goal} km, Weekly training sessions: {training_sessions_goal}, Daily calories target: {calories_goal}
+
+Weekly Average:
+Steps: {avg_steps} steps/day
+Exercise: {training_sessions} training sessions, {running_sessions} running sessions
+Running: {avg_running_distance} km, {avg_running_pace} min/km pace
+Sleep: {avg_sleep_hours} hours/night
+Diet: {avg_calories} calories/day, {avg_protein} g protein/day
+Mood: {predominant_mood}
+Weight: {latest_weight} kg, {weight_diff} kg from target
+Active Days: {active_days}/7
+
+Recent Progress: {achievements_text}
+"""
+
+def print_fetch_timings(fetch_timings):
+    """Print how long each advice data source took, in debug mode only (responses carry them in Server-Timing)"""
+    if settings.DEBUG:
+        print("Advice data fetch (ms): " + ", ".join(f"{name} {elapsed:.1f}" for name, elapsed in fetch_timings.items()))
+
+def advice_messages(prompt):
+    """Chat messages asking DeepSeek for advice"""
+    return [
+        {"role": "system", "content": "You are a health and fitness advisor with expertise in analyzing health data patterns and providing personalized recommendations."},
+        {"role": "user", "content": prompt}
+    ]
 
 @login_required
 def ai_advice(request):
@@ -118,23 +106,24 @@ def ai_advice(request):
 
 @login_required
 async def generate_advice_async(request):
-    """Asynchronously generate health advice"""
+    """Asynchronously generate health advice
+    
+    A native async view: under ASGI, waiting for the AI service holds no
+    worker thread; under WSGI, Django runs it in an event loop of its own.
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST requests allowed'}, status=405)
     
     try:
+        # request.user would load the user synchronously
+        user = await request.auser()
+        
         # Get the last 30 days of health records
         last_30_days = timezone.now().date() - timedelta(days=30)
         
         try:
-            # Wrap synchronous database queries with sync_to_async
-            running_data = await sync_to_async(get_running_data)(request.user, last_30_days)
-            sleep_data = await sync_to_async(get_sleep_data)(request.user, last_30_days)
-            steps_data = await sync_to_async(get_steps_data)(request.user, last_30_days)
-            diet_data = await sync_to_async(get_diet_data)(request.user, last_30_days)
-            mood_data = await sync_to_async(get_mood_data)(request.user, last_30_days)
-            training_data = await sync_to_async(get_training_data)(request.user, last_30_days)
-            weight_data = await sync_to_async(get_weight_data)(request.user, last_30_days)
+            # Fetch every source at once (see analysis.features)
+            user_data, fetch_timings = await gather_advice_data(user, last_30_days)
         except Exception as db_error:
             print(f"Database query error: {str(db_error)}")
             return JsonResponse({
@@ -142,212 +131,33 @@ async def generate_advice_async(request):
                 'advice': '<p>We encountered an error while retrieving your health data. Please try again later.</p>',
                 'generated_time': timezone.now().strftime('%Y-%m-%d %H:%M:%S')
             }, status=200)
+        print_fetch_timings(fetch_timings)
         
-        # Convert date objects to strings
-        for data_list in [running_data, sleep_data, steps_data, diet_data, mood_data, training_data, weight_data]:
-            for item in data_list:
-                if 'date' in item:
-                    item['date'] = item['date'].strftime('%Y-%m-%d')
-        
-        # Prepare user data for the prompt
-        user_data = {
-            'running': running_data,
-            'sleep': sleep_data,
-            'steps': steps_data,
-            'diet': diet_data,
-            'mood': mood_data,
-            'training': training_data,
-            'weight_records': weight_data
-        }
-        
-        # Calculate user data statistics to fill in the prompt
-        # Get user information
-        try:
-            user_profile = await sync_to_async(lambda: request.user.profile)()
-        except Exception:
-            # If user has no profile, create one
-            from accounts.models import Profile
-            await sync_to_async(Profile.objects.create)(user=request.user)
-            user_profile = await sync_to_async(lambda: request.user.profile)()
-            
-        user_age = user_profile.age if hasattr(user_profile, 'age') else "Unknown"
-        user_gender = user_profile.get_gender_display() if hasattr(user_profile, 'gender') else "Unknown"
-        
-        # Get the latest weight record
-        latest_weight = None
-        height = None
-        bmi = None
-        if len(user_data['weight_records']) > 0:
-            latest_weight = user_data['weight_records'][0].get('weight', None)
-            height = user_data['weight_records'][0].get('height', None)
-            bmi = user_data['weight_records'][0].get('bmi', None)
-        
-        # Calculate average steps
-        avg_steps = 0
-        if len(steps_data) > 0:
-            avg_steps = sum(item.get('steps_count', 0) for item in steps_data) // len(steps_data)
-        
-        # Calculate average sleep
-        avg_sleep_hours = 0
-        if len(sleep_data) > 0:
-            avg_sleep_hours = sum(item.get('hours', 0) for item in sleep_data) / len(sleep_data)
-            avg_sleep_minutes = sum(item.get('minutes', 0) for item in sleep_data) / len(sleep_data)
-            avg_sleep_hours += avg_sleep_minutes / 60
-            avg_sleep_hours = round(avg_sleep_hours, 1)
-        
-        # Calculate running data
-        avg_running_distance = 0
-        avg_running_pace = 0
-        running_sessions = len(running_data)
-        if running_sessions > 0:
-            avg_running_distance = sum(item.get('distance', 0) for item in running_data) / running_sessions
-            avg_running_distance = round(avg_running_distance, 1)
-            # Calculate average pace (minutes/km)
-            if sum(item.get('distance', 0) for item in running_data) > 0:
-                total_minutes = sum(item.get('duration_minutes', 0) for item in running_data)
-                total_distance = sum(item.get('distance', 0) for item in running_data)
-                avg_running_pace = total_minutes / total_distance
-                avg_running_pace = round(avg_running_pace, 1)
-        
-        # Calculate diet data
-        avg_calories = 0
-        avg_protein = 0
-        if len(diet_data) > 0:
-            avg_calories = sum(item.get('calories', 0) for item in diet_data) // len(diet_data)
-            protein_values = [item.get('protein', 0) for item in diet_data if item.get('protein') is not None]
-            if protein_values:
-                avg_protein = sum(protein_values) / len(protein_values)
-                avg_protein = round(avg_protein, 1)
-        
-        # Calculate training frequency
-        training_sessions = len(training_data)
-        
-        # Calculate active days (any one activity record day)
-        all_dates = set()
-        for data_list in [running_data, steps_data, training_data]:
-            all_dates.update(item.get('date') for item in data_list)
-        active_days = len(all_dates)
-        
-        # Get main mood status
-        predominant_mood = "Not recorded"
-        if len(mood_data) > 0:
-            mood_counts = {}
-            for item in mood_data:
-                mood = item.get('mood')
-                if mood:
-                    mood_counts[mood] = mood_counts.get(mood, 0) + 1
-            if mood_counts:
-                predominant_mood = max(mood_counts.items(), key=lambda x: x[1])[0]
-        
-        # Get target value
-        try:
-            health_goal = await sync_to_async(lambda: HealthGoal.objects.get(user=request.user))()
-            weight_target = health_goal.target_weight
-            steps_target = health_goal.daily_steps_goal
-            sleep_target_hours = health_goal.daily_sleep_hours_goal
-            sleep_target_minutes = health_goal.daily_sleep_minutes_goal
-            running_distance_goal = health_goal.weekly_running_distance_goal
-            training_sessions_goal = health_goal.weekly_training_sessions_goal
-            calories_goal = health_goal.daily_calories_goal
-            
-            # Calculate the difference from the target
-            weight_diff = ""
-            if latest_weight and weight_target:
-                diff = latest_weight - weight_target
-                weight_diff = f"+{diff:.1f}" if diff > 0 else f"{diff:.1f}"
-        except:
-            weight_target = "Not set"
-            steps_target = "Not set"
-            sleep_target_hours = "Not set"
-            sleep_target_minutes = "Not set"
-            running_distance_goal = "Not set"
-            training_sessions_goal = "Not set"
-            calories_goal = "Not set"
-            weight_diff = "Unknown"
-        
-        # Calculate sleep target complete representation
-        sleep_target = "Not set"
-        if sleep_target_hours != "Not set":
-            sleep_target = f"{sleep_target_hours}h {sleep_target_minutes}min"
-        
-        # Determine user achievements
-        achievements = []
-        if avg_steps > 0 and steps_target != "Not set" and avg_steps >= steps_target:
-            achievements.append(f"Average steps reached target ({avg_steps} steps/day)")
-        if running_sessions > 0:
-            achievements.append(f"Maintain running habit (Weekly {running_sessions} times)")
-        if avg_sleep_hours > 7:
-            achievements.append(f"Good sleep time (Average {avg_sleep_hours} hours/night)")
-        if latest_weight and weight_target and abs(latest_weight - weight_target) < 3:
-            achievements.append(f"Weight close to target value ({latest_weight} kg)")
-        if avg_calories > 0 and calories_goal != "Not set":
-            achievements.append(f"Maintain diet record habit")
-        if active_days >= 5:
-            achievements.append(f"Weekly maintain {active_days}/7 active days")
-        
-        # If there are not enough achievements, add some default ones
-        if len(achievements) < 2:
-            if len(steps_data) > 0:
-                achievements.append("Continuous record steps data")
-            if len(sleep_data) > 0:
-                achievements.append("Continuous record sleep data")
-            if len(running_data) > 0:
-                achievements.append("Stick to running exercise")
-            if len(training_data) > 0:
-                achievements.append("Stick to strength training")
-        
-        # Select top 3 achievements
-        achievements = achievements[:3]
-        achievements_text = ", ".join(achievements)
-        
-        # Create prompt for DeepSeek API with actual user data
-        prompt = f"""
-        Generate a personalized fitness recommendation based on the following user data in 200-300 English words. Structure it in 2-3 cohesive paragraphs without any markdown formatting.
-        
-        Begin by positively acknowledging their recent achievements in {achievements_text}. Then provide specific suggestions addressing these key areas:
-        
-        Goal Alignment: Current goals are weight target: {weight_target} kg, daily steps goal: {steps_target} steps, sleep goal: {sleep_target}, weekly running distance goal: {running_distance_goal} km, weekly training sessions goal: {training_sessions_goal}, suggest incremental improvements based on their height: {height} cm, weight: {latest_weight} kg, and consistency.
-        
-        Activity Optimization: Recommend exercise types/duration considering their running sessions: {running_sessions} per week, running pace: {avg_running_pace} min/km, training sessions: {training_sessions} per week.
-        
-        Diet & Recovery Strategy: Address sleep patterns (current {avg_sleep_hours} hours/night), diet (current {avg_calories} calories/day, {avg_protein} g protein/day), predominant mood: {predominant_mood}, and rest days.
+        # Statistics of the data, and the prompt filled in with them
+        features = advice_features(user_data)
+        prompt = ADVICE_PROMPT.format(**features)
         
-        Progress Tracking: Suggest 2-3 measurable metrics to monitor across different health aspects.
-        
-        Maintain an encouraging tone using phrases like "Great job with..." and "You might consider...". Include 1-2 motivational quotes from famous athletes. Conclude by emphasizing sustainable habit-building. Add brief disclaimer to consult healthcare provider before major changes.
-        
-        User Data:
-        Demographics: Age: {user_age}, Gender: {user_gender}, Height: {height} cm, Weight: {latest_weight} kg, BMI: {bmi}
-        Current Goals: Weight target: {weight_target} kg, Daily steps target: {steps_target}, Sleep target: {sleep_target}, Weekly running distance: {running_distance_goal} km, Weekly training sessions: {training_sessions_goal}, Daily calories target: {calories_goal}
-        
-        Weekly Average:
-        Steps: {avg_steps} steps/day
-        Exercise: {training_sessions} training sessions, {running_sessions} running sessions
-        Running: {avg_running_distance} km, {avg_running_pace} min/km pace
-        Sleep: {avg_sleep_hours} hours/night
-        Diet: {avg_calories} calories/day, {avg_protein} g protein/day
-        Mood: {predominant_mood}
-        Weight: {latest_weight} kg, {weight_diff} kg from target
-        Active Days: {active_days}/7
-        
-        Recent Progress: {achievements_text}
-        """
+        # Unchanged statistics give the same prompt: return the advice already generated from them
+        features_hash = feature_hash(features)
+        cached_advice = await sync_to_async(get_cached_advice)(user, features_hash)
+        if cached_advice is not None:
+            response = JsonResponse({
+                'advice': cached_advice.content,
+                'generated_time': cached_advice.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'cached': True
+            })
+            response['Server-Timing'] = server_timing(fetch_timings)
+            return response
         
         try:
-            api_key = os.environ.get('AI_API_KEY')
-            
-            # Initialize OpenAI client (using DeepSeek's API base URL)
-            client = AsyncOpenAI(api_key=api_key, base_url="https://api.deepseek.com")
-            
             # Build request parameters
-            messages = [
-                {"role": "system", "content": "You are a health and fitness advisor with expertise in analyzing health data patterns and providing personalized recommendations."},
-                {"role": "user", "content": prompt}
-            ]
+            messages = advice_messages(prompt)
             
-            # Send request to DeepSeek API with timeout handling
+            # Send request to DeepSeek API through the shared client (see analysis.llm); the timeout
+            # covers waiting for a call slot and retries
+            llm_started = time.perf_counter()
             response = await asyncio.wait_for(
-                client.chat.completions.create(
+                llm.chat(
                     model="deepseek-chat",
                     messages=messages,
                     temperature=1.0,
@@ -355,33 +165,37 @@ async def generate_advice_async(request):
                 ),
                 timeout=30.0  # Set a reasonable timeout of 30 seconds
             )
+            fetch_timings['llm'] = (time.perf_counter() - llm_started) * 1000
             
             # Get reply content
             advice = response.choices[0].message.content
             generated_time = timezone.now()
             
             # Format advice content as HTML with identical structure to database content
-            formatted_advice = ""
-            paragraphs = advice.split('\n\n')
-            for para in paragraphs:
-                if para.strip():
-                    # Remove possible Markdown or HTML tags
-                    clean_para = para.strip()
-                    # Wrap paragraph in p tags with exact same styling as database-retrieved content
-                    formatted_advice += f"<p>{clean_para}</p>"
+            formatted_advice = format_advice(advice)
             
             # Save advice to database
-            save_success = await sync_to_async(save_advice_to_db)(request.user, formatted_advice)
+            save_success = await sync_to_async(save_advice_to_db)(user, formatted_advice, features_hash)
             
             # Even if save fails, still return the advice to the user with exact same format
             if not save_success:
                 print("Warning: Failed to save advice to database, but returning it to user anyway")
             
-            return JsonResponse({
+            response = JsonResponse({
                 'advice': formatted_advice,
                 'generated_time': generated_time.strftime('%Y-%m-%d %H:%M:%S')
             })
+            response['Server-Timing'] = server_timing(fetch_timings)
+            return response
         
+        except LLMQueueTimeout:
+            print("AI service busy: no call slot free")
+            return JsonResponse({
+                'error': 'Our AI service is busy. Please try again in a moment.',
+                'advice': '<p>Sorry, our AI service is handling many requests right now. Please try again in a moment.</p>',
+                'generated_time': timezone.now().strftime('%Y-%m-%d %H:%M:%S')
+            }, status=200)
+            
         except asyncio.TimeoutError:
             print("API request timed out")
             return JsonResponse({
@@ -406,13 +220,104 @@ async def generate_advice_async(request):
             'generated_time': timezone.now().strftime('%Y-%m-%d %H:%M:%S')
         }, status=200)
 
-def save_advice_to_db(user, advice_content):
+async def advice_events(user):
+    """Server-sent events of newly generated advice (see stream_advice)"""
+    last_30_days = timezone.now().date() - timedelta(days=30)
+    try:
+        user_data, fetch_timings = await gather_advice_data(user, last_30_days)
+    except Exception as db_error:
+        print(f"Database query error: {str(db_error)}")
+        yield sse_event('error', {'error': 'Failed to retrieve your health data. Please try again later.'})
+        return
+    print_fetch_timings(fetch_timings)
+    
+    features = advice_features(user_data)
+    features_hash = feature_hash(features)
+    cached_advice = await sync_to_async(get_cached_advice)(user, features_hash)
+    if cached_advice is not None:
+        yield sse_event('done', {
+            'advice': cached_advice.content,
+            'generated_time': cached_advice.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'cached': True
+        })
+        return
+    
+    paragraphs = ParagraphStream()
+    stream = llm.stream_chat(
+        model="deepseek-chat",
+        messages=advice_messages(ADVICE_PROMPT.format(**features)),
+        temperature=1.0,
+        max_tokens=2000
+    )
+    try:
+        while True:
+            try:
+                # 30 seconds for the first content (queueing included), then between pieces
+                text = await asyncio.wait_for(anext(stream), timeout=30.0)
+            except StopAsyncIteration:
+                break
+            for index, piece in paragraphs.feed(text):
+                yield sse_event('delta', {'paragraph': index, 'text': piece})
+        for index, piece in paragraphs.close():
+            yield sse_event('delta', {'paragraph': index, 'text': piece})
+    except LLMQueueTimeout:
+        print("AI service busy: no call slot free")
+        yield sse_event('error', {'error': 'Our AI service is busy. Please try again in a moment.'})
+        return
+    except asyncio.TimeoutError:
+        print("API request timed out")
+        yield sse_event('error', {'error': 'The request to our AI service timed out. Please try again later.'})
+        return
+    except Exception as api_error:
+        print(f"API call error: {str(api_error)}")
+        yield sse_event('error', {'error': f'AI service error: {str(api_error)}'})
+        return
+    finally:
+        await stream.aclose()
+    
+    # The whole advice, formatted as generate_advice_async formats it
+    formatted_advice = paragraphs.html()
+    if not await sync_to_async(save_advice_to_db)(user, formatted_advice, features_hash):
+        print("Warning: Failed to save advice to database, but returning it to user anyway")
+    yield sse_event('done', {'advice': formatted_advice, 'generated_time': timezone.now().strftime('%Y-%m-%d %H:%M:%S')})
+
+@login_required
+async def stream_advice(request):
+    """Generate health advice, streamed as server-sent events while the AI service writes it
+    
+    'delta' events carry the text of a paragraph as it arrives, then a 'done'
+    event carries the whole formatted advice, or an 'error' event only the
+    error message, for the page's error alert.
+    Streaming needs ASGI; under WSGI, Django sends the events all at once.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST requests allowed'}, status=405)
+    
+    response = StreamingHttpResponse(advice_events(await request.auser()), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep proxies such as nginx from buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def get_cached_advice(user, features_hash):
+    """Latest advice generated from the same features within ANALYSIS_ADVICE_CACHE_TTL seconds, or None"""
+    ttl = getattr(settings, 'ANALYSIS_ADVICE_CACHE_TTL', 0)
+    if not ttl:
+        return None
+    return HealthAdvice.objects.filter(
+        user=user,
+        feature_hash=features_hash,
+        created_at__gte=timezone.now() - timedelta(seconds=ttl)
+    ).first()
+
+def save_advice_to_db(user, advice_content, features_hash=''):
     """Save generated advice to database"""
     try:
         # Content is already formatted as HTML during generation, no need to process again
         HealthAdvice.objects.create(
             user=user,
-            content=advice_content
+            content=advice_content,
+            feature_hash=features_hash
         )
         # Keep latest 5 pieces of advice, delete older ones
         old_advice = HealthAdvice.objects.filter(user=user).order_by('-created_at')[5:]
@@ -424,20 +329,7 @@ def save_advice_to_db(user, advice_content):
         print(f"Error saving advice to database: {str(e)}")
         return False
 
-# Convert sync view to async view
-def generate_advice(request):
-    """Synchronous wrapper for the async generate_advice view"""
-    if request.method != 'POST':
-        return JsonResponse({'error': 'Only POST requests allowed'}, status=405)
-    
-    try:
-        result = asyncio.run(generate_advice_async(request))
-        return result
-    except Exception as e:
-        error_msg = f'Processing request failed: {str(e)}'
-        print(error_msg)  # Add server-side logging
-        return JsonResponse({
-            'error': error_msg,
-            'advice': '<p>Sorry, we encountered an error while generating your health advice. Please try again later.</p>',
-            'generated_time': timezone.now().strftime('%Y-%m-%d %H:%M:%S')
-        }, status=200)  # Return 200 status with error message instead of 500
+@staff_member_required
+def llm_metrics(request):
+    """Queue depth, in-flight calls and latencies of this process's AI service client as JSON"""
+    return JsonResponse(llm.metrics())
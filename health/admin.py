@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     StepsRecord, SleepRecord, DietRecord, 
-    RunningRecord, TrainingRecord, MoodRecord
+    RunningRecord, TrainingRecord, MoodRecord, DailyHealthSummary, ImportJob
 )
 
 @admin.register(StepsRecord)
@@ -39,3 +39,15 @@ class MoodRecordAdmin(admin.ModelAdmin):
     list_display = ('user', 'date', 'mood', 'stress_level')
     list_filter = ('date', 'user', 'mood')
     search_fields = ('user__username', 'user__email')
+
+@admin.register(DailyHealthSummary)
+class DailyHealthSummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'steps_total', 'sleep_minutes_total', 'calories_total', 'running_distance_total', 'mood_latest', 'weight_latest')
+    list_filter = ('date', 'user')
+    search_fields = ('user__username', 'user__email')
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'status', 'rows_processed', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('user__username', 'user__email')
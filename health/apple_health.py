@@ -0,0 +1,300 @@
+"""Import of Apple Health exports: ``export.xml``, or the ``export.zip`` the Health app shares.
+
+The file is read with defusedxml's ``iterparse`` (uploads are untrusted, so
+entity declarations are refused) and every top-level element is cleared
+as soon as it has been handled, so memory is bounded by the number of days
+(and workouts) in the export rather than by its hundreds of megabytes of
+samples. Samples are aggregated per day:
+
+* step counts are summed per day and source; a day gets the total of the
+  source that counted the most, since phone and watch count the same steps;
+* sleep analysis samples count the minutes asleep (in bed and awake samples
+  are ignored) on the day the sleep ended, again from the best source;
+* running workouts are summed per day into one ``RunningRecord``; every
+  other workout becomes a ``TrainingRecord``, unless the user already has
+  one for the same day, type and duration (so a newer export can be
+  imported over an older one);
+* body mass keeps the day's last sample, with the latest height in the
+  export (or the user's last recorded height).
+
+Days are the local dates recorded by the device. The aggregated records
+are written through ``HealthDataImporter``, batched and upserted like a
+CSV import.
+"""
+import gzip
+import re
+import zipfile
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from defusedxml.ElementTree import iterparse
+from django.db import transaction
+
+from .importer import GZIP_MAGIC, HealthDataImporter, count_existing_days
+from .models import TrainingRecord, WeightRecord
+from .parsing import parse_iso_date
+
+# Upload names handled by this importer rather than the CSV one
+APPLE_HEALTH_SUFFIXES = ('.xml', '.xml.gz', '.zip')
+# Elements read between two progress reports
+APPLE_HEALTH_PROGRESS_EVERY = 100000
+ZIP_MAGIC = b'PK\x03\x04'
+
+STEP_COUNT = 'HKQuantityTypeIdentifierStepCount'
+SLEEP_ANALYSIS = 'HKCategoryTypeIdentifierSleepAnalysis'
+BODY_MASS = 'HKQuantityTypeIdentifierBodyMass'
+HEIGHT = 'HKQuantityTypeIdentifierHeight'
+RUNNING = 'HKWorkoutActivityTypeRunning'
+# iOS 16 and later put workout totals into WorkoutStatistics child elements
+DISTANCE_STATISTICS = 'HKQuantityTypeIdentifierDistanceWalkingRunning'
+ENERGY_STATISTICS = 'HKQuantityTypeIdentifierActiveEnergyBurned'
+
+# Factors converting Apple Health units to the ones WellLog stores
+KILOMETERS = {'km': 1, 'm': 0.001, 'mi': 1.609344}
+MINUTES = {'min': 1, 's': 1 / 60, 'hr': 60}
+KILOCALORIES = {'kcal': 1, 'Cal': 1, 'kJ': 1 / 4.184}
+KILOGRAMS = {'kg': 1, 'g': 0.001, 'lb': 0.45359237}
+CENTIMETERS = {'cm': 1, 'm': 100, 'in': 2.54, 'ft': 30.48}
+
+
+def _convert(value, unit, factors):
+    if unit not in factors:
+        raise ValueError(f"unsupported unit {unit!r}")
+    return float(value) * factors[unit]
+
+
+def _timestamp(value):
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S %z')
+
+
+def _exercise_name(activity_type):
+    """'HKWorkoutActivityTypeTraditionalStrengthTraining' -> 'Traditional Strength Training'"""
+    name = activity_type.removeprefix('HKWorkoutActivityType')
+    return re.sub(r'(?<!^)(?=[A-Z])', ' ', name)[:100]
+
+
+def _best_source(totals):
+    """Per day, the total of the source that recorded the most"""
+    days = {}
+    for (day, _), total in totals.items():
+        if total > days.get(day, 0):
+            days[day] = total
+    return dict(sorted(days.items()))
+
+
+def is_apple_health_file(name):
+    return name.lower().endswith(APPLE_HEALTH_SUFFIXES)
+
+
+@contextmanager
+def open_apple_health_export(file):
+    """Open an export.xml, a gzip-compressed export.xml or a Health app export.zip as a binary stream"""
+    file.seek(0)
+    magic = file.read(len(ZIP_MAGIC))
+    file.seek(0)
+
+    if magic == ZIP_MAGIC:
+        # Members are decompressed as they are read; the archive also holds export_cda.xml and routes
+        with zipfile.ZipFile(file) as archive:
+            names = [name for name in archive.namelist() if name.rsplit('/', 1)[-1] == 'export.xml']
+            if not names:
+                raise ValueError('The ZIP file contains no export.xml')
+            with archive.open(names[0]) as export:
+                yield export
+    elif magic.startswith(GZIP_MAGIC):
+        with gzip.GzipFile(fileobj=file, mode='rb') as export:
+            yield export
+    else:
+        yield file
+
+
+class AppleHealthImporter:
+    """Aggregate an Apple Health export.xml per day and import it for one user
+
+    Usage::
+
+        with open_apple_health_export(file) as export:
+            counts = AppleHealthImporter(user).run(export)
+    """
+
+    def __init__(self, user, importer=None):
+        self.user = user
+        self.importer = importer or HealthDataImporter(user)
+        self.elements = 0
+        self.errors = 0
+        self.steps = defaultdict(float)  # (day, source) -> steps
+        self.sleep = defaultdict(float)  # (day, source) -> minutes asleep
+        self.running = {}  # day -> [kilometers, minutes, kilocalories or None]
+        self.workouts = []  # (day, exercise type, minutes, kilocalories or None)
+        self.weights = {}  # day -> (timestamp, kilograms)
+        self.height = None
+        self.height_at = ''
+
+    def run(self, file, atomic=True):
+        """Read and import the export; return the number of written records per section plus 'errors'"""
+        with transaction.atomic() if atomic else nullcontext():
+            self.read(file)
+            for section, values in self.records():
+                self.importer.add_values(section, values)
+            self.importer.finish()
+        return self.importer.counts
+
+    def read(self, file):
+        """Aggregate every top-level Record and Workout element of an export.xml stream"""
+        root = None
+        depth = 0
+        for event, element in iterparse(file, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+
+            depth -= 1
+            # Only direct children of <HealthData>; samples nested in correlations repeat top-level ones
+            if depth != 1:
+                continue
+            self.elements += 1
+            try:
+                if element.tag == 'Record':
+                    self.add_record(element.attrib)
+                elif element.tag == 'Workout':
+                    self.add_workout(element)
+            except (ValueError, KeyError) as e:
+                self.errors += 1
+                print(f"Error importing {element.tag}: {dict(element.attrib)}, Error: {e}")
+            # Drop the handled element (and its children) from the tree
+            root.clear()
+
+            if self.elements % APPLE_HEALTH_PROGRESS_EVERY == 0:
+                self.report_progress()
+
+        self.importer.rows_processed = self.elements
+        self.importer.counts['errors'] += self.errors
+
+    def report_progress(self):
+        if self.importer.progress is not None:
+            self.importer.progress(self.elements, dict(self.importer.counts, errors=self.errors))
+
+    def add_record(self, attrib):
+        kind = attrib.get('type')
+        if kind == STEP_COUNT:
+            self.steps[(attrib['startDate'][:10], attrib.get('sourceName', ''))] += float(attrib['value'])
+        elif kind == SLEEP_ANALYSIS:
+            # Asleep, or since iOS 16 AsleepCore, AsleepDeep, AsleepREM and AsleepUnspecified
+            if attrib['value'].startswith('HKCategoryValueSleepAnalysisAsleep'):
+                asleep = _timestamp(attrib['endDate']) - _timestamp(attrib['startDate'])
+                self.sleep[(attrib['endDate'][:10], attrib.get('sourceName', ''))] += asleep.total_seconds() / 60
+        elif kind == BODY_MASS:
+            day = attrib['startDate'][:10]
+            kilograms = _convert(attrib['value'], attrib.get('unit'), KILOGRAMS)
+            if day not in self.weights or attrib['startDate'] >= self.weights[day][0]:
+                self.weights[day] = (attrib['startDate'], kilograms)
+        elif kind == HEIGHT:
+            if attrib['startDate'] >= self.height_at:
+                self.height = _convert(attrib['value'], attrib.get('unit'), CENTIMETERS)
+                self.height_at = attrib['startDate']
+
+    def add_workout(self, element):
+        attrib = element.attrib
+        day = attrib['startDate'][:10]
+        minutes = _convert(attrib['duration'], attrib.get('durationUnit', 'min'), MINUTES)
+        kilometers = None
+        if attrib.get('totalDistance'):
+            kilometers = _convert(attrib['totalDistance'], attrib.get('totalDistanceUnit'), KILOMETERS)
+        kilocalories = None
+        if attrib.get('totalEnergyBurned'):
+            kilocalories = _convert(attrib['totalEnergyBurned'], attrib.get('totalEnergyBurnedUnit'), KILOCALORIES)
+
+        for statistics in element.iter('WorkoutStatistics'):
+            if statistics.get('type') == DISTANCE_STATISTICS and kilometers is None and statistics.get('sum'):
+                kilometers = _convert(statistics.get('sum'), statistics.get('unit'), KILOMETERS)
+            elif statistics.get('type') == ENERGY_STATISTICS and kilocalories is None and statistics.get('sum'):
+                kilocalories = _convert(statistics.get('sum'), statistics.get('unit'), KILOCALORIES)
+
+        if attrib['workoutActivityType'] == RUNNING:
+            totals = self.running.setdefault(day, [0.0, 0.0, None])
+            totals[0] += kilometers or 0
+            totals[1] += minutes
+            if kilocalories is not None:
+                totals[2] = (totals[2] or 0) + kilocalories
+        else:
+            self.workouts.append((day, _exercise_name(attrib['workoutActivityType']), minutes, kilocalories))
+
+    def records(self):
+        """Yield (section, values) for every aggregated record, ready for HealthDataImporter.add_values"""
+        for day, steps in _best_source(self.steps).items():
+            yield 'steps', {'date': parse_iso_date(day), 'steps_count': round(steps)}
+
+        for day, minutes in _best_source(self.sleep).items():
+            total = round(minutes)
+            yield 'sleep', {'date': parse_iso_date(day), 'hours': total // 60, 'minutes': total % 60, 'quality': None}
+
+        for day, (kilometers, minutes, kilocalories) in sorted(self.running.items()):
+            yield 'running', {
+                'date': parse_iso_date(day),
+                'distance': round(kilometers, 2),
+                'duration_minutes': round(minutes),
+                'calories_burned': round(kilocalories) if kilocalories is not None else None,
+            }
+
+        yield from self.weight_records()
+        yield from self.training_records()
+
+    def weight_records(self):
+        height = self.height
+        if height is None:
+            height = (WeightRecord.objects.filter(user=self.user)
+                      .order_by('-date').values_list('height', flat=True).first())
+        if height is None and self.weights:
+            # WeightRecord needs a height; skip the weights rather than guess one
+            print(f"Skipping {len(self.weights)} body mass days: no height in the export or earlier records")
+            self.importer.counts['errors'] += len(self.weights)
+            return
+        for day, (_, kilograms) in sorted(self.weights.items()):
+            yield 'weight', {'date': parse_iso_date(day), 'weight': round(kilograms, 1),
+                             'height': round(height, 1), 'notes': None}
+
+    def training_records(self):
+        if not self.workouts:
+            return
+        days = [parse_iso_date(day) for day, _, _, _ in self.workouts]
+        # Workouts imported before, in one query over the export's range
+        seen = set(
+            TrainingRecord.objects.filter(user=self.user, date__range=(min(days), max(days)))
+            .values_list('date', 'exercise_type', 'duration_minutes')
+        )
+        for day, (_, name, minutes, kilocalories) in zip(days, self.workouts):
+            key = (day, name, round(minutes))
+            if key in seen:
+                continue
+            seen.add(key)
+            yield 'training', {
+                'date': day,
+                'exercise_type': name,
+                'sets': None,
+                'reps': None,
+                'weight': None,
+                'duration_minutes': round(minutes),
+                'calories_burned': round(kilocalories) if kilocalories is not None else None,
+                'notes': None,
+            }
+
+    def report(self):
+        """Dry-run report in the shape of ``validate_import``: elements read, and the records per section"""
+        days = defaultdict(Counter)
+        for section, values in self.records():
+            days[section][values['date']] += 1
+        sections = {
+            section: {'rows': sum(counter.values()), 'valid': sum(counter.values()), 'invalid': 0,
+                      'existing': count_existing_days(self.user, section, counter), 'duplicates': 0}
+            for section, counter in days.items()
+        }
+        return {
+            'rows': self.elements,
+            'valid': self.elements - self.errors,
+            'invalid': self.errors,
+            'sections': sections,
+            'errors': {},
+        }
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class HealthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'health'
+
+    def ready(self):
+        # Register the DailyHealthSummary maintenance signal handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,85 @@
+"""Per-user cache of the computed history page statistics and chart series.
+
+History pages are reloaded far more often than records are logged, so the
+stats and chart arrays of a page are cached under a key built from the user,
+the record type, the date range and a per-user, per-record-type version.
+Saving or deleting a record gives that version a new value (see
+``health.signals``), which makes every cached snapshot of that record type
+unreachable at once; stale entries simply expire.
+
+Only ``django.core.cache`` get/set calls are used, so the database,
+file-based, Redis and Memcached backends all work. The cache must be shared
+by every process that writes records (web workers and ``run_import_jobs``):
+with a process-local ``LocMemCache``, a write would only invalidate the
+snapshots of the process handling it, so snapshots are then built on every
+request unless ``HEALTH_HISTORY_CACHE_LOCAL_MEMORY`` says there is a single
+process. Code writing records with ``bulk_create()``, ``QuerySet.update()``
+or ``QuerySet.delete()`` must call ``invalidate_history`` itself, as those
+do not send model signals.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def get_timeout():
+    """How long a history snapshot stays cached, in seconds"""
+    return getattr(settings, 'HEALTH_HISTORY_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def snapshots_enabled():
+    """Whether the cache is shared by all processes, or a process-local cache was allowed"""
+    return not isinstance(caches['default'], LocMemCache) or getattr(settings, 'HEALTH_HISTORY_CACHE_LOCAL_MEMORY', False)
+
+
+def _version_key(user_id, model):
+    return f'health:history:version:{user_id}:{model._meta.model_name}'
+
+
+def get_history_version(user_id, model):
+    """Current cache version of a user's records of one type"""
+    key = _version_key(user_id, model)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        # add() keeps the version another request may have set in the meantime
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate_history(user_id, model):
+    """Drop every cached history snapshot of a user's records of one type"""
+    # A fresh timestamp rather than incr(): it never repeats a version an evicted key once had
+    cache.set(_version_key(user_id, model), time.time_ns(), None)
+
+
+def get_history_snapshot(user_id, model, date_from, date_to, build):
+    """Return the cached snapshot for a history page, building and storing it on a miss
+
+    ``build`` is called without arguments and must return a picklable value.
+    Today's date is part of the key because the default chart range is the
+    last 30 days.
+    """
+    if not snapshots_enabled():
+        return build()
+
+    range_key = f'{date_from or ""}|{date_to or ""}|{timezone.now().date()}'
+    key = 'health:history:{}:{}:{}:{}'.format(
+        user_id,
+        model._meta.model_name,
+        get_history_version(user_id, model),
+        hashlib.md5(range_key.encode()).hexdigest(),
+    )
+
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build()
+        cache.set(key, snapshot, get_timeout())
+    return snapshot
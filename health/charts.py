@@ -0,0 +1,185 @@
+"""Chart series downsampling for the health record history pages.
+
+Long date ranges can contain thousands of records, but a chart a few hundred
+pixels wide cannot show more than a few hundred points. ``downsample`` uses
+Largest-Triangle-Three-Buckets (LTTB) to pick the points that best keep the
+shape of a series, including its peaks and dips, and caps every chart at
+``settings.HEALTH_CHART_MAX_POINTS`` points.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Sum
+
+DEFAULT_MAX_POINTS = 365
+
+
+def get_max_points():
+    """Maximum number of points sent to a history chart"""
+    return getattr(settings, 'HEALTH_CHART_MAX_POINTS', DEFAULT_MAX_POINTS)
+
+
+def lttb_indices(xs, ys, threshold):
+    """Return the indices of the points LTTB keeps out of (xs, ys)
+
+    The first and last points are always kept; the rest of the series is cut
+    into ``threshold - 2`` buckets and from each bucket the point forming the
+    largest triangle with the previously kept point and the average of the
+    next bucket is kept.
+    """
+    length = len(ys)
+    if threshold >= length:
+        return list(range(length))
+    if threshold < 3:
+        return [0, length - 1]
+
+    every = (length - 2) / (threshold - 2)
+    indices = [0]
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        # Average point of the next bucket
+        avg_start = int((bucket + 1) * every) + 1
+        avg_end = min(int((bucket + 2) * every) + 1, length)
+        avg_count = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / avg_count
+        avg_y = sum(ys[avg_start:avg_end]) / avg_count
+
+        # Point of the current bucket with the largest triangle area
+        range_start = int(bucket * every) + 1
+        range_end = int((bucket + 1) * every) + 1
+        point_x = xs[previous]
+        point_y = ys[previous]
+
+        max_area = -1
+        selected = range_start
+        for index in range(range_start, range_end):
+            area = abs(
+                (point_x - avg_x) * (ys[index] - point_y)
+                - (point_x - xs[index]) * (avg_y - point_y)
+            )
+            if area > max_area:
+                max_area = area
+                selected = index
+
+        indices.append(selected)
+        previous = selected
+
+    indices.append(length - 1)
+    return indices
+
+
+def downsample(dates, *series, max_points=None):
+    """Downsample a date axis and one or more value series that share it
+
+    ``dates`` are ``YYYY-MM-DD`` strings or dates. Every series gets an equal
+    share of the point budget and the union of the kept points is applied to
+    the axis and all series, so dual-axis charts (weight and BMI) stay
+    aligned. Returns ``(dates, series_1, series_2, ...)`` as lists.
+    """
+    if max_points is None:
+        max_points = get_max_points()
+
+    if len(dates) <= max_points:
+        return (list(dates),) + tuple(list(values) for values in series)
+
+    xs = [
+        (day if isinstance(day, date) else date.fromisoformat(day)).toordinal()
+        for day in dates
+    ]
+    budget = max(max_points // max(len(series), 1), 3)
+
+    keep = set()
+    for values in series:
+        keep.update(lttb_indices(xs, [value or 0 for value in values], budget))
+    keep = sorted(keep)
+
+    return (
+        [dates[index] for index in keep],
+    ) + tuple([values[index] for index in keep] for values in series)
+
+
+def _format_dates(days):
+    return [day.strftime('%Y-%m-%d') for day in days]
+
+
+def steps_chart(records):
+    """Daily steps series"""
+    rows = list(records.order_by('date', 'id').values_list('date', 'steps_count'))
+    dates, steps = downsample(_format_dates(row[0] for row in rows), [row[1] for row in rows])
+    return {'dates': dates, 'data': steps}
+
+
+def sleep_chart(records):
+    """Sleep duration series in hours"""
+    rows = list(records.order_by('date', 'id').values_list('date', 'hours', 'minutes'))
+    dates, hours = downsample(
+        _format_dates(row[0] for row in rows),
+        [row[1] + (row[2] / 60) for row in rows],
+    )
+    return {'dates': dates, 'data': hours}
+
+
+def diet_chart(records):
+    """Calories intake series"""
+    rows = list(records.order_by('date', 'id').values_list('date', 'calories'))
+    dates, calories = downsample(_format_dates(row[0] for row in rows), [row[1] for row in rows])
+    return {'dates': dates, 'data': calories}
+
+
+def running_chart(records):
+    """Running distance series"""
+    rows = list(records.order_by('date', 'id').values_list('date', 'distance'))
+    dates, distances = downsample(_format_dates(row[0] for row in rows), [float(row[1]) for row in rows])
+    return {'dates': dates, 'data': distances}
+
+
+def weight_chart(records):
+    """Weight and BMI series, downsampled together so both axes keep the same dates"""
+    rows = list(records.order_by('date', 'id').values_list('date', 'weight', 'height'))
+    weights = [float(row[1]) for row in rows]
+    # Same formula as WeightRecord.bmi()
+    bmis = [round(row[1] / ((row[2] / 100) ** 2), 2) if row[2] > 0 else 0 for row in rows]
+    dates, weights, bmis = downsample(_format_dates(row[0] for row in rows), weights, bmis)
+    return {'dates': dates, 'data': weights, 'bmi_data': bmis}
+
+
+def training_chart(records):
+    """Training minutes per day, one series per exercise type
+
+    The database sums the minutes per (date, exercise type), so only one row
+    per pair comes back; a single pass over those rows fills a dense
+    exercise type x day matrix.
+    """
+    groups = list(
+        records.order_by('date').values('date', 'exercise_type').annotate(minutes=Sum('duration_minutes'))
+    )
+
+    day_index = {}
+    type_index = {}
+    for group in groups:
+        day_index.setdefault(group['date'], len(day_index))
+        type_index.setdefault(group['exercise_type'] or 'Other', len(type_index))
+
+    matrix = [[0] * len(day_index) for _ in type_index]
+    daily_totals = [0] * len(day_index)
+    for group in groups:
+        minutes = group['minutes'] or 0
+        column = day_index[group['date']]
+        matrix[type_index[group['exercise_type'] or 'Other']][column] += minutes
+        daily_totals[column] += minutes
+
+    # Downsample on the daily total so the kept days follow the overall training load
+    dates = _format_dates(day_index)
+    sampled_dates = downsample(dates, daily_totals)[0]
+    if len(sampled_dates) < len(dates):
+        positions = {day: column for column, day in enumerate(dates)}
+        columns = [positions[day] for day in sampled_dates]
+        matrix = [[row[column] for column in columns] for row in matrix]
+
+    exercise_types = list(type_index)
+    return {
+        'dates': sampled_dates,
+        'exercise_data': dict(zip(exercise_types, matrix)),
+        'exercise_types': exercise_types,
+    }
@@ -0,0 +1,86 @@
+"""Merging of the same-day records stored before the one-record-per-day constraints.
+
+Steps, meals and runs logged several times on one day add up to that day's
+total, so migration 0008 merges them into the day's latest record: their
+amounts are summed and their notes joined. Sleep, mood and weight records
+are readings that cannot be added up; merging them keeps only the latest
+values, so the migration stops when it finds any and
+``manage.py merge_duplicate_days`` merges them after exporting every
+affected record to a CSV file.
+
+The functions take the model to work on, so the migration can pass its
+historical models.
+"""
+import csv
+
+from django.db.models import Count
+
+DAILY_RECORD_MODELS = ['StepsRecord', 'SleepRecord', 'DietRecord', 'RunningRecord', 'MoodRecord', 'WeightRecord']
+# Fields summed when a day's records are merged
+ADDITIVE_FIELDS = {
+    'StepsRecord': ['steps_count'],
+    'DietRecord': ['calories', 'protein', 'carbs', 'fat'],
+    'RunningRecord': ['distance', 'duration_minutes', 'calories_burned'],
+}
+
+
+def find_duplicate_days(model):
+    """(user_id, date) of every day with more than one record"""
+    return (
+        model.objects.values('user_id', 'date')
+        .annotate(records=Count('id'))
+        .filter(records__gt=1)
+        .order_by()
+    )
+
+
+def merge_duplicate_days(model):
+    """Merge every day's records into its latest one and return the number of records merged away
+
+    The fields of ADDITIVE_FIELDS are summed (empty values count as nothing),
+    notes are joined oldest first, and every other field keeps the value of
+    the latest record.
+    """
+    additive = ADDITIVE_FIELDS.get(model.__name__, [])
+    has_notes = any(field.name == 'notes' for field in model._meta.concrete_fields)
+    merged = 0
+
+    # Read before merging, which deletes from the table being grouped
+    for day in list(find_duplicate_days(model)):
+        records = list(model.objects.filter(user_id=day['user_id'], date=day['date']).order_by('created_at', 'id'))
+        keep = records[-1]
+
+        values = {}
+        for field in additive:
+            amounts = [getattr(record, field) for record in records if getattr(record, field) is not None]
+            values[field] = sum(amounts) if amounts else None
+        if has_notes:
+            notes = [record.notes.strip() for record in records if record.notes and record.notes.strip()]
+            values['notes'] = '\n'.join(notes) or None
+
+        model.objects.filter(pk=keep.pk).update(**values)
+        merged += model.objects.filter(pk__in=[record.pk for record in records[:-1]]).delete()[0]
+    return merged
+
+
+def export_duplicate_records(models, file):
+    """Write every record of a duplicated day to a CSV file, one section per record type
+
+    Returns the number of records written.
+    """
+    writer = csv.writer(file)
+    written = 0
+    for model in models:
+        fields = [field.attname for field in model._meta.concrete_fields]
+        days = list(find_duplicate_days(model))
+        if not days:
+            continue
+        writer.writerow([model.__name__])
+        writer.writerow(fields)
+        for day in days:
+            records = model.objects.filter(user_id=day['user_id'], date=day['date']).order_by('created_at', 'id')
+            for row in records.values_list(*fields):
+                writer.writerow(row)
+                written += 1
+        writer.writerow([])
+    return written
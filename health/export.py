@@ -0,0 +1,316 @@
+"""Streaming exports of a user's health records.
+
+The default export is one CSV file with a short header followed by one
+section per record type. Rows are read with ``values_list(...).iterator()``
+and written through ``csv.writer`` into a pseudo-buffer that just hands the
+encoded line back, so neither the records nor the file are ever held in
+memory and the first bytes reach the client before the database has been
+read to the end.
+
+The same sections can also be exported as a gzip-compressed CSV, a ZIP with
+one CSV per record type, or newline-delimited JSON; all are produced
+incrementally in the same way.
+
+Every export can be limited to the records changed within a window of
+``updated_at`` values. Delta exports use the window ``(since, watermark]``
+where ``watermark`` is ``get_watermark`` read before the export starts;
+clients pass it back as ``since`` next time. Deleted records are not
+reported by a delta export.
+"""
+import csv
+import itertools
+import zipfile
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (
+    StepsRecord, SleepRecord, DietRecord,
+    RunningRecord, TrainingRecord, MoodRecord, WeightRecord
+)
+
+# Rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = 2000
+# Encoded lines are sent to the client in blocks of about this many characters
+EXPORT_BLOCK_SIZE = 64 * 1024
+
+
+def _date(value):
+    return value.strftime('%Y-%m-%d')
+
+
+def _timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _plain(value):
+    return value
+
+
+def _optional(value):
+    return value if value else ''
+
+
+def _text(value):
+    return value.replace('\n', ' ') if value else ''
+
+
+def _bmi(weight, height):
+    # Same formula as WeightRecord.bmi()
+    if height > 0:
+        height_in_meters = height / 100
+        return round(weight / (height_in_meters * height_in_meters), 2)
+    return 0
+
+
+# Every section: (title, model, [(column header, source field(s), formatter), ...])
+EXPORT_SECTIONS = [
+    ('STEPS RECORDS', StepsRecord, [
+        ('Date', 'date', _date),
+        ('Steps Count', 'steps_count', _plain),
+        ('Created At', 'created_at', _timestamp),
+    ]),
+    ('SLEEP RECORDS', SleepRecord, [
+        ('Date', 'date', _date),
+        ('Hours', 'hours', _plain),
+        ('Minutes', 'minutes', _plain),
+        ('Quality', 'quality', _plain),
+        ('Created At', 'created_at', _timestamp),
+    ]),
+    ('DIET RECORDS', DietRecord, [
+        ('Date', 'date', _date),
+        ('Calories', 'calories', _plain),
+        ('Protein', 'protein', _optional),
+        ('Carbs', 'carbs', _optional),
+        ('Fat', 'fat', _optional),
+        ('Notes', 'notes', _text),
+        ('Created At', 'created_at', _timestamp),
+    ]),
+    ('RUNNING RECORDS', RunningRecord, [
+        ('Date', 'date', _date),
+        ('Distance', 'distance', _plain),
+        ('Duration Minutes', 'duration_minutes', _plain),
+        ('Calories Burned', 'calories_burned', _optional),
+        ('Created At', 'created_at', _timestamp),
+    ]),
+    ('TRAINING RECORDS', TrainingRecord, [
+        ('Date', 'date', _date),
+        ('Exercise Type', 'exercise_type', _plain),
+        ('Sets', 'sets', _optional),
+        ('Reps', 'reps', _optional),
+        ('Weight', 'weight', _optional),
+        ('Duration Minutes', 'duration_minutes', _optional),
+        ('Calories Burned', 'calories_burned', _optional),
+        ('Notes', 'notes', _text),
+        ('Created At', 'created_at', _timestamp),
+    ]),
+    ('MOOD RECORDS', MoodRecord, [
+        ('Date', 'date', _date),
+        ('Mood', 'mood', _plain),
+        ('Stress Level', 'stress_level', _optional),
+        ('Notes', 'notes', _text),
+        ('Created At', 'created_at', _timestamp),
+    ]),
+    ('WEIGHT RECORDS', WeightRecord, [
+        ('Date', 'date', _date),
+        ('Weight', 'weight', _plain),
+        ('Height', 'height', _plain),
+        ('BMI', ('weight', 'height'), _bmi),
+        ('Notes', 'notes', _text),
+        ('Created At', 'created_at', _timestamp),
+    ]),
+]
+
+
+def _sources(source):
+    return source if isinstance(source, tuple) else (source,)
+
+
+def _select(columns):
+    """Return the fields to select for a section and, per column, the positions of its source fields"""
+    fields = []
+    for _, source, _ in columns:
+        for field in _sources(source):
+            if field not in fields:
+                fields.append(field)
+    positions = [[fields.index(field) for field in _sources(source)] for _, source, _ in columns]
+    return fields, positions
+
+
+def section_name(title):
+    """Short lowercase name of a section, e.g. 'steps' for 'STEPS RECORDS'"""
+    return title.split()[0].lower()
+
+
+def get_watermark(user):
+    """Latest ``updated_at`` over all of a user's records, or None if there are none"""
+    latest = [
+        model.objects.filter(user=user).aggregate(latest=Max('updated_at'))['latest']
+        for _, model, _ in EXPORT_SECTIONS
+    ]
+    latest = [value for value in latest if value is not None]
+    return max(latest) if latest else None
+
+
+def export_records(user, model, since=None, until=None):
+    """A user's records of one type, restricted to those updated after ``since`` and up to ``until``"""
+    records = model.objects.filter(user=user)
+    if since is not None:
+        records = records.filter(updated_at__gt=since)
+    if until is not None:
+        records = records.filter(updated_at__lte=until)
+    return records
+
+
+def iter_section_values(user, model, columns, chunk_size=EXPORT_CHUNK_SIZE, since=None, until=None):
+    """Yield the raw selected values of one section's records, oldest first"""
+    fields, _ = _select(columns)
+    rows = export_records(user, model, since, until).order_by('date').values_list(*fields)
+    return rows.iterator(chunk_size=chunk_size)
+
+
+def iter_section_rows(user, model, columns, chunk_size=EXPORT_CHUNK_SIZE, since=None, until=None):
+    """Yield the formatted CSV data rows of one section, oldest first"""
+    _, positions = _select(columns)
+    getters = list(zip(positions, [format_value for _, _, format_value in columns]))
+    for row in iter_section_values(user, model, columns, chunk_size, since, until):
+        yield [format_value(*[row[index] for index in indices]) for indices, format_value in getters]
+
+
+def iter_export_rows(user, chunk_size=EXPORT_CHUNK_SIZE, since=None, until=None):
+    """Yield every row of the export: the header, then each section separated by an empty row"""
+    yield ['WellLog Health Data Export']
+    yield [f'User: {user.username}']
+    yield [f'Export Date: {timezone.now().strftime("%Y-%m-%d %H:%M:%S")}']
+
+    for title, model, columns in EXPORT_SECTIONS:
+        yield []  # Empty line to separate
+        yield [title]
+        yield [header for header, _, _ in columns]
+        yield from iter_section_rows(user, model, columns, chunk_size, since, until)
+
+
+class Echo:
+    """File-like object whose write() returns the written value instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, block_size=EXPORT_BLOCK_SIZE):
+    """Encode rows as CSV lines, yielding them in blocks of about ``block_size`` characters
+
+    The first block is sent as soon as its first line is ready, so the
+    download starts before the first section query has finished.
+    """
+    writer = csv.writer(Echo())
+    block = []
+    size = 0
+    first = True
+    for row in rows:
+        line = writer.writerow(row)
+        block.append(line)
+        size += len(line)
+        if first or size >= block_size:
+            yield ''.join(block)
+            block = []
+            size = 0
+            first = False
+    if block:
+        yield ''.join(block)
+
+
+def stream_gzip(blocks):
+    """Gzip-compress text blocks on the fly
+
+    Every block is followed by a sync flush, so the client can decompress
+    what it has received so far; with 64 KB blocks this costs almost nothing
+    in compression ratio.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for block in blocks:
+        yield compressor.compress(block.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+class ZipStream:
+    """Unseekable file object that hands the bytes written by ZipFile back to a generator
+
+    ``zipfile`` falls back to data descriptors when it cannot seek, so each
+    member is written once, front to back, and never has to be held whole.
+    """
+
+    def __init__(self):
+        self.buffer = []
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def stream_zip(user, chunk_size=EXPORT_CHUNK_SIZE, block_size=EXPORT_BLOCK_SIZE, since=None, until=None):
+    """Yield a ZIP archive with one CSV file per record type"""
+    # Deflate buffers internally, so not every written block produces output
+    return (data for data in _zip_parts(user, chunk_size, block_size, since, until) if data)
+
+
+def _zip_parts(user, chunk_size, block_size, since, until):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for title, model, columns in EXPORT_SECTIONS:
+            info = zipfile.ZipInfo(f'{section_name(title)}.csv', date_time=timezone.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, mode='w', force_zip64=True) as member:
+                rows = iter_section_rows(user, model, columns, chunk_size, since, until)
+                header = [[header for header, _, _ in columns]]
+                for block in stream_csv(itertools.chain(header, rows), block_size):
+                    member.write(block.encode())
+                    yield stream.pop()
+            # Rest of the compressed member and its data descriptor
+            yield stream.pop()
+    # Central directory
+    yield stream.pop()
+
+
+def _json_key(header):
+    return header.lower().replace(' ', '_')
+
+
+def stream_ndjson(user, chunk_size=EXPORT_CHUNK_SIZE, block_size=EXPORT_BLOCK_SIZE, since=None, until=None):
+    """Yield one JSON object per record and line, tagged with its record type
+
+    Values are the stored values (null for empty fields, ISO dates and
+    timestamps) rather than the CSV's display formatting.
+    """
+    encoder = DjangoJSONEncoder()
+    block = []
+    size = 0
+    for title, model, columns in EXPORT_SECTIONS:
+        _, positions = _select(columns)
+        record_type = section_name(title)
+        keys = [_json_key(header) for header, _, _ in columns]
+        for row in iter_section_values(user, model, columns, chunk_size, since, until):
+            record = {'type': record_type}
+            for key, indices, (_, source, format_value) in zip(keys, positions, columns):
+                values = [row[index] for index in indices]
+                # Computed columns (BMI) still go through their formatter
+                record[key] = format_value(*values) if isinstance(source, tuple) else values[0]
+            line = encoder.encode(record) + '\n'
+            block.append(line)
+            size += len(line)
+            if size >= block_size:
+                yield ''.join(block)
+                block = []
+                size = 0
+    if block:
+        yield ''.join(block)
@@ -1,4 +1,5 @@
 from django import forms
+from django.forms.models import construct_instance
 from .models import StepsRecord, SleepRecord, DietRecord, RunningRecord, TrainingRecord, MoodRecord, WeightRecord, HealthGoal
 
 class DateInput(forms.DateInput):
@@ -115,4 +116,29 @@ class HealthGoalForm(forms.ModelForm):
             'weekly_training_sessions_goal': 'Weekly Training Sessions',
             'daily_calories_goal': 'Daily Calories Goal',
             'daily_protein_goal': 'Daily Protein Goal (g)',
-        } 
\ No newline at end of file
+        } 
+
+def save_daily_record(form, user):
+    """Save an added one-per-day record; if the user already has one for that date, update it instead
+
+    Returns (record, created), like get_or_create().
+    """
+    model = form._meta.model
+    existing = model.objects.filter(user=user, date=form.cleaned_data['date']).first()
+    if existing is not None:
+        construct_instance(form, existing, form._meta.fields, form._meta.exclude)
+        existing.save()
+        return existing, False
+    record = form.save(commit=False)
+    record.user = user
+    record.save()
+    return record, True
+
+
+def check_daily_date_free(form, user):
+    """Add a form error if another of the user's one-per-day records already uses the form's date"""
+    model = form._meta.model
+    taken = model.objects.filter(user=user, date=form.cleaned_data['date']).exclude(pk=form.instance.pk).exists()
+    if taken:
+        form.add_error('date', f'You already have a {model._meta.verbose_name} for this date.')
+    return not taken
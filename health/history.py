@@ -0,0 +1,134 @@
+"""Declarative history pages for the health record types.
+
+Every history page filters the user's records by an optional date range,
+computes summary statistics, builds (downsampled) chart series for the
+filtered range or the last 30 days, and shows one keyset-paginated page of
+records. ``RecordHistoryView`` implements that pipeline once; each record
+type only declares its model, the function computing its aggregates, the
+metrics it shows, and its chart builder and series, e.g.::
+
+    class StepsRecordHistoryView(RecordHistoryView):
+        model = StepsRecord
+        aggregate = staticmethod(stats.steps_summary_stats)
+        summary_stats = True
+        metrics = ['avg_steps', 'max_steps']
+        chart = staticmethod(charts.steps_chart)
+
+Aggregates and chart series are cached per user and date range (see
+``health.cache``); the page of records itself is always read fresh.
+"""
+import json
+from datetime import datetime, timedelta
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.utils import timezone
+from django.views.generic import TemplateView
+
+from .cache import get_history_snapshot
+from .models import DailyHealthSummary
+from .pagination import CursorPaginator
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD filter value, ignoring invalid input"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+class RecordHistoryView(LoginRequiredMixin, TemplateView):
+    """Filtered, aggregated, charted and paginated history of one record type"""
+
+    template_name = 'health/record_history.html'
+    model = None
+    # Label shown by record_history.html and the navigation tab to highlight
+    record_type = None
+    active_tab = None
+    # Context name of the page of records
+    records_context_name = 'records'
+    paginate_by = 10
+
+    # Function computing the aggregates of the filtered records (see health.stats)
+    aggregate = None
+    # Whether aggregate takes the user's DailyHealthSummary rows of the date range instead of the records
+    summary_stats = False
+    # Keys of the aggregate result put into the context (record_count is always included)
+    metrics = []
+
+    # Function building the chart series (see health.charts), or None for pages without a chart
+    chart = None
+    # Context name -> key of the chart result; values are passed to the template as JSON
+    chart_series = {'chart_dates': 'dates', 'chart_data': 'data'}
+    # Chart range when no date filter is set
+    chart_days = 30
+
+    def get_date_range(self):
+        return self.request.GET.get('date_from'), self.request.GET.get('date_to')
+
+    def get_records(self):
+        """The user's records, newest first, restricted to the requested date range"""
+        records = self.model.objects.filter(user=self.request.user).order_by('-date')
+        date_from, date_to = self.get_date_range()
+        if parse_date(date_from):
+            records = records.filter(date__gte=parse_date(date_from))
+        if parse_date(date_to):
+            records = records.filter(date__lte=parse_date(date_to))
+        return records
+
+    def get_summaries(self):
+        """The user's daily summaries, restricted to the requested date range"""
+        summaries = DailyHealthSummary.objects.filter(user=self.request.user)
+        date_from, date_to = self.get_date_range()
+        if parse_date(date_from):
+            summaries = summaries.filter(date__gte=parse_date(date_from))
+        if parse_date(date_to):
+            summaries = summaries.filter(date__lte=parse_date(date_to))
+        return summaries
+
+    def get_chart_records(self, records):
+        """Records shown in the chart: the filtered range, or the last ``chart_days`` days by default"""
+        date_from, date_to = self.get_date_range()
+        if date_from or date_to:
+            return records.order_by('date')
+        since = timezone.now().date() - timedelta(days=self.chart_days)
+        return self.model.objects.filter(user=self.request.user, date__gte=since).order_by('date')
+
+    def get_snapshot(self, records):
+        """Aggregates and chart series, cached until a record of this type changes"""
+        def build():
+            aggregated = self.aggregate(self.get_summaries() if self.summary_stats else records)
+            snapshot = {'stats': aggregated, 'chart': None}
+            if self.chart is not None:
+                snapshot['chart'] = self.chart(self.get_chart_records(records))
+            return snapshot
+
+        date_from, date_to = self.get_date_range()
+        return get_history_snapshot(self.request.user.pk, self.model, date_from, date_to, build)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        records = self.get_records()
+        snapshot = self.get_snapshot(records)
+        date_from, date_to = self.get_date_range()
+
+        context[self.records_context_name] = CursorPaginator(records, self.paginate_by).page(
+            self.request.GET.get('cursor')
+        )
+        if self.record_type:
+            context['record_type'] = self.record_type
+        context['record_count'] = snapshot['stats']['record_count']
+        for metric in self.metrics:
+            context[metric] = snapshot['stats'][metric]
+        if snapshot['chart'] is not None:
+            for name, key in self.chart_series.items():
+                context[name] = json.dumps(snapshot['chart'][key])
+            context['chart_type'] = self.request.GET.get('chart_type', 'line')
+        context.update({
+            'active_tab': self.active_tab,
+            'date_from': date_from,
+            'date_to': date_to,
+        })
+        return context
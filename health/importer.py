@@ -0,0 +1,287 @@
+"""Batched import of the CSV format written by ``health.export``.
+
+Rows are parsed and validated into unsaved model instances and written a
+batch at a time: the one-per-day record types with
+``bulk_create(update_conflicts=True, unique_fields=['user', 'date'])``, so a
+row for a day that already has a record updates it, and training records
+(several per day) with a plain ``bulk_create``. Within a batch the last row
+of a day wins, as it would with one ``update_or_create`` per row.
+
+``bulk_create`` sends no model signals, so the importer rebuilds the user's
+daily summaries and drops their cached history pages once at the end.
+
+Uploads are read through ``open_import_file``, which decodes (and, for
+gzip-compressed uploads, decompresses) the file a buffer at a time, so the
+upload is never held in memory as a whole. Very large plain files on disk
+can instead be parsed by a process pool (``run_parallel``, see
+``health.parsing``); the batched writes stay in this process.
+
+``validate_import`` is the dry run: it parses a file the same way and
+reports what an import would write and reject, without writing anything.
+"""
+import gzip
+import io
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from django.db import transaction
+
+from .cache import invalidate_history
+from .models import (
+    StepsRecord, SleepRecord, DietRecord,
+    RunningRecord, TrainingRecord, MoodRecord, WeightRecord
+)
+from .parsing import (
+    parse_steps, parse_sleep, parse_diet, parse_running,
+    parse_training, parse_mood, parse_weight, parse_file_parallel, column_errors, PARSE_CHUNK_SIZE
+)
+from .summary import rebuild_daily_summaries
+
+# Rows written per INSERT statement
+IMPORT_BATCH_SIZE = 1000
+# Invalid cells listed per section and column by validate_import
+IMPORT_REPORT_MAX_ERRORS = 10
+# First bytes of every gzip stream
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Section name (first word of its title line) -> (model, row parser, one record per day)
+IMPORT_SECTIONS = {
+    'steps': (StepsRecord, parse_steps, True),
+    'sleep': (SleepRecord, parse_sleep, True),
+    'diet': (DietRecord, parse_diet, True),
+    'running': (RunningRecord, parse_running, True),
+    'training': (TrainingRecord, parse_training, False),
+    'mood': (MoodRecord, parse_mood, True),
+    'weight': (WeightRecord, parse_weight, True),
+}
+
+
+@contextmanager
+def open_import_file(uploaded_file):
+    """Open an uploaded CSV, plain or gzip-compressed, as a text stream for ``csv.reader``
+
+    Reads the upload's own file object: the temporary file on disk for
+    uploads larger than ``FILE_UPLOAD_MAX_MEMORY_SIZE``, the in-memory buffer
+    for smaller ones. Compression is detected from the content, not the name.
+    """
+    raw = uploaded_file.file
+    raw.seek(0)
+    compressed = raw.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    raw.seek(0)
+
+    binary = gzip.GzipFile(fileobj=raw, mode='rb') if compressed else raw
+    text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+    try:
+        yield text
+    finally:
+        # Leave closing the upload itself to Django
+        text.detach()
+        if compressed:
+            binary.close()
+
+
+def iter_section_rows(rows):
+    """Yield (section name, row) for the data rows of every known section"""
+    current_section = None
+    headers = None
+
+    for row in rows:
+        # Skip empty lines
+        if not row or not any(row):
+            continue
+
+        # Section title line, e.g. "STEPS RECORDS"
+        if len(row) == 1 and row[0].endswith('RECORDS'):
+            current_section = row[0].split()[0].lower()
+            headers = None
+            continue
+
+        # Column header line of the current section
+        if current_section and not headers and 'date' in row[0].lower():
+            headers = row
+            continue
+
+        if current_section in IMPORT_SECTIONS and headers:
+            yield current_section, row
+
+
+def count_existing_days(user, section, days):
+    """Number of rows, given as a Counter of dates, for days the user already has records of a section for
+
+    Uses one query over the dates' range, however many there are.
+    """
+    if not days:
+        return 0
+    model = IMPORT_SECTIONS[section][0]
+    existing = set(
+        model.objects.filter(user=user, date__range=(min(days), max(days)))
+        .values_list('date', flat=True).distinct()
+    )
+    return sum(count for day, count in days.items() if day in existing)
+
+
+def validate_import(user, rows, max_errors=IMPORT_REPORT_MAX_ERRORS):
+    """Parse and validate every row without writing anything, and return a report of what an import would do
+
+    Per section the report counts the data rows, the valid and invalid ones,
+    the valid rows for days the user already has records for (updated by the
+    import for one-per-day types, added alongside for training) and, for
+    one-per-day types, the rows for a day that appears earlier in the file.
+    Existing days are found with one query per section over the file's date
+    range. Up to ``max_errors`` invalid cells are listed per column, with
+    their line number when ``rows`` is a ``csv.reader``::
+
+        {'rows': 12, 'valid': 11, 'invalid': 1,
+         'sections': {'steps': {'rows': 4, 'valid': 3, 'invalid': 1, 'existing': 1, 'duplicates': 1}, ...},
+         'errors': {'steps': {'Date': [{'line': 9, 'value': 'not-a-date', 'message': '...'}]}}}
+    """
+    sections = {
+        name: {'rows': 0, 'valid': 0, 'invalid': 0, 'existing': 0, 'duplicates': 0}
+        for name in IMPORT_SECTIONS
+    }
+    errors = {}
+    dates = {name: Counter() for name in IMPORT_SECTIONS}
+
+    for section, row in iter_section_rows(rows):
+        stats = sections[section]
+        stats['rows'] += 1
+        try:
+            values = IMPORT_SECTIONS[section][1](row)
+        except (ValueError, IndexError) as e:
+            stats['invalid'] += 1
+            line = getattr(rows, 'line_num', None)
+            for column, value, message in column_errors(section, row) or [('Row', ','.join(row), str(e))]:
+                listed = errors.setdefault(section, {}).setdefault(column, [])
+                if len(listed) < max_errors:
+                    listed.append({'line': line, 'value': value, 'message': message})
+            continue
+        stats['valid'] += 1
+        dates[section][values['date']] += 1
+
+    for section, days in dates.items():
+        sections[section]['existing'] = count_existing_days(user, section, days)
+        if IMPORT_SECTIONS[section][2]:
+            sections[section]['duplicates'] = sum(count - 1 for count in days.values())
+
+    return {
+        'rows': sum(stats['rows'] for stats in sections.values()),
+        'valid': sum(stats['valid'] for stats in sections.values()),
+        'invalid': sum(stats['invalid'] for stats in sections.values()),
+        'sections': sections,
+        'errors': errors,
+    }
+
+
+class HealthDataImporter:
+    """Import CSV rows for one user, writing each section in batches
+
+    Usage::
+
+        importer = HealthDataImporter(user)
+        counts = importer.run(csv.reader(file))
+    """
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE, progress=None):
+        self.user = user
+        self.batch_size = batch_size
+        # Called with the rows read so far and the counts after every written batch
+        self.progress = progress
+        self.rows_processed = 0
+        self.counts = {name: 0 for name in IMPORT_SECTIONS}
+        self.counts['errors'] = 0
+        self.pending = {name: [] for name in IMPORT_SECTIONS}
+        self.touched = set()
+
+    def run(self, rows, atomic=True):
+        """Import every row and return the number of imported rows per section plus 'errors'
+
+        With ``atomic=False`` every batch is committed on its own, so the
+        progress of a long import is visible to other connections.
+        """
+        with transaction.atomic() if atomic else nullcontext():
+            self.import_rows(rows)
+            self.finish()
+        return self.counts
+
+    def run_parallel(self, path, workers, chunk_size=PARSE_CHUNK_SIZE, atomic=True):
+        """Like ``run``, but parse the plain CSV file at ``path`` in ``workers`` processes"""
+        with transaction.atomic() if atomic else nullcontext():
+            for section, fields, parsed, errors in parse_file_parallel(path, workers, chunk_size):
+                self.rows_processed += len(parsed) + len(errors)
+                self.counts['errors'] += len(errors)
+                for message in errors:
+                    print(message)
+                for values in parsed:
+                    self.add_values(section, dict(zip(fields, values)))
+            self.finish()
+        return self.counts
+
+    def import_rows(self, rows):
+        """Parse rows section by section, flushing a section whenever its batch is full"""
+        for section, row in iter_section_rows(rows):
+            self.add_row(section, row)
+
+    def add_row(self, section, row):
+        """Validate one data row and queue it for its section's next batch"""
+        _, parse, _ = IMPORT_SECTIONS[section]
+        self.rows_processed += 1
+        try:
+            values = parse(row)
+        except (ValueError, IndexError) as e:
+            self.counts['errors'] += 1
+            print(f"Error importing row: {row}, Error: {e}")
+            return
+        self.add_values(section, values)
+
+    def add_values(self, section, values):
+        """Queue the parsed values of one row for its section's next batch"""
+        model = IMPORT_SECTIONS[section][0]
+        self.pending[section].append(model(user=self.user, **values))
+        self.counts[section] += 1
+        if len(self.pending[section]) >= self.batch_size:
+            self.flush(section)
+
+    def flush(self, section):
+        """Write a section's queued records"""
+        records = self.pending[section]
+        if not records:
+            return
+        self.pending[section] = []
+
+        model, _, one_per_day = IMPORT_SECTIONS[section]
+        self.touched.add(model)
+        if not one_per_day:
+            model.objects.bulk_create(records, batch_size=self.batch_size)
+        else:
+            # The last row of a day wins; a single INSERT may not touch the same row twice
+            by_date = {record.date: record for record in records}
+            update_fields = [
+                field.name for field in model._meta.concrete_fields
+                if field.name not in ('id', 'user', 'date', 'created_at')
+            ]
+            model.objects.bulk_create(
+                list(by_date.values()),
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['user', 'date'],
+                update_fields=update_fields,
+            )
+
+        if self.progress is not None:
+            self.progress(self.rows_processed, self.counts)
+
+    def finish(self):
+        """Write the remaining batches and bring the derived data up to date"""
+        for section in IMPORT_SECTIONS:
+            self.flush(section)
+        self.refresh_derived_data()
+
+    def refresh_derived_data(self):
+        """Rebuild the daily summaries and drop the cached history of the record types written so far
+
+        Also needed when a non-atomic import fails, as its committed batches stay.
+        """
+        if self.touched:
+            rebuild_daily_summaries(user_ids=[self.user.pk])
+        for model in self.touched:
+            invalidate_history(self.user.pk, model)
@@ -0,0 +1,213 @@
+"""Background imports of uploaded CSV files.
+
+``import_health_data`` stores the upload as an ``ImportJob`` and returns
+straight away. The job is then picked up by one of two workers, chosen with
+the ``HEALTH_IMPORT_IN_PROCESS`` setting:
+
+* in-process (the default): a daemon thread started once the request's
+  transaction has committed;
+* database-backed: ``manage.py run_import_jobs``, which claims pending jobs
+  from the table, so imports keep running outside the web workers.
+
+Jobs are claimed with a conditional UPDATE, so a job is never run twice even
+with several workers. The import commits batch by batch and writes its
+progress and a heartbeat to the job row after every batch, where
+``import_job_status`` reads it. The uploaded file is deleted once the job
+has finished, and the daily summaries and cached history pages are brought
+up to date even if it failed, since the batches written before the failure
+stay. Dry-run jobs only validate the file and store the report instead.
+
+A worker that is stopped mid-job (a web worker restarted by a deploy, for
+the in-process threads) leaves its job running. Running jobs without a
+heartbeat for ``HEALTH_IMPORT_STALE_AFTER`` seconds are marked as failed by
+the next worker looking for jobs, or when their status is polled.
+
+Apple Health exports (``.xml``, ``.xml.gz`` or the Health app's ``.zip``)
+go through ``health.apple_health`` instead of the CSV importer, and GPX/TCX
+run files (or a ZIP of them, which is how several uploaded files are
+stored) through ``health.tracks``. Plain CSV
+files of at least ``HEALTH_IMPORT_PARALLEL_MIN_SIZE`` bytes on
+local storage can be parsed by ``HEALTH_IMPORT_PARALLEL_WORKERS`` processes
+(see ``health.parsing``); the setting is off by default.
+"""
+import csv
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .apple_health import AppleHealthImporter, is_apple_health_file, open_apple_health_export
+from .cache import invalidate_history
+from .importer import GZIP_MAGIC, IMPORT_SECTIONS, HealthDataImporter, open_import_file, validate_import
+from .models import ImportJob
+from .summary import rebuild_daily_summaries
+from .tracks import TrackImporter, is_track_archive, is_track_file
+
+DEFAULT_STALE_AFTER = 15 * 60
+STALE_JOB_ERROR = 'The import was interrupted, probably by a server restart. Rows imported before that were kept.'
+
+
+def create_import_job(user, uploaded_file, dry_run=False):
+    """Store an upload as a pending import job and hand it to the in-process worker if enabled"""
+    job = ImportJob.objects.create(user=user, file=uploaded_file, dry_run=dry_run)
+    if getattr(settings, 'HEALTH_IMPORT_IN_PROCESS', True):
+        transaction.on_commit(lambda: start_import_thread(job.pk))
+    return job
+
+
+def start_import_thread(job_id):
+    thread = threading.Thread(target=_run_in_thread, args=(job_id,), name=f'import-job-{job_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def _run_in_thread(job_id):
+    try:
+        run_import_job(job_id)
+    finally:
+        # The thread opened its own database connection
+        connection.close()
+
+
+def fail_stale_import_jobs(jobs=None):
+    """Mark running jobs (of ``jobs``, or all) whose worker stopped as failed; return how many were"""
+    jobs = ImportJob.objects.all() if jobs is None else jobs
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'HEALTH_IMPORT_STALE_AFTER', DEFAULT_STALE_AFTER))
+    stale = jobs.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+
+    failed = 0
+    for job in stale:
+        # Conditional, like claiming: a worker that sent a heartbeat in the meantime keeps its job
+        updated = ImportJob.objects.filter(pk=job.pk, status='running', heartbeat_at=job.heartbeat_at).update(
+            status='failed', error=STALE_JOB_ERROR, finished_at=timezone.now()
+        )
+        if not updated:
+            continue
+        job.file.delete(save=False)
+        ImportJob.objects.filter(pk=job.pk).update(file='')
+        # Which record types the lost worker wrote is unknown
+        rebuild_daily_summaries(user_ids=[job.user_id])
+        for model, _, _ in IMPORT_SECTIONS.values():
+            invalidate_history(job.user_id, model)
+        failed += 1
+    return failed
+
+
+def claim_import_job(job_id=None):
+    """Mark a pending job (the given one, or the oldest) as running and return it, or None"""
+    pending = ImportJob.objects.filter(status='pending')
+    if job_id is not None:
+        pending = pending.filter(pk=job_id)
+    else:
+        fail_stale_import_jobs()
+
+    for candidate in pending.order_by('created_at').values_list('pk', flat=True)[:5]:
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(pk=candidate, status='pending').update(
+            status='running', started_at=now, heartbeat_at=now
+        )
+        if claimed:
+            return ImportJob.objects.select_related('user').get(pk=candidate)
+    return None
+
+
+def parallel_import_path(job):
+    """Local path of a job's file if it should be parsed in parallel, else None"""
+    if getattr(settings, 'HEALTH_IMPORT_PARALLEL_WORKERS', 0) < 2:
+        return None
+    try:
+        path = job.file.path
+    except NotImplementedError:
+        # Remote storage: no file to split into byte ranges
+        return None
+    if job.file.size < getattr(settings, 'HEALTH_IMPORT_PARALLEL_MIN_SIZE', 0):
+        return None
+    with open(path, 'rb') as file:
+        if file.read(len(GZIP_MAGIC)) == GZIP_MAGIC:
+            return None
+    return path
+
+
+def is_track_job(job):
+    """Whether a job's file is a GPX/TCX run file or a ZIP archive of them"""
+    if is_track_file(job.file.name):
+        return True
+    if not job.file.name.lower().endswith('.zip'):
+        return False
+    with job.file.open('rb'):
+        return is_track_archive(job.file.file)
+
+
+def run_import_job(job_id=None):
+    """Claim and run one pending job; return it, or None if there was nothing to claim"""
+    job = claim_import_job(job_id)
+    if job is None:
+        return None
+
+    def progress(rows_processed, counts):
+        ImportJob.objects.filter(pk=job.pk).update(
+            rows_processed=rows_processed, counts=counts, heartbeat_at=timezone.now()
+        )
+
+    importer = HealthDataImporter(job.user, progress=progress)
+    try:
+        if is_track_job(job):
+            tracks = TrackImporter(job.user, importer)
+            with job.file.open('rb'):
+                tracks.add_upload(job.file.name, job.file.file)
+            if job.dry_run:
+                job.report = tracks.report()
+            else:
+                tracks.run(atomic=False)
+        elif is_apple_health_file(job.file.name):
+            apple_health = AppleHealthImporter(job.user, importer)
+            with job.file.open('rb'), open_apple_health_export(job.file.file) as export:
+                if job.dry_run:
+                    apple_health.read(export)
+                    job.report = apple_health.report()
+                else:
+                    apple_health.run(export, atomic=False)
+        elif job.dry_run:
+            with job.file.open('rb'), open_import_file(job.file) as decoded_file:
+                job.report = validate_import(job.user, csv.reader(decoded_file))
+        elif parallel_import_path(job):
+            importer.run_parallel(job.file.path, settings.HEALTH_IMPORT_PARALLEL_WORKERS, atomic=False)
+        else:
+            with job.file.open('rb'), open_import_file(job.file) as decoded_file:
+                importer.run(csv.reader(decoded_file), atomic=False)
+    except Exception as e:
+        print(f"Import job {job.pk} failed: {e}")
+        job.status = 'failed'
+        job.error = str(e)
+        # The batches committed before the failure stay
+        importer.refresh_derived_data()
+    else:
+        job.status = 'done'
+        if job.dry_run:
+            # Report the rows the import would write
+            importer.rows_processed = job.report['rows']
+            importer.counts.update({name: stats['valid'] for name, stats in job.report['sections'].items()})
+            importer.counts['errors'] = job.report['invalid']
+
+    job.rows_processed = importer.rows_processed
+    job.counts = importer.counts
+    job.finished_at = timezone.now()
+    job.file.delete(save=False)
+    job.save(update_fields=['status', 'error', 'rows_processed', 'counts', 'report', 'finished_at', 'file'])
+    return job
+
+
+def run_pending_import_jobs(limit=None):
+    """Run pending jobs oldest first until none are left (or ``limit`` have run); return the jobs run"""
+    jobs = []
+    while limit is None or len(jobs) < limit:
+        job = run_import_job()
+        if job is None:
+            break
+        jobs.append(job)
+    return jobs
@@ -0,0 +1,90 @@
+"""Single-query loader for the dashboard's records of the day.
+
+The dashboard shows the latest record of the day of every record type. Rather
+than one ``latest('created_at')`` query per table, ``load_latest_records``
+sends one ``UNION ALL`` of the seven tables. Every table gets the same list of
+typed column slots (the union of all record fields, ``NULL`` where a table has
+no such field) plus a ``kind`` column telling which table a row came from; the
+rows are then turned back into model instances.
+
+Branches are not sliced because SQLite does not allow ``LIMIT`` inside a
+compound query, so all of the day's rows are read; a user logs only a handful
+of records a day and every branch is an index range scan on
+``(user, date, -created_at)``.
+"""
+from django.db import router
+from django.db.models import F, IntegerField, Value
+from django.db.models.functions import Cast
+
+from .models import (
+    StepsRecord, SleepRecord, DietRecord,
+    RunningRecord, TrainingRecord, MoodRecord, WeightRecord
+)
+
+# Context name of every record type shown on the dashboard
+DASHBOARD_RECORDS = [
+    ('steps_record', StepsRecord),
+    ('sleep_record', SleepRecord),
+    ('diet_record', DietRecord),
+    ('running_record', RunningRecord),
+    ('training_record', TrainingRecord),
+    ('mood_record', MoodRecord),
+    ('weight_record', WeightRecord),
+]
+
+
+def _column_slots(models):
+    """Map every column attname to the first field defining it, in a stable order"""
+    slots = {}
+    for model in models:
+        for field in model._meta.concrete_fields:
+            slots.setdefault(field.attname, field)
+    return slots
+
+
+def _slot_name(attname):
+    return f'col_{attname}'
+
+
+def _branch(model, kind, slots, user, day):
+    """One SELECT of the union: the model's rows for the day mapped onto the shared slots"""
+    own_fields = {field.attname for field in model._meta.concrete_fields}
+    columns = {'col_kind': Value(kind, output_field=IntegerField())}
+    for attname, field in slots.items():
+        if attname in own_fields:
+            columns[_slot_name(attname)] = F(attname)
+        else:
+            # A typed NULL, so every database can resolve the union's column types
+            columns[_slot_name(attname)] = Cast(Value(None), output_field=field.__class__())
+    return (
+        model.objects.filter(user=user, date=day)
+        .order_by()
+        .annotate(**columns)
+        .values_list('col_kind', *[_slot_name(attname) for attname in slots])
+    )
+
+
+def load_latest_records(user, day, records=DASHBOARD_RECORDS):
+    """Return {context name: latest record of the day or None} using a single query"""
+    models = [model for _, model in records]
+    slots = _column_slots(models)
+    branches = [_branch(model, kind, slots, user, day) for kind, model in enumerate(models)]
+
+    union = branches[0].union(*branches[1:], all=True).order_by(
+        '-' + _slot_name('created_at'), '-' + _slot_name('id')
+    )
+
+    latest = {name: None for name, _ in records}
+    db = router.db_for_read(models[0])
+    attnames = list(slots)
+    for row in union:
+        name, model = records[row[0]]
+        if latest[name] is not None:
+            continue
+        values = dict(zip(attnames, row[1:]))
+        latest[name] = model.from_db(
+            db,
+            [field.attname for field in model._meta.concrete_fields],
+            [values[field.attname] for field in model._meta.concrete_fields],
+        )
+    return latest
@@ -0,0 +1,109 @@
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from health.apple_health import AppleHealthImporter
+
+SOURCES = ['iPhone', 'Apple Watch']
+
+
+def write_sample_export(path, records):
+    """Write an Apple Health export.xml with about ``records`` samples: mostly steps, some sleep,
+    body mass and workouts, spread over days like a real export; return the number of days"""
+    # Roughly what an iPhone and a watch record per day
+    per_day = 2 * 48 + 6 + 1 + 1
+    days = max(records // per_day, 1)
+    start = datetime(2015, 1, 1)
+
+    def stamp(moment):
+        return moment.strftime('%Y-%m-%d %H:%M:%S +0000')
+
+    with open(path, 'w') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n<HealthData locale="en_GB">\n')
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            lines = []
+            for source in SOURCES:
+                for slot in range(48):
+                    moment = day + timedelta(minutes=30 * slot)
+                    lines.append(
+                        f' <Record type="HKQuantityTypeIdentifierStepCount" sourceName="{source}" unit="count" '
+                        f'startDate="{stamp(moment)}" endDate="{stamp(moment + timedelta(minutes=10))}" '
+                        f'value="{random.randint(0, 400)}"/>\n'
+                    )
+            for stage in range(6):
+                moment = day + timedelta(hours=stage)
+                lines.append(
+                    f' <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="Apple Watch" '
+                    f'startDate="{stamp(moment)}" endDate="{stamp(moment + timedelta(minutes=55))}" '
+                    f'value="HKCategoryValueSleepAnalysisAsleepCore"/>\n'
+                )
+            moment = day + timedelta(hours=7)
+            lines.append(
+                f' <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="kg" '
+                f'startDate="{stamp(moment)}" endDate="{stamp(moment)}" value="{random.uniform(70, 80):.1f}"/>\n'
+            )
+            moment = day + timedelta(hours=18)
+            activity = 'Running' if offset % 2 else 'TraditionalStrengthTraining'
+            lines.append(
+                f' <Workout workoutActivityType="HKWorkoutActivityType{activity}" duration="40" durationUnit="min" '
+                f'sourceName="Apple Watch" startDate="{stamp(moment)}" endDate="{stamp(moment + timedelta(minutes=40))}">\n'
+                f'  <WorkoutStatistics type="HKQuantityTypeIdentifierDistanceWalkingRunning" sum="6.2" unit="km"/>\n'
+                f'  <WorkoutStatistics type="HKQuantityTypeIdentifierActiveEnergyBurned" sum="420" unit="kcal"/>\n'
+                f' </Workout>\n'
+            )
+            file.write(''.join(lines))
+        file.write(' <Record type="HKQuantityTypeIdentifierHeight" sourceName="iPhone" unit="cm" '
+                   'startDate="2015-01-01 08:00:00 +0000" endDate="2015-01-01 08:00:00 +0000" value="180"/>\n')
+        file.write('</HealthData>\n')
+    return days
+
+
+class Command(BaseCommand):
+    help = ('Write a synthetic Apple Health export.xml and measure the time and peak Python memory of '
+            'reading and aggregating it. With --write, also time the import into the database '
+            '(rolled back at the end).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=1000000, help='Samples in the sample export')
+        parser.add_argument('--write', action='store_true', help='Also time importing the export into the database')
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        User = get_user_model()
+        with tempfile.TemporaryDirectory() as directory, transaction.atomic():
+            path = os.path.join(directory, 'export.xml')
+            days = write_sample_export(path, options['records'])
+            self.stdout.write(f"Sample export: {days} days, {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+            user = User.objects.create_user(username='bench_apple_health', password='bench')
+
+            # Timed without tracemalloc, which slows parsing down considerably
+            started = time.perf_counter()
+            with open(path, 'rb') as file:
+                reader = AppleHealthImporter(user)
+                reader.read(file)
+            elapsed = time.perf_counter() - started
+
+            tracemalloc.start()
+            with open(path, 'rb') as file:
+                AppleHealthImporter(user).read(file)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            self.stdout.write(f"Read {reader.elements} elements in {elapsed:.2f}s "
+                              f"({reader.elements / elapsed:,.0f}/s), peak memory {peak / 1024 / 1024:.1f} MB")
+
+            if options['write']:
+                started = time.perf_counter()
+                with open(path, 'rb') as file:
+                    counts = AppleHealthImporter(user).run(file)
+                elapsed = time.perf_counter() - started
+                written = sum(count for section, count in counts.items() if section != 'errors')
+                self.stdout.write(f"Imported {written} records on {connection.vendor} in {elapsed:.2f}s")
+            transaction.set_rollback(True)
+        self.stdout.write("Benchmark data rolled back.")
@@ -0,0 +1,95 @@
+import csv
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from health.export import EXPORT_SECTIONS, iter_export_rows, stream_csv, stream_gzip, stream_ndjson, stream_zip
+from .benchmark_indexes import RECORD_MODELS, build_record
+
+
+def buffered_export(user):
+    """The previous export: model instances written one by one into an in-memory HttpResponse"""
+    response = HttpResponse(content_type='text/csv')
+    writer = csv.writer(response)
+    writer.writerow(['WellLog Health Data Export'])
+    writer.writerow([f'User: {user.username}'])
+    writer.writerow([f'Export Date: {timezone.now().strftime("%Y-%m-%d %H:%M:%S")}'])
+    for title, model, columns in EXPORT_SECTIONS:
+        writer.writerow([])
+        writer.writerow([title])
+        writer.writerow([header for header, _, _ in columns])
+        for record in model.objects.filter(user=user).order_by('date'):
+            row = []
+            for _, source, format_value in columns:
+                sources = source if isinstance(source, tuple) else (source,)
+                row.append(format_value(*[getattr(record, field) for field in sources]))
+            writer.writerow(row)
+    # The client gets its first byte only now
+    yield response.content
+
+
+def streamed_export(user):
+    """The streaming export used by export_health_data"""
+    for block in stream_csv(iter_export_rows(user)):
+        yield block.encode()
+
+
+# (name, export generator yielding bytes)
+EXPORT_PATHS = [
+    ('buffered', buffered_export),
+    ('streaming', streamed_export),
+    ('csv.gz', lambda user: stream_gzip(stream_csv(iter_export_rows(user)))),
+    ('zip', stream_zip),
+    ('ndjson', lambda user: (block.encode() for block in stream_ndjson(user))),
+]
+
+
+class Command(BaseCommand):
+    help = ('Seed a large history for one user and compare time to first byte, total time and peak Python memory '
+            'of the old buffered CSV export, the streaming CSV export and the other streamed formats. All seeded data is rolled back at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Records per record type')
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        with transaction.atomic():
+            self.run_benchmark(options)
+            transaction.set_rollback(True)
+        self.stdout.write("Benchmark data rolled back.")
+
+    def run_benchmark(self, options):
+        today = timezone.now().date()
+        user = get_user_model().objects.create_user(
+            username='bench_export', email='bench_export@example.com', password='bench'
+        )
+        self.stdout.write(f"Seeding {options['rows']} records per type on {connection.vendor}...")
+        for model in RECORD_MODELS:
+            batch = [build_record(model, user, today - timedelta(days=offset)) for offset in range(options['rows'])]
+            model.objects.bulk_create(batch, batch_size=2000)
+
+        self.stdout.write("")
+        self.stdout.write(f"{'path':<10} {'first byte (ms)':>16} {'total (ms)':>11} {'peak memory (MB)':>17} {'size (MB)':>10}")
+        for name, export in EXPORT_PATHS:
+            first_byte, total, peak, size = self.measure(export, user)
+            self.stdout.write(f"{name:<10} {first_byte:>16.1f} {total:>11.1f} {peak:>17.1f} {size:>10.1f}")
+
+    def measure(self, export, user):
+        """Consume an export like a client would and return (first byte ms, total ms, peak MB, size MB)"""
+        tracemalloc.start()
+        started = time.perf_counter()
+        first_byte = None
+        size = 0
+        for block in export(user):
+            if first_byte is None:
+                first_byte = (time.perf_counter() - started) * 1000
+            size += len(block)
+        total = (time.perf_counter() - started) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return first_byte, total, peak / 1024 / 1024, size / 1024 / 1024
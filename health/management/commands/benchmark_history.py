@@ -0,0 +1,77 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from health.views import HISTORY_VIEWS
+from .benchmark_indexes import build_record
+
+
+class Command(BaseCommand):
+    help = ('Seed the same synthetic dataset for every record type and time each history page '
+            '(default range and a one-year filter) with a cold and a warm history cache. '
+            'All seeded data is rolled back at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=3 * 365, help='Days of daily records for the benchmark user')
+        parser.add_argument('--repeat', type=int, default=10, help='Timing runs per page')
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        with transaction.atomic():
+            self.run_benchmark(options)
+            transaction.set_rollback(True)
+        cache.clear()
+        self.stdout.write("Benchmark data rolled back.")
+
+    def run_benchmark(self, options):
+        today = timezone.now().date()
+        user = get_user_model().objects.create_user(
+            username='bench_history', email='bench_history@example.com', password='bench'
+        )
+
+        self.stdout.write(f"Seeding {options['days']} days of every record type on {connection.vendor}...")
+        for view_class in HISTORY_VIEWS.values():
+            batch = [build_record(view_class.model, user, today - timedelta(days=offset)) for offset in range(options['days'])]
+            view_class.model.objects.bulk_create(batch, batch_size=2000)
+
+        scenarios = [
+            ('default', {}),
+            ('one year', {'date_from': (today - timedelta(days=365)).isoformat(), 'date_to': today.isoformat()}),
+        ]
+        factory = RequestFactory()
+
+        self.stdout.write("")
+        self.stdout.write(f"{'page':<10} {'range':<10} {'cold (ms)':>10} {'queries':>8} {'warm (ms)':>10} {'queries':>8}")
+        for name, view_class in HISTORY_VIEWS.items():
+            view = view_class.as_view()
+            for label, params in scenarios:
+                def render_page():
+                    request = factory.get('/', params)
+                    request.user = user
+                    view(request).render()
+
+                cold = self.measure(render_page, options['repeat'], clear_cache=True)
+                warm = self.measure(render_page, options['repeat'], clear_cache=False)
+                self.stdout.write(f"{name:<10} {label:<10} {cold[0]:>10.2f} {cold[1]:>8} {warm[0]:>10.2f} {warm[1]:>8}")
+
+    def measure(self, render_page, repeat, clear_cache):
+        """Return the median time in ms and the query count of rendering a page"""
+        cache.clear()
+        render_page()  # Warm up templates and, for the warm runs, the history cache
+
+        runs = []
+        for _ in range(repeat):
+            if clear_cache:
+                cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                render_page()
+                runs.append((time.perf_counter() - started) * 1000)
+        return statistics.median(runs), len(queries)
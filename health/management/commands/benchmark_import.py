@@ -0,0 +1,139 @@
+import csv
+import gzip
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from health.export import iter_export_rows, stream_csv
+from health.importer import IMPORT_SECTIONS, HealthDataImporter, open_import_file
+from .benchmark_indexes import RECORD_MODELS, build_record
+
+
+class QueryCounter:
+    """Database execute wrapper counting statements (connection.queries keeps only the last 9000)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def row_by_row_import(user, rows):
+    """The previous import: one update_or_create (or create for training) per row"""
+    current_section = None
+    headers = None
+    for row in rows:
+        if not row or not any(row):
+            continue
+        if len(row) == 1 and row[0].endswith('RECORDS'):
+            current_section = row[0].split()[0].lower()
+            headers = None
+            continue
+        if current_section and not headers and 'date' in row[0].lower():
+            headers = row
+            continue
+        if current_section in IMPORT_SECTIONS and headers:
+            model, parse, one_per_day = IMPORT_SECTIONS[current_section]
+            values = parse(row)
+            if one_per_day:
+                model.objects.update_or_create(user=user, date=values.pop('date'), defaults=values)
+            else:
+                model.objects.create(user=user, **values)
+
+
+def batched_import(user, rows):
+    """The batched upsert import used by import_health_data"""
+    HealthDataImporter(user).run(rows)
+
+
+def buffered_reader(upload):
+    """The previous decoding: the whole upload read, decoded and copied into a StringIO"""
+    upload.seek(0)
+    return csv.reader(StringIO(upload.read().decode('utf-8')))
+
+
+def parse_upload(upload, streamed):
+    """Parse every row of an upload without importing it, returning the row count"""
+    if not streamed:
+        return sum(1 for _ in buffered_reader(upload))
+    with open_import_file(upload) as decoded_file:
+        return sum(1 for _ in csv.reader(decoded_file))
+
+
+def temporary_upload(name, data):
+    """An upload spooled to disk, as Django's temporary-file handler stores large uploads"""
+    upload = TemporaryUploadedFile(name, 'text/csv', len(data), 'utf-8')
+    upload.write(data)
+    upload.seek(0)
+    return upload
+
+
+class Command(BaseCommand):
+    help = ('Export a synthetic history as CSV and compare the query count and time of importing it row by row '
+            'and with the batched upsert importer, both into an empty account and over existing records, '
+            'and the peak memory of parsing the upload buffered and streamed. '
+            'All data is rolled back at the end.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Total data rows in the CSV file')
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        with transaction.atomic():
+            self.run_benchmark(options)
+            transaction.set_rollback(True)
+        self.stdout.write("Benchmark data rolled back.")
+
+    def run_benchmark(self, options):
+        today = timezone.now().date()
+        User = get_user_model()
+        source = User.objects.create_user(username='bench_import_source', email='bench_import@example.com', password='bench')
+
+        per_type = max(options['rows'] // len(RECORD_MODELS), 1)
+        for model in RECORD_MODELS:
+            batch = [build_record(model, source, today - timedelta(days=offset)) for offset in range(per_type)]
+            model.objects.bulk_create(batch, batch_size=2000)
+        content = ''.join(stream_csv(iter_export_rows(source)))
+        self.stdout.write(f"CSV file: {per_type * len(RECORD_MODELS)} data rows, {len(content) / 1024 / 1024:.1f} MB "
+                          f"on {connection.vendor}")
+
+        self.stdout.write("")
+        self.stdout.write(f"{'importer':<12} {'target':<10} {'queries':>9} {'time (ms)':>11}")
+        for name, run_import in [('row by row', row_by_row_import), ('batched', batched_import)]:
+            user = User.objects.create_user(username=f'bench_import_{name.replace(" ", "_")}', password='bench')
+            # First into an empty account, then the same file again so every daily row is an update
+            for target in ['empty', 'existing']:
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    run_import(user, csv.reader(StringIO(content)))
+                    elapsed = (time.perf_counter() - started) * 1000
+                self.stdout.write(f"{name:<12} {target:<10} {counter.count:>9} {elapsed:>11.1f}")
+
+        self.measure_parsing(content)
+
+    def measure_parsing(self, content):
+        """Peak Python memory of parsing the file as a plain and a gzip-compressed temporary upload"""
+        self.stdout.write("")
+        self.stdout.write(f"{'upload':<8} {'parser':<10} {'rows':>8} {'peak (MB)':>10} {'time (ms)':>11}")
+        data = content.encode()
+        for label, name, payload in [('csv', 'export.csv', data), ('csv.gz', 'export.csv.gz', gzip.compress(data))]:
+            upload = temporary_upload(name, payload)
+            parsers = [('streamed', True)] if label == 'csv.gz' else [('buffered', False), ('streamed', True)]
+            for parser, streamed in parsers:
+                tracemalloc.start()
+                started = time.perf_counter()
+                rows = parse_upload(upload, streamed)
+                elapsed = (time.perf_counter() - started) * 1000
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.stdout.write(f"{label:<8} {parser:<10} {rows:>8} {peak / 1024 / 1024:>10.2f} {elapsed:>11.1f}")
+            upload.close()
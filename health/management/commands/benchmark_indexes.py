@@ -0,0 +1,148 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.utils import timezone
+from health.models import (
+    StepsRecord, SleepRecord, DietRecord,
+    RunningRecord, TrainingRecord, MoodRecord, WeightRecord
+)
+
+RECORD_MODELS = [StepsRecord, SleepRecord, DietRecord, RunningRecord, TrainingRecord, MoodRecord, WeightRecord]
+
+
+def build_record(model, user, day):
+    """Build one unsaved record with plausible values"""
+    if model is StepsRecord:
+        return StepsRecord(user=user, date=day, steps_count=random.randint(2000, 20000))
+    if model is SleepRecord:
+        return SleepRecord(user=user, date=day, hours=random.randint(5, 9), minutes=random.randint(0, 59),
+                           quality=random.choice(['poor', 'fair', 'good', 'excellent']))
+    if model is DietRecord:
+        return DietRecord(user=user, date=day, calories=random.randint(1500, 3000), protein=random.uniform(50, 150))
+    if model is RunningRecord:
+        return RunningRecord(user=user, date=day, distance=random.uniform(2, 15), duration_minutes=random.randint(12, 90))
+    if model is TrainingRecord:
+        return TrainingRecord(user=user, date=day, exercise_type=random.choice(['Squat', 'Bench', 'Deadlift', 'Row']),
+                              duration_minutes=random.randint(10, 60))
+    if model is MoodRecord:
+        return MoodRecord(user=user, date=day, mood=random.choice(['bad', 'neutral', 'good']), stress_level=random.randint(1, 10))
+    return WeightRecord(user=user, date=day, weight=random.uniform(60, 90), height=175.0)
+
+
+class Command(BaseCommand):
+    help = ('Seed several years of health records per user and compare EXPLAIN plans and timings of the hot '
+            'history/dashboard queries with the old FK-only index and with the composite (user, date) indexes. '
+            'All seeded data and index changes are rolled back at the end. The indexes are dropped and recreated '
+            'on the configured database, which locks the health tables (ACCESS EXCLUSIVE on PostgreSQL) for the '
+            'whole run, so the command refuses to run without --i-know-this-locks-tables.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of synthetic users')
+        parser.add_argument('--years', type=int, default=3, help='Years of daily records per user')
+        parser.add_argument('--repeat', type=int, default=20, help='Timing runs per query')
+        parser.add_argument('--explain_all', action='store_true', help='Print plans for every record type, not just steps')
+        parser.add_argument('--i-know-this-locks-tables', action='store_true', dest='locks_tables',
+                            help='Confirm the health tables may be locked until the benchmark ends')
+
+    def handle(self, *args, **options):
+        # Not DEBUG, which does not tell a development database from a production one
+        if not options['locks_tables']:
+            raise CommandError(
+                f"This benchmark drops and recreates the indexes of the health tables on the "
+                f"'{connection.settings_dict['NAME']}' database, locking them for the whole run. "
+                f"Run it against a development database with --i-know-this-locks-tables."
+            )
+        random.seed(42)
+        # SQLite's schema editor refuses to run inside a transaction with FK checks enabled
+        with connection.constraint_checks_disabled():
+            with transaction.atomic():
+                self.run_benchmark(options)
+                transaction.set_rollback(True)
+        self.stdout.write("Benchmark data rolled back.")
+
+    def run_benchmark(self, options):
+        today = timezone.now().date()
+        days = options['years'] * 365
+        User = get_user_model()
+
+        self.stdout.write(f"Seeding {options['users']} users x {days} days on {connection.vendor}...")
+        users = [
+            User.objects.create_user(username=f'bench_index_{i}', email=f'bench_index_{i}@example.com', password='bench')
+            for i in range(options['users'])
+        ]
+        for model in RECORD_MODELS:
+            batch = [build_record(model, user, today - timedelta(days=offset)) for user in users for offset in range(days)]
+            model.objects.bulk_create(batch, batch_size=2000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for model in RECORD_MODELS:
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+        target = users[len(users) // 2]
+        # (name, queryset builder, how the view evaluates it)
+        queries = [
+            ('history page', lambda model: model.objects.filter(
+                user=target, date__gte=today - timedelta(days=365), date__lte=today
+            ).order_by('-date', '-id')[:50], list),
+            ('dashboard latest', lambda model: model.objects.filter(
+                user=target, date=today
+            ).order_by('-created_at')[:1], list),
+            ('range count', lambda model: model.objects.filter(
+                user=target, date__gte=today - timedelta(days=90)
+            ), lambda queryset: queryset.count()),
+        ]
+
+        fk_indexes = {model: models.Index(fields=['user'], name=f'{model._meta.model_name[:15]}_bench_fk') for model in RECORD_MODELS}
+
+        # The one-per-day unique constraints are backed by a (user, date) index too. SQLite can only
+        # drop them by rebuilding the table from the model, which brings them back, so they stay there.
+        drop_constraints = connection.vendor != 'sqlite'
+
+        # Before: only the plain FK index on user_id, as shipped before the composite indexes
+        with connection.schema_editor() as editor:
+            for model in RECORD_MODELS:
+                for constraint in model._meta.constraints if drop_constraints else []:
+                    editor.remove_constraint(model, constraint)
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+                editor.add_index(model, fk_indexes[model])
+        before = self.measure('BEFORE (FK index only)', queries, options)
+
+        # After: the composite indexes declared on HealthRecord
+        with connection.schema_editor() as editor:
+            for model in RECORD_MODELS:
+                editor.remove_index(model, fk_indexes[model])
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+                for constraint in model._meta.constraints if drop_constraints else []:
+                    editor.add_constraint(model, constraint)
+        after = self.measure('AFTER (composite indexes)', queries, options)
+
+        self.stdout.write("")
+        self.stdout.write(f"{'query':<20} {'model':<16} {'before (ms)':>12} {'after (ms)':>12} {'speedup':>9}")
+        for key in before:
+            speedup = before[key] / after[key] if after[key] else float('inf')
+            self.stdout.write(f"{key[0]:<20} {key[1]:<16} {before[key]:>12.3f} {after[key]:>12.3f} {speedup:>8.1f}x")
+
+    def measure(self, phase, queries, options):
+        """Print query plans and return the median time in ms of every query for every model"""
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{phase}"))
+
+        timings = {}
+        for name, build_query, evaluate in queries:
+            for model in RECORD_MODELS:
+                if model is StepsRecord or options['explain_all']:
+                    self.stdout.write(f"-- {name} / {model.__name__}")
+                    self.stdout.write(build_query(model).explain())
+
+                runs = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    evaluate(build_query(model))
+                    runs.append((time.perf_counter() - started) * 1000)
+                timings[(name, model.__name__)] = statistics.median(runs)
+        return timings
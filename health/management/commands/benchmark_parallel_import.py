@@ -0,0 +1,148 @@
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from health.export import EXPORT_SECTIONS
+from health.importer import HealthDataImporter
+from health.parsing import PARSE_CHUNK_SIZE, SECTION_PARSERS, parse_file_parallel, parse_iso_date
+
+# Training rows per day; every other record type has one row per day
+TRAINING_PER_DAY = 4
+
+SAMPLE_ROWS = {
+    'steps': lambda day: [day, random.randint(2000, 15000), ''],
+    'sleep': lambda day: [day, random.randint(5, 9), random.randint(0, 59), 'good', ''],
+    'diet': lambda day: [day, random.randint(1500, 3000), 90.5, 250.0, 70.0, '', ''],
+    'running': lambda day: [day, round(random.uniform(2, 15), 2), random.randint(15, 90), 400, ''],
+    'training': lambda day: [day, random.choice(['Squat', 'Bench', 'Deadlift']), 5, 5, 100.0, 30, 250, '', ''],
+    'mood': lambda day: [day, 'good', random.randint(1, 10), '', ''],
+    'weight': lambda day: [day, round(random.uniform(60, 90), 1), 180.0, 23.1, '', ''],
+}
+
+
+def write_sample_file(path, rows):
+    """Write an export-format CSV file with about ``rows`` data rows; return the number written"""
+    days = max(rows // (len(SAMPLE_ROWS) - 1 + TRAINING_PER_DAY), 1)
+    start = date(2000, 1, 1)
+    written = 0
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['WellLog Health Data Export'])
+        for title, _, columns in EXPORT_SECTIONS:
+            name = title.split()[0].lower()
+            writer.writerows([[], [title], [header for header, _, _ in columns]])
+            for offset in range(days):
+                day = (start + timedelta(days=offset)).isoformat()
+                for _ in range(TRAINING_PER_DAY if name == 'training' else 1):
+                    writer.writerow(SAMPLE_ROWS[name](day))
+                    written += 1
+    return written
+
+
+def sequential_parse(path):
+    """Parse every data row in this process, as HealthDataImporter.run does; return the row count"""
+    parsed = 0
+    current_section = None
+    headers = None
+    with open(path, newline='') as file:
+        for row in csv.reader(file):
+            if not row or not any(row):
+                continue
+            if len(row) == 1 and row[0].endswith('RECORDS'):
+                current_section = row[0].split()[0].lower()
+                headers = None
+                continue
+            if current_section and not headers and 'date' in row[0].lower():
+                headers = row
+                continue
+            if current_section in SECTION_PARSERS and headers:
+                SECTION_PARSERS[current_section](row)
+                parsed += 1
+    return parsed
+
+
+def parallel_parse(path, workers):
+    """Parse every data row in a pool of ``workers`` processes; return the row count"""
+    return sum(len(values) for _, _, values, _ in parse_file_parallel(path, workers))
+
+
+class Command(BaseCommand):
+    help = ('Write a synthetic export with about a million rows and compare the throughput of parsing it '
+            'in one process and in process pools of several sizes, and of strptime and the cached ISO date '
+            'parser. With --write, also time full imports into the database (rolled back at the end).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Data rows in the sample file')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Process pool sizes to time')
+        parser.add_argument('--write', action='store_true', help='Also time importing the file into the database')
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export.csv')
+            rows = write_sample_file(path, options['rows'])
+            size = os.path.getsize(path) / 1024 / 1024
+            self.stdout.write(f"Sample file: {rows} data rows, {size:.1f} MB, {os.cpu_count()} CPUs, "
+                              f"{PARSE_CHUNK_SIZE // 1024 // 1024} MB ranges")
+
+            self.measure_dates(path)
+            self.measure_parsing(path, rows, options['workers'])
+            if options['write']:
+                with transaction.atomic():
+                    self.measure_writes(path, rows, max(options['workers']))
+                    transaction.set_rollback(True)
+                self.stdout.write("Benchmark data rolled back.")
+
+    def report(self, label, rows, elapsed):
+        self.stdout.write(f"{label:<28} {elapsed:>9.2f} {rows / elapsed:>12,.0f}")
+
+    def measure_dates(self, path):
+        with open(path, newline='') as file:
+            values = [row[0] for row in csv.reader(file) if row and row[0][:1].isdigit()]
+
+        self.stdout.write("")
+        self.stdout.write(f"{'date parsing':<28} {'time (s)':>9} {'rows/s':>12}")
+        started = time.perf_counter()
+        for value in values:
+            datetime.strptime(value, '%Y-%m-%d').date()
+        self.report('strptime', len(values), time.perf_counter() - started)
+
+        parse_iso_date.cache_clear()
+        started = time.perf_counter()
+        for value in values:
+            parse_iso_date(value)
+        self.report('cached fromisoformat', len(values), time.perf_counter() - started)
+
+    def measure_parsing(self, path, rows, workers):
+        self.stdout.write("")
+        self.stdout.write(f"{'parsing':<28} {'time (s)':>9} {'rows/s':>12}")
+        parse_iso_date.cache_clear()
+        started = time.perf_counter()
+        sequential_parse(path)
+        self.report('sequential', rows, time.perf_counter() - started)
+
+        for count in workers:
+            started = time.perf_counter()
+            parallel_parse(path, count)
+            self.report(f'{count} processes', rows, time.perf_counter() - started)
+
+    def measure_writes(self, path, rows, workers):
+        User = get_user_model()
+        self.stdout.write("")
+        self.stdout.write(f"{'import on ' + connection.vendor:<28} {'time (s)':>9} {'rows/s':>12}")
+
+        user = User.objects.create_user(username='bench_parallel_sequential', password='bench')
+        started = time.perf_counter()
+        with open(path, newline='') as file:
+            HealthDataImporter(user).run(csv.reader(file))
+        self.report('sequential', rows, time.perf_counter() - started)
+
+        user = User.objects.create_user(username='bench_parallel_pool', password='bench')
+        started = time.perf_counter()
+        HealthDataImporter(user).run_parallel(path, workers)
+        self.report(f'{workers} processes', rows, time.perf_counter() - started)
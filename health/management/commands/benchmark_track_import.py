@@ -0,0 +1,97 @@
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from health.tracks import EARTH_RADIUS_KM, TrackImporter, read_gpx_or_tcx
+
+
+def write_sample_gpx(path, start, points):
+    """Write a GPX run with one point per second, wandering roughly north at running pace"""
+    latitude, longitude = 51.5, -0.12
+    with open(path, 'w') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<gpx version="1.1" creator="benchmark" xmlns="http://www.topografix.com/GPX/1/1">\n'
+                   ' <trk><trkseg>\n')
+        for offset in range(points):
+            latitude += random.uniform(0, 0.00005)
+            longitude += random.uniform(-0.00002, 0.00002)
+            moment = (start + timedelta(seconds=offset)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            file.write(f'  <trkpt lat="{latitude:.7f}" lon="{longitude:.7f}"><ele>12.0</ele>'
+                       f'<time>{moment}</time></trkpt>\n')
+        file.write(' </trkseg></trk>\n</gpx>\n')
+
+
+def python_distance_km(latitudes, longitudes):
+    """Per-point haversine in plain Python, for comparison"""
+    total = 0.0
+    for index in range(1, len(latitudes)):
+        lat1, lat2 = math.radians(latitudes[index - 1]), math.radians(latitudes[index])
+        dlat = lat2 - lat1
+        dlon = math.radians(longitudes[index] - longitudes[index - 1])
+        a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+        total += 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+    return total
+
+
+class Command(BaseCommand):
+    help = ('Write a season of synthetic GPX runs and compare per-point Python haversine with the vectorized '
+            'numpy version, then time reading the whole season. With --write, also time the import into the '
+            'database (rolled back at the end).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=100, help='Runs in the season')
+        parser.add_argument('--points', type=int, default=3600, help='Track points per run (one per second)')
+        parser.add_argument('--write', action='store_true', help='Also time importing the runs into the database')
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for index in range(options['files']):
+                path = os.path.join(directory, f'run-{index:04d}.gpx')
+                write_sample_gpx(path, datetime(2025, 1, 1, 7) + timedelta(days=2 * index), options['points'])
+                paths.append(path)
+            size = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+            self.stdout.write(f"Sample season: {len(paths)} runs, {len(paths) * options['points']} points, {size:.1f} MB")
+
+            with open(paths[0], 'rb') as file:
+                track = read_gpx_or_tcx(file)
+            latitudes, longitudes = list(track.latitudes), list(track.longitudes)
+            repeats = 20
+
+            started = time.perf_counter()
+            for _ in range(repeats):
+                expected = python_distance_km(latitudes, longitudes)
+            python_elapsed = (time.perf_counter() - started) / repeats
+            started = time.perf_counter()
+            for _ in range(repeats):
+                distance = track.distance_km()
+            numpy_elapsed = (time.perf_counter() - started) / repeats
+            self.stdout.write(f"Distance of one run ({len(track)} points, {distance:.3f} km, "
+                              f"difference {abs(distance - expected):.1e} km): "
+                              f"Python {python_elapsed * 1000:.2f} ms, numpy {numpy_elapsed * 1000:.2f} ms "
+                              f"({python_elapsed / numpy_elapsed:.0f}x)")
+
+            with transaction.atomic():
+                user = get_user_model().objects.create_user(username='bench_tracks', password='bench')
+                started = time.perf_counter()
+                tracks = TrackImporter(user)
+                for path in paths:
+                    with open(path, 'rb') as file:
+                        tracks.add_file(path, file)
+                elapsed = time.perf_counter() - started
+                points = len(paths) * options['points']
+                self.stdout.write(f"Read the season in {elapsed:.2f}s ({points / elapsed:,.0f} points/s)")
+
+                if options['write']:
+                    started = time.perf_counter()
+                    counts = tracks.run()
+                    self.stdout.write(f"Imported {counts['running']} running records on {connection.vendor} "
+                                      f"in {time.perf_counter() - started:.2f}s")
+                transaction.set_rollback(True)
+            self.stdout.write("Benchmark data rolled back.")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from health import models
+from health.duplicates import DAILY_RECORD_MODELS, export_duplicate_records, merge_duplicate_days
+
+
+class Command(BaseCommand):
+    help = ('Save every health record sharing its day with another record of the same type to a CSV file, '
+            'then merge each day into its latest record: steps, diet and running amounts are added up, notes '
+            'joined, and sleep, mood and weight keep the latest reading. Needed before migration '
+            'health.0008 when users have several sleep, mood or weight entries on one day.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--export', required=True, help='CSV file the records are saved to before merging')
+
+    def handle(self, *args, **options):
+        record_models = [getattr(models, name) for name in DAILY_RECORD_MODELS]
+
+        with transaction.atomic():
+            with open(options['export'], 'w', newline='') as file:
+                exported = export_duplicate_records(record_models, file)
+            self.stdout.write(f"Saved {exported} records of duplicated days to {options['export']}")
+
+            for model in record_models:
+                merged = merge_duplicate_days(model)
+                if merged:
+                    self.stdout.write(f"{model.__name__}: merged {merged} records into the latest of their day")
+        self.stdout.write(self.style.SUCCESS("No day has more than one record of a type any more."))
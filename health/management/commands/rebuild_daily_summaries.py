@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from health.summary import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyHealthSummary rollup table from the health record tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user_id', type=int, action='append',
+                            help='Only rebuild summaries of this user (can be given several times)')
+        parser.add_argument('--batch_size', type=int, default=1000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        user_ids = options.get('user_id')
+        started = time.perf_counter()
+
+        scope = f"users {', '.join(str(user_id) for user_id in user_ids)}" if user_ids else "all users"
+        self.stdout.write(f"Rebuilding daily health summaries for {scope}...")
+
+        written = rebuild_daily_summaries(user_ids=user_ids, batch_size=options['batch_size'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} summary rows in {elapsed:.2f}s"))
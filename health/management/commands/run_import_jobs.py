@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from health.jobs import run_pending_import_jobs
+
+
+class Command(BaseCommand):
+    help = ('Run pending health data import jobs from the database, oldest first. '
+            'Use with HEALTH_IMPORT_IN_PROCESS = False to keep imports out of the web workers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', type=float, default=0,
+                            help='Keep running and check for new jobs every this many seconds (default: exit when idle)')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many jobs')
+
+    def handle(self, *args, **options):
+        remaining = options['limit']
+        while True:
+            for job in run_pending_import_jobs(limit=remaining):
+                style = self.style.SUCCESS if job.status == 'done' else self.style.ERROR
+                self.stdout.write(style(f"Import job {job.pk} ({job.user.username}): {job.status}, "
+                                        f"{job.rows_processed} rows, {job.counts.get('errors', 0)} errors"))
+                if remaining is not None:
+                    remaining -= 1
+
+            if not options['poll'] or remaining == 0:
+                break
+            time.sleep(options['poll'])
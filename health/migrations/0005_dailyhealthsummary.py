@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0004_healthgoal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyHealthSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('steps_total', models.PositiveIntegerField(default=0)),
+                ('steps_count', models.PositiveIntegerField(default=0)),
+                ('sleep_minutes_total', models.PositiveIntegerField(default=0)),
+                ('sleep_count', models.PositiveIntegerField(default=0)),
+                ('calories_total', models.PositiveIntegerField(default=0)),
+                ('protein_total', models.FloatField(default=0)),
+                ('diet_count', models.PositiveIntegerField(default=0)),
+                ('running_distance_total', models.FloatField(default=0)),
+                ('running_duration_total', models.PositiveIntegerField(default=0)),
+                ('running_calories_total', models.PositiveIntegerField(default=0)),
+                ('running_count', models.PositiveIntegerField(default=0)),
+                ('training_duration_total', models.PositiveIntegerField(default=0)),
+                ('training_calories_total', models.PositiveIntegerField(default=0)),
+                ('training_count', models.PositiveIntegerField(default=0)),
+                ('mood_latest', models.CharField(blank=True, max_length=20, null=True)),
+                ('stress_level_latest', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('mood_count', models.PositiveIntegerField(default=0)),
+                ('weight_latest', models.FloatField(blank=True, null=True)),
+                ('height_latest', models.FloatField(blank=True, null=True)),
+                ('weight_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Health Summary',
+                'verbose_name_plural': 'Daily Health Summaries',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_health_summary')],
+            },
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0005_dailyhealthsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dietrecord',
+            index=models.Index(fields=['user', '-date', '-id'], name='dietrecord_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dietrecord',
+            index=models.Index(fields=['user', 'date', '-created_at'], name='dietrecord_day_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moodrecord',
+            index=models.Index(fields=['user', '-date', '-id'], name='moodrecord_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moodrecord',
+            index=models.Index(fields=['user', 'date', '-created_at'], name='moodrecord_day_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='runningrecord',
+            index=models.Index(fields=['user', '-date', '-id'], name='runningrecord_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='runningrecord',
+            index=models.Index(fields=['user', 'date', '-created_at'], name='runningrecord_day_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sleeprecord',
+            index=models.Index(fields=['user', '-date', '-id'], name='sleeprecord_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sleeprecord',
+            index=models.Index(fields=['user', 'date', '-created_at'], name='sleeprecord_day_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stepsrecord',
+            index=models.Index(fields=['user', '-date', '-id'], name='stepsrecord_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stepsrecord',
+            index=models.Index(fields=['user', 'date', '-created_at'], name='stepsrecord_day_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingrecord',
+            index=models.Index(fields=['user', '-date', '-id'], name='trainingrecord_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingrecord',
+            index=models.Index(fields=['user', 'date', '-created_at'], name='trainingrecord_day_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightrecord',
+            index=models.Index(fields=['user', '-date', '-id'], name='weightrecord_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightrecord',
+            index=models.Index(fields=['user', 'date', '-created_at'], name='weightrecord_day_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='dietrecord',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='moodrecord',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='runningrecord',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='sleeprecord',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='stepsrecord',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='trainingrecord',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='weightrecord',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
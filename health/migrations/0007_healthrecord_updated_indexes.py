@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0006_healthrecord_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dietrecord',
+            index=models.Index(fields=['user', 'updated_at'], name='dietrecord_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moodrecord',
+            index=models.Index(fields=['user', 'updated_at'], name='moodrecord_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='runningrecord',
+            index=models.Index(fields=['user', 'updated_at'], name='runningrecord_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sleeprecord',
+            index=models.Index(fields=['user', 'updated_at'], name='sleeprecord_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stepsrecord',
+            index=models.Index(fields=['user', 'updated_at'], name='stepsrecord_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingrecord',
+            index=models.Index(fields=['user', 'updated_at'], name='trainingrecord_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightrecord',
+            index=models.Index(fields=['user', 'updated_at'], name='weightrecord_updated_idx'),
+        ),
+    ]
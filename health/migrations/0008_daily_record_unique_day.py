@@ -0,0 +1,59 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:26
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import migrations, models
+
+
+def merge_same_day_records(apps, schema_editor):
+    """Merge same-day steps, diet and running records; stop if sleep, mood or weight readings would be lost"""
+    from health.duplicates import ADDITIVE_FIELDS, DAILY_RECORD_MODELS, find_duplicate_days, merge_duplicate_days
+
+    readings = [
+        name for name in DAILY_RECORD_MODELS
+        if name not in ADDITIVE_FIELDS and find_duplicate_days(apps.get_model('health', name)).exists()
+    ]
+    if readings:
+        raise CommandError(
+            f"Some users have several {', '.join(readings)} entries on one day, which cannot be added up. "
+            f"Run 'python manage.py merge_duplicate_days --export <file.csv>' to save them to a CSV file "
+            f"and keep the latest of each day, then run migrate again."
+        )
+    for name in ADDITIVE_FIELDS:
+        merge_duplicate_days(apps.get_model('health', name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0007_healthrecord_updated_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_same_day_records, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dietrecord',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='dietrecord_unique_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='moodrecord',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='moodrecord_unique_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='runningrecord',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='runningrecord_unique_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='sleeprecord',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='sleeprecord_unique_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='stepsrecord',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='stepsrecord_unique_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='weightrecord',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='weightrecord_unique_day'),
+        ),
+    ]
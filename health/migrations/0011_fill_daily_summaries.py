@@ -0,0 +1,24 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:10
+
+from django.db import migrations
+
+
+def fill_daily_summaries(apps, schema_editor):
+    """Build the summaries of the records stored before the table was kept current"""
+    from health.summary import rebuild_daily_summaries
+    rebuild_daily_summaries(apps=apps)
+
+
+def clear_daily_summaries(apps, schema_editor):
+    apps.get_model('health', 'DailyHealthSummary').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0010_importjob_dry_run'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_daily_summaries, clear_daily_summaries),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:04
+
+import health.storage
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def move_job_files(apps, source, target):
+    """Move the files of unfinished jobs from one storage to the other, and delete those finished jobs left"""
+    ImportJob = apps.get_model('health', 'ImportJob')
+    for job in ImportJob.objects.exclude(file=''):
+        name = job.file.name
+        if job.status in ('pending', 'running') and source.exists(name):
+            with source.open(name, 'rb') as file:
+                ImportJob.objects.filter(pk=job.pk).update(file=target.save(name, file))
+        elif job.status not in ('pending', 'running'):
+            ImportJob.objects.filter(pk=job.pk).update(file='')
+        if source.exists(name):
+            source.delete(name)
+
+
+def to_private_storage(apps, schema_editor):
+    move_job_files(apps, default_storage, health.storage.import_file_storage)
+
+
+def to_media_storage(apps, schema_editor):
+    move_job_files(apps, health.storage.import_file_storage, default_storage)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0012_importjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importjob',
+            name='file',
+            field=models.FileField(storage=health.storage.ImportFileStorage(), upload_to='health_imports/%Y/%m/'),
+        ),
+        migrations.RunPython(to_private_storage, to_media_storage),
+    ]
@@ -2,25 +2,46 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+from .storage import import_file_storage
+
 # Base class for all health records
 class HealthRecord(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # The composite indexes below all start with user, so the FK needs no index of its own
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     date = models.DateField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         abstract = True
+        indexes = [
+            # History pages and charts: user + date range, ordered by -date (id breaks ties)
+            models.Index(fields=['user', '-date', '-id'], name='%(class)s_user_date_idx'),
+            # Dashboard: the latest record of a given day
+            models.Index(fields=['user', 'date', '-created_at'], name='%(class)s_day_created_idx'),
+            # Chart data ETags: the user's latest change
+            models.Index(fields=['user', 'updated_at'], name='%(class)s_updated_idx'),
+        ]
+
+# Base class for record types kept to one record per user and day
+class DailyHealthRecord(HealthRecord):
+    
+    class Meta(HealthRecord.Meta):
+        abstract = True
+        constraints = [
+            # Lets imports upsert on (user, date); adding a record for a taken day updates it
+            models.UniqueConstraint(fields=['user', 'date'], name='%(class)s_unique_day'),
+        ]
 
 # Steps record
-class StepsRecord(HealthRecord):
+class StepsRecord(DailyHealthRecord):
     steps_count = models.PositiveIntegerField()
     
     def __str__(self):
         return f"{self.user.username} - {self.date} - {self.steps_count} steps"
 
 # Sleep record
-class SleepRecord(HealthRecord):
+class SleepRecord(DailyHealthRecord):
     hours = models.PositiveIntegerField()
     minutes = models.PositiveIntegerField()
     quality = models.CharField(max_length=20, blank=True, null=True, choices=[
@@ -37,7 +58,7 @@ class SleepRecord(HealthRecord):
         return f"{self.user.username} - {self.date} - {self.hours}h {self.minutes}min"
 
 # Diet record
-class DietRecord(HealthRecord):
+class DietRecord(DailyHealthRecord):
     calories = models.PositiveIntegerField()
     protein = models.FloatField(blank=True, null=True)  # grams
     carbs = models.FloatField(blank=True, null=True)    # grams
@@ -48,7 +69,7 @@ class DietRecord(HealthRecord):
         return f"{self.user.username} - {self.date} - {self.calories} kcal"
 
 # Running record
-class RunningRecord(HealthRecord):
+class RunningRecord(DailyHealthRecord):
     distance = models.FloatField()  # kilometers
     duration_minutes = models.PositiveIntegerField()
     calories_burned = models.PositiveIntegerField(blank=True, null=True)
@@ -78,7 +99,7 @@ class TrainingRecord(HealthRecord):
         return f"{self.user.username} - {self.date} - {self.exercise_type}"
 
 # Mood record
-class MoodRecord(HealthRecord):
+class MoodRecord(DailyHealthRecord):
     mood = models.CharField(max_length=20, choices=[
         ('terrible', 'Terrible'),
         ('bad', 'Bad'),
@@ -93,7 +114,7 @@ class MoodRecord(HealthRecord):
         return f"{self.user.username} - {self.date} - {self.mood}"
 
 # Weight record
-class WeightRecord(HealthRecord):
+class WeightRecord(DailyHealthRecord):
     weight = models.FloatField()  # kg
     height = models.FloatField()  # cm
     notes = models.TextField(blank=True, null=True)
@@ -156,4 +177,102 @@ class HealthGoal(models.Model):
     
     class Meta:
         verbose_name = "Health Goal"
-        verbose_name_plural = "Health Goals"
\ No newline at end of file
+        verbose_name_plural = "Health Goals"
+# Daily health summary
+class DailyHealthSummary(models.Model):
+    """Per-user, per-day rollup of all health record types
+
+    Kept current by the save/delete signal handlers in ``health.signals`` and
+    rebuilt from scratch with ``manage.py rebuild_daily_summaries``.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    date = models.DateField()
+    
+    # Steps
+    steps_total = models.PositiveIntegerField(default=0)
+    steps_count = models.PositiveIntegerField(default=0)
+    
+    # Sleep
+    sleep_minutes_total = models.PositiveIntegerField(default=0)
+    sleep_count = models.PositiveIntegerField(default=0)
+    
+    # Diet
+    calories_total = models.PositiveIntegerField(default=0)
+    protein_total = models.FloatField(default=0)  # grams
+    diet_count = models.PositiveIntegerField(default=0)
+    
+    # Running
+    running_distance_total = models.FloatField(default=0)  # kilometers
+    running_duration_total = models.PositiveIntegerField(default=0)  # minutes
+    running_calories_total = models.PositiveIntegerField(default=0)
+    running_count = models.PositiveIntegerField(default=0)
+    
+    # Training
+    training_duration_total = models.PositiveIntegerField(default=0)  # minutes
+    training_calories_total = models.PositiveIntegerField(default=0)
+    training_count = models.PositiveIntegerField(default=0)
+    
+    # Mood (latest record of the day)
+    mood_latest = models.CharField(max_length=20, blank=True, null=True)
+    stress_level_latest = models.PositiveSmallIntegerField(blank=True, null=True)
+    mood_count = models.PositiveIntegerField(default=0)
+    
+    # Weight (latest record of the day)
+    weight_latest = models.FloatField(blank=True, null=True)  # kg
+    height_latest = models.FloatField(blank=True, null=True)  # cm
+    weight_count = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.date} summary"
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name = "Daily Health Summary"
+        verbose_name_plural = "Daily Health Summaries"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_daily_health_summary'),
+        ]
+
+# Background import of an uploaded CSV file
+class ImportJob(models.Model):
+    """An uploaded CSV file waiting for, or being imported by, a worker (see ``health.jobs``)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='import_jobs')
+    # Kept out of MEDIA_ROOT, which is served without authentication, and deleted when the job ends
+    file = models.FileField(upload_to='health_imports/%Y/%m/', storage=import_file_storage)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Dry run: only validate the file and store the report of health.importer.validate_import
+    dry_run = models.BooleanField(default=False)
+    report = models.JSONField(blank=True, null=True)
+    
+    # Progress: rows read so far and the importer's per-section counts (plus 'errors')
+    rows_processed = models.PositiveIntegerField(default=0)
+    counts = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    # Set when the job is claimed and after every written batch; a running job that stops
+    # updating it lost its worker (see health.jobs.fail_stale_import_jobs)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - import {self.pk} ({self.status})"
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Import Job"
+        verbose_name_plural = "Import Jobs"
+        indexes = [
+            # Workers pick the oldest pending job
+            models.Index(fields=['status', 'created_at'], name='importjob_status_idx'),
+        ]
@@ -0,0 +1,111 @@
+"""Keyset (cursor) pagination for the health record history pages.
+
+``django.core.paginator.Paginator`` needs a ``COUNT(*)`` of the whole result
+and an ``OFFSET`` that grows with the page number, so deep pages of a long
+history get slower and slower. ``CursorPaginator`` instead remembers the
+``(date, id)`` of the first/last row shown and asks the database for the rows
+just before/after it, which the ``(user, -date, -id)`` index answers with a
+short range scan no matter how deep the page is.
+"""
+import base64
+from datetime import date
+
+from django.db.models import Q
+
+
+class CursorPage:
+    """One page of records with opaque tokens for the neighbouring pages"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class CursorPaginator:
+    """Paginate a record queryset newest first, keyed on ``(date, id)``"""
+
+    def __init__(self, queryset, per_page=10):
+        self.queryset = queryset.order_by('-date', '-id')
+        self.per_page = per_page
+
+    @staticmethod
+    def encode_cursor(record, direction):
+        """Build the token pointing after ('n') or before ('p') a record"""
+        raw = f"{direction}:{record.date.isoformat()}:{record.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Return (direction, date, id) for a token, or None if it is invalid"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, day, pk = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+            if direction not in ('n', 'p'):
+                return None
+            return direction, date.fromisoformat(day), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def page(self, cursor=None):
+        """Return the page a token points to; missing or invalid tokens give the first page"""
+        position = self.decode_cursor(cursor) if cursor else None
+
+        if position is not None:
+            page = self._page_at(*position)
+            # A cursor past either end (e.g. after records were deleted) falls back to the first page
+            if page:
+                return page
+
+        rows = list(self.queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return self._build_page(rows, has_next=has_more, has_previous=False)
+
+    def _page_at(self, direction, day, pk):
+        """Return the page next to or before the record identified by (day, pk)"""
+        if direction == 'n':
+            # Rows older than the cursor, newest first
+            rows = list(self.queryset.filter(Q(date__lt=day) | Q(date=day, id__lt=pk))[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            return self._build_page(rows, has_next=has_more, has_previous=True)
+
+        # Rows newer than the cursor: read them oldest first, then flip back to newest first
+        rows = list(
+            self.queryset.filter(Q(date__gt=day) | Q(date=day, id__gt=pk))
+            .order_by('date', 'id')[:self.per_page + 1]
+        )
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._build_page(rows, has_next=True, has_previous=has_more)
+
+    def _build_page(self, rows, has_next, has_previous):
+        next_cursor = self.encode_cursor(rows[-1], 'n') if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], 'p') if rows and has_previous else None
+        return CursorPage(rows, next_cursor=next_cursor, previous_cursor=previous_cursor)
@@ -0,0 +1,252 @@
+"""Row parsers of the CSV import, and parallel parsing of large files.
+
+Each parser turns one data row of a section into the field values of a
+record, raising ``ValueError`` or ``IndexError`` for invalid rows. Dates go
+through ``parse_iso_date``, which uses ``date.fromisoformat`` instead of
+``strptime`` and caches its results: a history of daily records repeats the
+same dates in every section.
+
+Large plain files can be parsed in a process pool. ``plan_ranges`` finds
+each section's data rows and cuts them into byte ranges that start and end
+on line boundaries, ``parse_range`` parses one range in a worker, and
+``parse_file_parallel`` yields the results in file order, so the importer
+writes them exactly as it would have written the rows one by one. Exported
+notes never contain line breaks, so every line is a row.
+
+This module imports nothing from Django, so the worker processes (started
+with the 'spawn' method, which is safe from the import threads) stay cheap.
+"""
+import csv
+import io
+import mmap
+import multiprocessing
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import lru_cache
+
+# Bytes of data rows per range handed to a worker
+PARSE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Section title line, e.g. "STEPS RECORDS"
+SECTION_TITLE = re.compile(rb'^([A-Z]+) RECORDS\r?$', re.MULTILINE)
+
+
+@lru_cache(maxsize=100000)
+def parse_iso_date(value):
+    """Parse a YYYY-MM-DD date (fromisoformat alone would also accept other ISO forms)"""
+    if len(value) != 10 or value[4] != '-' or value[7] != '-':
+        raise ValueError(f"time data {value!r} does not match format '%Y-%m-%d'")
+    return date.fromisoformat(value)
+
+
+def _optional(convert, value):
+    return convert(value) if value else None
+
+
+def _cell(row, index):
+    """Optional trailing column that older exports may not have"""
+    return row[index] if len(row) > index and row[index] else None
+
+
+def parse_steps(row):
+    return {'date': parse_iso_date(row[0]), 'steps_count': int(row[1])}
+
+
+def parse_sleep(row):
+    return {
+        'date': parse_iso_date(row[0]),
+        'hours': int(row[1]),
+        'minutes': int(row[2]),
+        'quality': row[3] if row[3] else None,
+    }
+
+
+def parse_diet(row):
+    return {
+        'date': parse_iso_date(row[0]),
+        'calories': int(row[1]),
+        'protein': _optional(float, row[2]),
+        'carbs': _optional(float, row[3]),
+        'fat': _optional(float, row[4]),
+        'notes': _cell(row, 5),
+    }
+
+
+def parse_running(row):
+    return {
+        'date': parse_iso_date(row[0]),
+        'distance': float(row[1]),
+        'duration_minutes': int(row[2]),
+        'calories_burned': _optional(int, row[3]),
+    }
+
+
+def parse_training(row):
+    return {
+        'date': parse_iso_date(row[0]),
+        'exercise_type': row[1],
+        'sets': _optional(int, row[2]),
+        'reps': _optional(int, row[3]),
+        'weight': _optional(float, row[4]),
+        'duration_minutes': _optional(int, row[5]),
+        'calories_burned': _optional(int, row[6]),
+        'notes': _cell(row, 7),
+    }
+
+
+def parse_mood(row):
+    return {
+        'date': parse_iso_date(row[0]),
+        'mood': row[1],
+        'stress_level': _optional(int, row[2]),
+        'notes': _cell(row, 3),
+    }
+
+
+def parse_weight(row):
+    # Column 3 is the exported BMI, which is derived from weight and height
+    return {
+        'date': parse_iso_date(row[0]),
+        'weight': float(row[1]),
+        'height': float(row[2]),
+        'notes': _cell(row, 4),
+    }
+
+
+# Section name (first word of its title line) -> row parser
+SECTION_PARSERS = {
+    'steps': parse_steps,
+    'sleep': parse_sleep,
+    'diet': parse_diet,
+    'running': parse_running,
+    'training': parse_training,
+    'mood': parse_mood,
+    'weight': parse_weight,
+}
+
+
+def _text(value):
+    return value
+
+
+# Section name -> [(column header, index, converter, required)]; only used to point out
+# which cells of a rejected row are invalid
+SECTION_COLUMNS = {
+    'steps': [('Date', 0, parse_iso_date, True), ('Steps Count', 1, int, True)],
+    'sleep': [
+        ('Date', 0, parse_iso_date, True), ('Hours', 1, int, True),
+        ('Minutes', 2, int, True), ('Quality', 3, _text, False),
+    ],
+    'diet': [
+        ('Date', 0, parse_iso_date, True), ('Calories', 1, int, True),
+        ('Protein', 2, float, False), ('Carbs', 3, float, False), ('Fat', 4, float, False),
+    ],
+    'running': [
+        ('Date', 0, parse_iso_date, True), ('Distance', 1, float, True),
+        ('Duration Minutes', 2, int, True), ('Calories Burned', 3, int, False),
+    ],
+    'training': [
+        ('Date', 0, parse_iso_date, True), ('Exercise Type', 1, _text, False),
+        ('Sets', 2, int, False), ('Reps', 3, int, False), ('Weight', 4, float, False),
+        ('Duration Minutes', 5, int, False), ('Calories Burned', 6, int, False),
+    ],
+    'mood': [('Date', 0, parse_iso_date, True), ('Mood', 1, _text, False), ('Stress Level', 2, int, False)],
+    'weight': [('Date', 0, parse_iso_date, True), ('Weight', 1, float, True), ('Height', 2, float, True)],
+}
+
+
+def column_errors(section, row):
+    """Return (column header, value, message) for every invalid cell of a row"""
+    errors = []
+    for header, index, convert, required in SECTION_COLUMNS[section]:
+        value = row[index] if index < len(row) else ''
+        if not value:
+            # Columns the parser reads unconditionally must be present, even if empty
+            if required or index >= len(row):
+                errors.append((header, value, 'missing value' if index < len(row) else 'missing column'))
+            continue
+        try:
+            convert(value)
+        except ValueError as e:
+            errors.append((header, value, str(e)))
+    return errors
+
+
+def plan_ranges(path, chunk_size=PARSE_CHUNK_SIZE):
+    """Return (section, start, end) byte ranges covering the data rows of every known section"""
+    ranges = []
+    with open(path, 'rb') as file:
+        if not file.seek(0, io.SEEK_END):
+            return ranges
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            titles = list(SECTION_TITLE.finditer(data))
+            for index, title in enumerate(titles):
+                section = title.group(1).decode().lower()
+                section_end = titles[index + 1].start() if index + 1 < len(titles) else len(data)
+                if section not in SECTION_PARSERS:
+                    continue
+
+                # The column header line follows the title line
+                header_end = data.find(b'\n', title.end() + 1, section_end)
+                if header_end == -1:
+                    continue
+
+                start = header_end + 1
+                while start < section_end:
+                    end = min(start + chunk_size, section_end)
+                    if end < section_end:
+                        line_end = data.find(b'\n', end - 1, section_end)
+                        end = section_end if line_end == -1 else line_end + 1
+                    ranges.append((section, start, end))
+                    start = end
+    return ranges
+
+
+def parse_range(path, section, start, end):
+    """Parse the rows of one byte range; return the field names, the values of every valid row and the
+    messages of invalid rows
+
+    Rows go back as tuples, with the field names once per range, to keep
+    what is pickled back to the parent process small.
+    """
+    with open(path, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+
+    parse = SECTION_PARSERS[section]
+    fields = None
+    values = []
+    errors = []
+    for row in csv.reader(io.StringIO(text, newline='')):
+        # Skip empty lines
+        if not row or not any(row):
+            continue
+        try:
+            parsed = parse(row)
+        except (ValueError, IndexError) as e:
+            errors.append(f"Error importing row: {row}, Error: {e}")
+            continue
+        if fields is None:
+            fields = tuple(parsed)
+        values.append(tuple(parsed.values()))
+    return fields, values, errors
+
+
+def parse_file_parallel(path, workers, chunk_size=PARSE_CHUNK_SIZE):
+    """Parse a plain CSV file in ``workers`` processes, yielding (section, fields, values, errors) per range in file order
+
+    At most two ranges per worker are parsed ahead of the consumer, so
+    memory stays bounded however large the file is.
+    """
+    ranges = deque(plan_ranges(path, chunk_size))
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        running = deque()
+        while ranges or running:
+            while ranges and len(running) < 2 * workers:
+                section, start, end = ranges.popleft()
+                running.append((section, pool.submit(parse_range, path, section, start, end)))
+            section, future = running.popleft()
+            yield (section, *future.result())
@@ -0,0 +1,54 @@
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .models import (
+    StepsRecord, SleepRecord, DietRecord,
+    RunningRecord, TrainingRecord, MoodRecord, WeightRecord, ImportJob
+)
+from .cache import invalidate_history
+from .summary import refresh_daily_summary
+
+RECORD_MODELS = [
+    StepsRecord, SleepRecord, DietRecord,
+    RunningRecord, TrainingRecord, MoodRecord, WeightRecord
+]
+
+
+def remember_summary_day(sender, instance, **kwargs):
+    """Remember which summary row a record belonged to when it was loaded"""
+    instance._summary_key = (instance.user_id, instance.date)
+
+
+def update_summary_on_save(sender, instance, raw=False, **kwargs):
+    """Refresh the daily summary for the record's day (and its previous day if it moved) and drop cached history"""
+    if raw:
+        return
+    refresh_daily_summary(sender, instance.user_id, instance.date)
+    invalidate_history(instance.user_id, sender)
+
+    previous_user_id, previous_date = getattr(instance, '_summary_key', (None, None))
+    if previous_user_id is not None and (previous_user_id, previous_date) != (instance.user_id, instance.date):
+        refresh_daily_summary(sender, previous_user_id, previous_date)
+        if previous_user_id != instance.user_id:
+            invalidate_history(previous_user_id, sender)
+    instance._summary_key = (instance.user_id, instance.date)
+
+
+def update_summary_on_delete(sender, instance, **kwargs):
+    """Refresh the daily summary for the deleted record's day and drop cached history"""
+    refresh_daily_summary(sender, instance.user_id, instance.date)
+    invalidate_history(instance.user_id, sender)
+
+
+for model in RECORD_MODELS:
+    post_init.connect(remember_summary_day, sender=model, dispatch_uid=f'summary_init_{model.__name__}')
+    post_save.connect(update_summary_on_save, sender=model, dispatch_uid=f'summary_save_{model.__name__}')
+    post_delete.connect(update_summary_on_delete, sender=model, dispatch_uid=f'summary_delete_{model.__name__}')
+
+
+def delete_import_file(sender, instance, **kwargs):
+    """Delete the uploaded file of an import job deleted before it ended (with its user, say)"""
+    if instance.file:
+        instance.file.delete(save=False)
+
+
+post_delete.connect(delete_import_file, sender=ImportJob, dispatch_uid='import_job_file_delete')
@@ -0,0 +1,264 @@
+"""Database-side statistics for the health record history pages.
+
+Every function takes the (already filtered) queryset a history view renders
+and computes its summary numbers with a single aggregate query, so the views
+no longer load every row into Python just to show a few figures.
+
+The ``*_summary_stats`` functions compute the same figures from the user's
+``DailyHealthSummary`` rows of the date range instead of the record table.
+They are used for the record types stored once per day, whose summary row
+holds the day's record values exactly; sleep quality and training exercise
+types are not kept in the summaries, so those pages read their records.
+"""
+from django.db.models import Avg, Count, F, Max, Q, Sum
+
+SLEEP_QUALITIES = ['poor', 'fair', 'good', 'excellent']
+MOODS = ['terrible', 'bad', 'neutral', 'good', 'excellent']
+
+
+def _most_common(counts, default):
+    """Return the key with the highest count, keeping the first one on ties"""
+    most_common = default
+    most_common_count = 0
+    for key, count in counts.items():
+        if count > most_common_count:
+            most_common_count = count
+            most_common = key
+    return most_common
+
+
+def steps_stats(records):
+    """Record count, average and maximum steps"""
+    result = records.aggregate(
+        record_count=Count('id'),
+        avg_steps=Avg('steps_count'),
+        max_steps=Max('steps_count'),
+    )
+    return {
+        'record_count': result['record_count'],
+        'avg_steps': round(result['avg_steps']) if result['avg_steps'] is not None else 0,
+        'max_steps': result['max_steps'] or 0,
+    }
+
+
+def sleep_stats(records):
+    """Record count, average sleep hours and the most common sleep quality"""
+    result = records.aggregate(
+        record_count=Count('id'),
+        avg_minutes=Avg(F('hours') * 60 + F('minutes')),
+        **{f'quality_{quality}': Count('id', filter=Q(quality=quality)) for quality in SLEEP_QUALITIES}
+    )
+    quality_counts = {quality: result[f'quality_{quality}'] for quality in SLEEP_QUALITIES}
+
+    avg_sleep = 0
+    avg_quality = "N/A"
+    if result['record_count']:
+        avg_sleep = round(result['avg_minutes'] / 60, 1)
+        if any(quality_counts.values()):
+            avg_quality = _most_common(quality_counts, 'good').title()
+
+    return {
+        'record_count': result['record_count'],
+        'avg_sleep': avg_sleep,
+        'avg_quality': avg_quality,
+        'quality_counts': quality_counts,
+    }
+
+
+def diet_stats(records):
+    """Record count, average calories and average protein (ignoring empty protein)"""
+    result = records.aggregate(
+        record_count=Count('id'),
+        avg_calories=Avg('calories'),
+        avg_protein=Avg('protein', filter=Q(protein__isnull=False) & ~Q(protein=0)),
+    )
+    return {
+        'record_count': result['record_count'],
+        'avg_calories': round(result['avg_calories']) if result['avg_calories'] is not None else 0,
+        'avg_protein': round(result['avg_protein'], 1) if result['avg_protein'] is not None else 0,
+    }
+
+
+def running_stats(records):
+    """Record count, total distance and average pace in min/km"""
+    result = records.aggregate(
+        record_count=Count('id'),
+        total_distance=Sum('distance'),
+        total_duration=Sum('duration_minutes'),
+    )
+    total_distance = float(result['total_distance'] or 0)
+    total_duration = result['total_duration'] or 0
+
+    avg_pace = 0
+    if total_distance > 0:
+        avg_pace = round(total_duration / total_distance, 1)
+
+    return {
+        'record_count': result['record_count'],
+        'total_distance': round(total_distance, 1),
+        'total_duration': total_duration,
+        'avg_pace': avg_pace,
+    }
+
+
+def training_stats(records):
+    """Record count, total training time and the most common exercise type
+
+    Grouping by exercise type gives both the per-type session counts and the
+    total duration in one query; the number of groups is the number of
+    distinct exercise types, not the number of records.
+    """
+    groups = records.order_by().values('exercise_type').annotate(
+        sessions=Count('id'),
+        minutes=Sum('duration_minutes'),
+    )
+
+    record_count = 0
+    total_duration = 0
+    exercise_types = {}
+    for group in groups:
+        record_count += group['sessions']
+        total_duration += group['minutes'] or 0
+        if group['exercise_type']:
+            exercise_types[group['exercise_type']] = group['sessions']
+
+    most_common_exercise = _most_common(exercise_types, "Unknown")
+
+    # Format total training time to hours and minutes
+    hours = total_duration // 60
+    minutes = total_duration % 60
+    total_training_time = f"{hours} hours {minutes} minutes" if hours > 0 else f"{minutes} minutes"
+
+    return {
+        'record_count': record_count,
+        'total_duration': total_duration,
+        'most_common_exercise': most_common_exercise,
+        'total_training_time': total_training_time,
+    }
+
+
+def mood_stats(records):
+    """Record count, per-mood counts and the most common mood"""
+    result = records.aggregate(
+        record_count=Count('id'),
+        **{f'mood_{mood}': Count('id', filter=Q(mood=mood)) for mood in MOODS}
+    )
+    mood_counts = {mood: result[f'mood_{mood}'] for mood in MOODS}
+
+    return {
+        'record_count': result['record_count'],
+        'mood_stats': mood_counts,
+        'most_common_mood': _most_common(mood_counts, "Unknown").title(),
+    }
+
+
+def weight_stats(records):
+    """Record count, average weight and average BMI"""
+    height_in_meters = F('height') / 100.0
+    result = records.aggregate(
+        record_count=Count('id'),
+        avg_weight=Avg('weight'),
+        avg_bmi=Avg(
+            F('weight') / (height_in_meters * height_in_meters),
+            filter=Q(height__gt=0, weight__gt=0),
+        ),
+    )
+    avg_weight = result['avg_weight']
+    if avg_weight:
+        avg_weight = round(avg_weight, 1)
+
+    return {
+        'record_count': result['record_count'],
+        'avg_weight': avg_weight,
+        'avg_bmi': round(result['avg_bmi'], 1) if result['avg_bmi'] is not None else 0,
+    }
+
+
+def steps_summary_stats(summaries):
+    """steps_stats from the daily summaries"""
+    days = Q(steps_count__gt=0)
+    result = summaries.aggregate(
+        record_count=Sum('steps_count'),
+        avg_steps=Avg('steps_total', filter=days),
+        max_steps=Max('steps_total', filter=days),
+    )
+    return {
+        'record_count': result['record_count'] or 0,
+        'avg_steps': round(result['avg_steps']) if result['avg_steps'] is not None else 0,
+        'max_steps': result['max_steps'] or 0,
+    }
+
+
+def diet_summary_stats(summaries):
+    """diet_stats from the daily summaries (an empty protein is summed as 0)"""
+    days = Q(diet_count__gt=0)
+    result = summaries.aggregate(
+        record_count=Sum('diet_count'),
+        avg_calories=Avg('calories_total', filter=days),
+        avg_protein=Avg('protein_total', filter=days & Q(protein_total__gt=0)),
+    )
+    return {
+        'record_count': result['record_count'] or 0,
+        'avg_calories': round(result['avg_calories']) if result['avg_calories'] is not None else 0,
+        'avg_protein': round(result['avg_protein'], 1) if result['avg_protein'] is not None else 0,
+    }
+
+
+def running_summary_stats(summaries):
+    """running_stats from the daily summaries"""
+    result = summaries.aggregate(
+        record_count=Sum('running_count'),
+        total_distance=Sum('running_distance_total'),
+        total_duration=Sum('running_duration_total'),
+    )
+    total_distance = float(result['total_distance'] or 0)
+    total_duration = result['total_duration'] or 0
+
+    avg_pace = 0
+    if total_distance > 0:
+        avg_pace = round(total_duration / total_distance, 1)
+
+    return {
+        'record_count': result['record_count'] or 0,
+        'total_distance': round(total_distance, 1),
+        'total_duration': total_duration,
+        'avg_pace': avg_pace,
+    }
+
+
+def mood_summary_stats(summaries):
+    """mood_stats from the daily summaries"""
+    result = summaries.aggregate(
+        record_count=Sum('mood_count'),
+        **{f'mood_{mood}': Count('id', filter=Q(mood_count__gt=0, mood_latest=mood)) for mood in MOODS}
+    )
+    mood_counts = {mood: result[f'mood_{mood}'] for mood in MOODS}
+
+    return {
+        'record_count': result['record_count'] or 0,
+        'mood_stats': mood_counts,
+        'most_common_mood': _most_common(mood_counts, "Unknown").title(),
+    }
+
+
+def weight_summary_stats(summaries):
+    """weight_stats from the daily summaries"""
+    days = Q(weight_count__gt=0)
+    height_in_meters = F('height_latest') / 100.0
+    result = summaries.aggregate(
+        record_count=Sum('weight_count'),
+        avg_weight=Avg('weight_latest', filter=days),
+        avg_bmi=Avg(
+            F('weight_latest') / (height_in_meters * height_in_meters),
+            filter=days & Q(height_latest__gt=0, weight_latest__gt=0),
+        ),
+    )
+    avg_weight = result['avg_weight']
+    if avg_weight:
+        avg_weight = round(avg_weight, 1)
+
+    return {
+        'record_count': result['record_count'] or 0,
+        'avg_weight': avg_weight,
+        'avg_bmi': round(result['avg_bmi'], 1) if result['avg_bmi'] is not None else 0,
+    }
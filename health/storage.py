@@ -0,0 +1,28 @@
+"""Private storage of the files uploaded for import jobs.
+
+An import job keeps the raw upload (a whole Apple Health export, say) until
+it finishes. ``MEDIA_ROOT`` is served to anyone who knows a file's URL, and
+upload names such as ``export.zip`` are easy to guess, so the files are
+stored under ``HEALTH_IMPORT_ROOT`` instead, which no URL maps to, and are
+deleted once their job has ended (see ``health.jobs``).
+"""
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
+
+
+class ImportFileStorage(FileSystemStorage):
+    """FileSystemStorage rooted at HEALTH_IMPORT_ROOT rather than MEDIA_ROOT"""
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.HEALTH_IMPORT_ROOT)
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'HEALTH_IMPORT_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+
+
+import_file_storage = ImportFileStorage()
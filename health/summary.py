@@ -0,0 +1,184 @@
+"""Maintenance of the DailyHealthSummary rollup table.
+
+Each record model owns one "section" of the summary row: a set of totals
+computed with aggregates and, for mood and weight, the values of the latest
+record of the day. Saving or deleting a record only recomputes that record
+type's section for the affected day (see ``health.signals``), while
+``rebuild_daily_summaries`` recomputes every row with one grouped query per
+record type. The rows are read by the history statistics of the once-a-day
+record types (``health.stats``) and the dashboard's weekly totals
+(``health.loaders``).
+
+Note that ``QuerySet.update()``, ``QuerySet.delete()`` and ``bulk_create()``
+do not send model signals; code using them must call
+``refresh_daily_summaries`` for the days it touched.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import (
+    StepsRecord, SleepRecord, DietRecord,
+    RunningRecord, TrainingRecord, MoodRecord, WeightRecord, DailyHealthSummary
+)
+
+SUMMARY_SECTIONS = {
+    StepsRecord: {
+        'totals': {
+            'steps_total': Sum('steps_count'),
+            'steps_count': Count('id'),
+        },
+        'latest': {},
+    },
+    SleepRecord: {
+        'totals': {
+            'sleep_minutes_total': Sum(F('hours') * 60 + F('minutes')),
+            'sleep_count': Count('id'),
+        },
+        'latest': {},
+    },
+    DietRecord: {
+        'totals': {
+            'calories_total': Sum('calories'),
+            'protein_total': Sum('protein'),
+            'diet_count': Count('id'),
+        },
+        'latest': {},
+    },
+    RunningRecord: {
+        'totals': {
+            'running_distance_total': Sum('distance'),
+            'running_duration_total': Sum('duration_minutes'),
+            'running_calories_total': Sum('calories_burned'),
+            'running_count': Count('id'),
+        },
+        'latest': {},
+    },
+    TrainingRecord: {
+        'totals': {
+            'training_duration_total': Sum('duration_minutes'),
+            'training_calories_total': Sum('calories_burned'),
+            'training_count': Count('id'),
+        },
+        'latest': {},
+    },
+    MoodRecord: {
+        'totals': {
+            'mood_count': Count('id'),
+        },
+        'latest': {
+            'mood_latest': 'mood',
+            'stress_level_latest': 'stress_level',
+        },
+    },
+    WeightRecord: {
+        'totals': {
+            'weight_count': Count('id'),
+        },
+        'latest': {
+            'weight_latest': 'weight',
+            'height_latest': 'height',
+        },
+    },
+}
+
+COUNT_FIELDS = [
+    'steps_count', 'sleep_count', 'diet_count', 'running_count',
+    'training_count', 'mood_count', 'weight_count',
+]
+
+
+def _clean_totals(values):
+    """Replace the None returned by Sum() over no rows with 0"""
+    return {field: value if value is not None else 0 for field, value in values.items()}
+
+
+def compute_section(model, user_id, day):
+    """Compute the summary fields of one record type for one user and day"""
+    section = SUMMARY_SECTIONS[model]
+    records = model.objects.filter(user_id=user_id, date=day)
+
+    values = _clean_totals(records.aggregate(**section['totals']))
+    if section['latest']:
+        latest = records.order_by('-created_at', '-id').values(*section['latest'].values()).first()
+        for field, source in section['latest'].items():
+            values[field] = latest[source] if latest else None
+    return values
+
+
+def refresh_daily_summary(model, user_id, day):
+    """Recompute one record type's section of a user's summary for one day
+
+    Rows are only created when the section has records and are deleted once
+    every section of the day is empty.
+    """
+    values = compute_section(model, user_id, day)
+    count_field = next(field for field in SUMMARY_SECTIONS[model]['totals'] if field in COUNT_FIELDS)
+    summaries = DailyHealthSummary.objects.filter(user_id=user_id, date=day)
+
+    with transaction.atomic():
+        updated = summaries.update(**values)
+        if not updated and values[count_field]:
+            try:
+                with transaction.atomic():
+                    DailyHealthSummary.objects.create(user_id=user_id, date=day, **values)
+            except IntegrityError:
+                # Another request created the row in the meantime
+                summaries.update(**values)
+        elif updated and not values[count_field]:
+            summaries.filter(**{field: 0 for field in COUNT_FIELDS}).delete()
+
+
+def refresh_daily_summaries(model, user_id, days):
+    """Recompute one record type's section for several days of a user"""
+    for day in set(days):
+        refresh_daily_summary(model, user_id, day)
+
+
+def rebuild_daily_summaries(user_ids=None, batch_size=1000, apps=None):
+    """Rebuild summary rows from the record tables
+
+    Runs one grouped aggregate query per record type (plus one ordered scan
+    for the "latest" sections) instead of one query per user and day.
+    ``apps`` is the app registry of a data migration, whose historical
+    models are used instead of the current ones. Returns the number of
+    summary rows written.
+    """
+    def get_model(model):
+        return apps.get_model('health', model.__name__) if apps is not None else model
+
+    summary_model = get_model(DailyHealthSummary)
+    rows = {}
+
+    for model, section in SUMMARY_SECTIONS.items():
+        records = get_model(model).objects.all()
+        if user_ids is not None:
+            records = records.filter(user_id__in=user_ids)
+
+        grouped = records.order_by().values('user_id', 'date').annotate(**section['totals'])
+        for group in grouped.iterator():
+            key = (group['user_id'], group['date'])
+            row = rows.setdefault(key, {})
+            row.update(_clean_totals({field: group[field] for field in section['totals']}))
+
+        if section['latest']:
+            # Later records overwrite earlier ones, leaving the latest of each day
+            latest = records.order_by('user_id', 'date', 'created_at', 'id').values(
+                'user_id', 'date', *section['latest'].values()
+            )
+            for record in latest.iterator():
+                row = rows[(record['user_id'], record['date'])]
+                for field, source in section['latest'].items():
+                    row[field] = record[source]
+
+    summaries = []
+    for (user_id, day), values in rows.items():
+        summaries.append(summary_model(user_id=user_id, date=day, **values))
+
+    with transaction.atomic():
+        existing = summary_model.objects.all()
+        if user_ids is not None:
+            existing = existing.filter(user_id__in=user_ids)
+        existing.delete()
+        summary_model.objects.bulk_create(summaries, batch_size=batch_size)
+
+    return len(summaries)
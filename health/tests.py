@@ -1,4 +1,4 @@
-from django.test import TestCase, Client, override_settings
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -13,7 +13,9 @@ from .models import (
     MoodRecord,
     TrainingRecord,
     HealthGoal,
-    WeightRecord
+    WeightRecord,
+    DailyHealthSummary,
+    ImportJob
 )
 from .forms import (
     RunningRecordForm,
@@ -244,6 +246,14 @@ class HealthRecordModelTestCase(TestCase):
             str(self.health_goal), 
             f"{self.user.username}'s Health Goals"
         )
+    
+    def test_index_benchmark_requires_confirmation(self):
+        """Test the index benchmark does not lock the health tables without being told it may, even with DEBUG on"""
+        from django.core.management import call_command, CommandError
+        
+        with self.assertRaisesMessage(CommandError, '--i-know-this-locks-tables'):
+            call_command('benchmark_indexes')
+        self.assertEqual(get_user_model().objects.filter(username__startswith='bench_index_').count(), 0)
 
 
 @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
@@ -551,3 +561,1501 @@ class HealthViewTestCase(TestCase):
         
         # Verify health goal exists
         self.assertEqual(HealthGoal.objects.filter(user=self.user).count(), 1)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  DEBUG=True)
+class HealthStatsTestCase(TestCase):
+    """Test cases for the database-side history statistics"""
+    
+    def setUp(self):
+        """Set up a few days of records"""
+        self.user = get_user_model().objects.create_user(
+            username='statsuser',
+            email='stats@example.com',
+            password='testpass123'
+        )
+        self.today = timezone.now().date()
+        
+        for i, steps in enumerate([8000, 12000, 10001]):
+            StepsRecord.objects.create(user=self.user, date=self.today - timedelta(days=i), steps_count=steps)
+        
+        for i, (hours, minutes, quality) in enumerate([(7, 30, 'good'), (8, 0, 'fair'), (6, 30, 'fair')]):
+            SleepRecord.objects.create(user=self.user, date=self.today - timedelta(days=i),
+                                       hours=hours, minutes=minutes, quality=quality)
+        
+        DietRecord.objects.create(user=self.user, date=self.today, calories=2000, protein=100)
+        DietRecord.objects.create(user=self.user, date=self.today - timedelta(days=1), calories=2501, protein=None)
+        
+        RunningRecord.objects.create(user=self.user, date=self.today, distance=5.0, duration_minutes=30)
+        RunningRecord.objects.create(user=self.user, date=self.today - timedelta(days=1), distance=10.0, duration_minutes=55)
+        
+        TrainingRecord.objects.create(user=self.user, date=self.today, exercise_type='Squat', duration_minutes=45)
+        TrainingRecord.objects.create(user=self.user, date=self.today, exercise_type='Bench', duration_minutes=30)
+        TrainingRecord.objects.create(user=self.user, date=self.today - timedelta(days=1), exercise_type='Squat', duration_minutes=40)
+        
+        for i, mood in enumerate(['good', 'bad', 'good']):
+            MoodRecord.objects.create(user=self.user, date=self.today - timedelta(days=i), mood=mood)
+        
+        WeightRecord.objects.create(user=self.user, date=self.today, weight=81.0, height=180.0)
+        WeightRecord.objects.create(user=self.user, date=self.today - timedelta(days=1), weight=80.0, height=180.0)
+    
+    def test_steps_stats(self):
+        """Test average and maximum steps"""
+        from .stats import steps_stats
+        
+        with self.assertNumQueries(1):
+            result = steps_stats(StepsRecord.objects.filter(user=self.user).order_by('-date'))
+        self.assertEqual(result, {'record_count': 3, 'avg_steps': 10000, 'max_steps': 12000})
+    
+    def test_sleep_stats(self):
+        """Test average sleep and most common quality"""
+        from .stats import sleep_stats
+        
+        with self.assertNumQueries(1):
+            result = sleep_stats(SleepRecord.objects.filter(user=self.user))
+        self.assertEqual(result['avg_sleep'], 7.3)
+        self.assertEqual(result['avg_quality'], 'Fair')
+        self.assertEqual(result['quality_counts'], {'poor': 0, 'fair': 2, 'good': 1, 'excellent': 0})
+    
+    def test_diet_stats(self):
+        """Test average calories and protein ignoring empty protein"""
+        from .stats import diet_stats
+        
+        result = diet_stats(DietRecord.objects.filter(user=self.user))
+        self.assertEqual(result['avg_calories'], 2250)
+        self.assertEqual(result['avg_protein'], 100)
+    
+    def test_running_stats(self):
+        """Test total distance and average pace"""
+        from .stats import running_stats
+        
+        result = running_stats(RunningRecord.objects.filter(user=self.user))
+        self.assertEqual(result['total_distance'], 15.0)
+        self.assertEqual(result['avg_pace'], 5.7)
+    
+    def test_training_stats(self):
+        """Test total training time and most common exercise"""
+        from .stats import training_stats
+        
+        with self.assertNumQueries(1):
+            result = training_stats(TrainingRecord.objects.filter(user=self.user).order_by('-date'))
+        self.assertEqual(result['record_count'], 3)
+        self.assertEqual(result['most_common_exercise'], 'Squat')
+        self.assertEqual(result['total_training_time'], '1 hours 55 minutes')
+    
+    def test_mood_stats(self):
+        """Test mood counts and most common mood"""
+        from .stats import mood_stats
+        
+        result = mood_stats(MoodRecord.objects.filter(user=self.user))
+        self.assertEqual(result['mood_stats']['good'], 2)
+        self.assertEqual(result['most_common_mood'], 'Good')
+    
+    def test_weight_stats(self):
+        """Test average weight and BMI"""
+        from .stats import weight_stats
+        
+        result = weight_stats(WeightRecord.objects.filter(user=self.user))
+        self.assertEqual(result['avg_weight'], 80.5)
+        self.assertEqual(result['avg_bmi'], 24.8)
+    
+    def test_empty_stats(self):
+        """Test statistics for a user without records"""
+        from .stats import steps_stats, sleep_stats, mood_stats
+        
+        other = get_user_model().objects.create_user(username='empty', email='empty@example.com', password='testpass123')
+        self.assertEqual(steps_stats(StepsRecord.objects.filter(user=other))['avg_steps'], 0)
+        self.assertEqual(sleep_stats(SleepRecord.objects.filter(user=other))['avg_quality'], 'N/A')
+        self.assertEqual(mood_stats(MoodRecord.objects.filter(user=other))['most_common_mood'], 'Unknown')
+    
+    def test_summary_stats_match_record_stats(self):
+        """Test the statistics read from the daily summaries equal those of the records"""
+        from . import stats
+        
+        summaries = DailyHealthSummary.objects.filter(user=self.user)
+        for model, name in [(StepsRecord, 'steps'), (DietRecord, 'diet'), (RunningRecord, 'running'),
+                            (MoodRecord, 'mood'), (WeightRecord, 'weight')]:
+            with self.assertNumQueries(1):
+                from_summaries = getattr(stats, f'{name}_summary_stats')(summaries)
+            self.assertEqual(from_summaries, getattr(stats, f'{name}_stats')(model.objects.filter(user=self.user)))
+        
+        since = summaries.filter(date__gte=self.today - timedelta(days=1))
+        self.assertEqual(stats.steps_summary_stats(since), {'record_count': 2, 'avg_steps': 10000, 'max_steps': 12000})
+        other = get_user_model().objects.create_user(username='empty', email='empty@example.com', password='testpass123')
+        self.assertEqual(stats.mood_summary_stats(DailyHealthSummary.objects.filter(user=other))['record_count'], 0)
+    
+    def test_history_views_render_stats(self):
+        """Test every history view renders with the aggregated statistics"""
+        self.client.login(username='statsuser', password='testpass123')
+        for record_type in ['steps', 'sleep', 'diet', 'running', 'training', 'mood', 'weight']:
+            response = self.client.get(f'/health/{record_type}/history/')
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(response.context['record_count'], 0)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  DEBUG=True)
+class DailyHealthSummaryTestCase(TestCase):
+    """Test cases for the DailyHealthSummary rollup table"""
+    
+    def setUp(self):
+        """Set up test user"""
+        self.user = get_user_model().objects.create_user(
+            username='summaryuser',
+            email='summary@example.com',
+            password='testpass123'
+        )
+        self.today = timezone.now().date()
+        self.yesterday = self.today - timedelta(days=1)
+    
+    def get_summary(self, day):
+        return DailyHealthSummary.objects.get(user=self.user, date=day)
+    
+    def test_summary_created_on_save(self):
+        """Test saving records creates and updates the day's summary"""
+        steps = StepsRecord.objects.create(user=self.user, date=self.today, steps_count=4000)
+        steps.steps_count = 6000
+        steps.save()
+        SleepRecord.objects.create(user=self.user, date=self.today, hours=7, minutes=30)
+        TrainingRecord.objects.create(user=self.user, date=self.today, exercise_type='Squat', duration_minutes=40)
+        TrainingRecord.objects.create(user=self.user, date=self.today, exercise_type='Bench', duration_minutes=20)
+        mood = MoodRecord.objects.create(user=self.user, date=self.today, mood='bad', stress_level=7)
+        mood.mood = 'good'
+        mood.stress_level = 2
+        mood.save()
+        
+        summary = self.get_summary(self.today)
+        self.assertEqual(summary.steps_total, 6000)
+        self.assertEqual(summary.steps_count, 1)
+        self.assertEqual(summary.sleep_minutes_total, 450)
+        self.assertEqual(summary.training_duration_total, 60)
+        self.assertEqual(summary.training_count, 2)
+        self.assertEqual(summary.mood_latest, 'good')
+        self.assertEqual(summary.stress_level_latest, 2)
+        self.assertEqual(summary.mood_count, 1)
+    
+    def test_summary_follows_edits_and_deletes(self):
+        """Test editing a record's date moves it between summaries and deleting removes it"""
+        record = RunningRecord.objects.create(user=self.user, date=self.today, distance=5.0, duration_minutes=30)
+        WeightRecord.objects.create(user=self.user, date=self.yesterday, weight=80.0, height=180.0)
+        
+        record = RunningRecord.objects.get(pk=record.pk)
+        record.date = self.yesterday
+        record.save()
+        
+        self.assertFalse(DailyHealthSummary.objects.filter(user=self.user, date=self.today).exists())
+        summary = self.get_summary(self.yesterday)
+        self.assertEqual(summary.running_distance_total, 5.0)
+        self.assertEqual(summary.running_count, 1)
+        self.assertEqual(summary.weight_latest, 80.0)
+        
+        record.delete()
+        summary = self.get_summary(self.yesterday)
+        self.assertEqual(summary.running_count, 0)
+        self.assertEqual(summary.running_distance_total, 0)
+        self.assertEqual(summary.weight_count, 1)
+    
+    def test_rebuild_matches_incremental_summary(self):
+        """Test the rebuild produces the same rows as the signal handlers"""
+        from django.core.management import call_command
+        from io import StringIO
+        
+        DietRecord.objects.create(user=self.user, date=self.today, calories=2200, protein=90)
+        TrainingRecord.objects.create(user=self.user, date=self.yesterday, exercise_type='Squat', duration_minutes=40)
+        TrainingRecord.objects.create(user=self.user, date=self.yesterday, exercise_type='Row', duration_minutes=15)
+        WeightRecord.objects.create(user=self.user, date=self.yesterday, weight=80.5, height=180.0)
+        
+        fields = ['date', 'calories_total', 'protein_total', 'diet_count', 'training_duration_total',
+                  'training_count', 'weight_latest', 'weight_count']
+        incremental = list(DailyHealthSummary.objects.filter(user=self.user).values(*fields))
+        
+        DailyHealthSummary.objects.all().delete()
+        call_command('rebuild_daily_summaries', stdout=StringIO())
+        rebuilt = list(DailyHealthSummary.objects.filter(user=self.user).values(*fields))
+        
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(rebuilt[0]['calories_total'], 2200)
+        self.assertEqual(rebuilt[1]['weight_latest'], 80.5)
+    
+    def test_deleting_user_cascades(self):
+        """Test deleting a user with records and summaries works"""
+        StepsRecord.objects.create(user=self.user, date=self.today, steps_count=4000)
+        self.user.delete()
+        self.assertEqual(DailyHealthSummary.objects.count(), 0)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  DEBUG=True)
+class CursorPaginationTestCase(TestCase):
+    """Test cases for keyset pagination of history pages"""
+    
+    def setUp(self):
+        """Set up 25 training records, two of them on the same day"""
+        self.user = get_user_model().objects.create_user(
+            username='pageuser',
+            email='page@example.com',
+            password='testpass123'
+        )
+        self.today = timezone.now().date()
+        for i in range(24):
+            TrainingRecord.objects.create(user=self.user, date=self.today - timedelta(days=i),
+                                          exercise_type='Squat', duration_minutes=30 + i)
+        TrainingRecord.objects.create(user=self.user, date=self.today - timedelta(days=5),
+                                      exercise_type='Bench', duration_minutes=45)
+    
+    def test_walk_forward_and_back(self):
+        """Test following next and previous tokens visits every record exactly once"""
+        from .pagination import CursorPaginator
+        
+        paginator = CursorPaginator(TrainingRecord.objects.filter(user=self.user), per_page=10)
+        expected = list(TrainingRecord.objects.filter(user=self.user).order_by('-date', '-id'))
+        
+        first = paginator.page()
+        self.assertFalse(first.has_previous)
+        second = paginator.page(first.next_cursor)
+        third = paginator.page(second.next_cursor)
+        self.assertFalse(third.has_next)
+        self.assertEqual(list(first) + list(second) + list(third), expected)
+        
+        back = paginator.page(third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        self.assertTrue(back.has_previous)
+        self.assertEqual(list(paginator.page(back.previous_cursor)), list(first))
+        self.assertFalse(paginator.page(back.previous_cursor).has_previous)
+    
+    def test_constant_query_count(self):
+        """Test a deep page costs one query and no COUNT"""
+        from .pagination import CursorPaginator
+        
+        paginator = CursorPaginator(TrainingRecord.objects.filter(user=self.user), per_page=10)
+        cursor = paginator.page().next_cursor
+        with self.assertNumQueries(1):
+            page = paginator.page(cursor)
+        self.assertEqual(len(page), 10)
+    
+    def test_invalid_cursor_returns_first_page(self):
+        """Test a malformed token falls back to the first page"""
+        from .pagination import CursorPaginator
+        
+        paginator = CursorPaginator(TrainingRecord.objects.filter(user=self.user), per_page=10)
+        self.assertEqual(list(paginator.page('not-a-cursor')), list(paginator.page()))
+    
+    def test_history_view_cursor(self):
+        """Test the training history view follows the cursor parameter"""
+        self.client.login(username='pageuser', password='testpass123')
+        response = self.client.get('/health/training/history/')
+        records = response.context['training_records']
+        self.assertEqual(len(records), 10)
+        self.assertEqual(response.context['record_count'], 25)
+        
+        response = self.client.get('/health/training/history/', {'cursor': records.next_cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['training_records'].has_previous)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  DEBUG=True)
+class ChartDownsamplingTestCase(TestCase):
+    """Test cases for history chart downsampling"""
+    
+    def test_short_series_unchanged(self):
+        """Test series within the budget are returned as they are"""
+        from .charts import downsample
+        
+        dates = ['2025-01-01', '2025-01-02', '2025-01-03']
+        self.assertEqual(downsample(dates, [1, 2, 3], max_points=10), (dates, [1, 2, 3]))
+    
+    def test_long_series_capped_and_peaks_kept(self):
+        """Test long series are capped and keep their endpoints and peaks"""
+        from .charts import downsample
+        
+        start = timezone.now().date() - timedelta(days=999)
+        dates = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(1000)]
+        values = [5000 + (i % 7) * 10 for i in range(1000)]
+        values[400] = 40000
+        values[700] = 0
+        
+        sampled_dates, sampled_values = downsample(dates, values, max_points=100)
+        self.assertLessEqual(len(sampled_dates), 100)
+        self.assertEqual(len(sampled_dates), len(sampled_values))
+        self.assertEqual(sampled_dates[0], dates[0])
+        self.assertEqual(sampled_dates[-1], dates[-1])
+        self.assertIn(40000, sampled_values)
+        self.assertIn(0, sampled_values)
+        self.assertEqual(sampled_dates, sorted(sampled_dates))
+    
+    def test_dual_series_stay_aligned(self):
+        """Test weight and BMI series are downsampled onto the same dates"""
+        from .charts import downsample
+        
+        start = timezone.now().date() - timedelta(days=499)
+        dates = [start + timedelta(days=i) for i in range(500)]
+        weights = [80 - i * 0.01 for i in range(500)]
+        bmis = [round(w / 3.24, 2) for w in weights]
+        
+        sampled_dates, sampled_weights, sampled_bmis = downsample(dates, weights, bmis, max_points=50)
+        self.assertLessEqual(len(sampled_dates), 50)
+        for day, weight, bmi in zip(sampled_dates, sampled_weights, sampled_bmis):
+            index = dates.index(day)
+            self.assertEqual((weight, bmi), (weights[index], bmis[index]))
+    
+    def test_training_pivot(self):
+        """Test training minutes are summed per day and exercise type in one query"""
+        from .charts import training_chart
+        
+        user = get_user_model().objects.create_user(username='pivotuser', email='pivot@example.com', password='testpass123')
+        today = timezone.now().date()
+        yesterday = today - timedelta(days=1)
+        TrainingRecord.objects.create(user=user, date=yesterday, exercise_type='Squat', duration_minutes=20)
+        TrainingRecord.objects.create(user=user, date=yesterday, exercise_type='Squat', duration_minutes=15)
+        TrainingRecord.objects.create(user=user, date=today, exercise_type='Bench', duration_minutes=30)
+        TrainingRecord.objects.create(user=user, date=today, exercise_type='Squat')
+        
+        with self.assertNumQueries(1):
+            chart = training_chart(TrainingRecord.objects.filter(user=user))
+        
+        self.assertEqual(chart['dates'], [yesterday.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')])
+        self.assertEqual(chart['exercise_data'], {'Squat': [35, 0], 'Bench': [0, 30]})
+        self.assertEqual(sorted(chart['exercise_types']), ['Bench', 'Squat'])
+    
+    @override_settings(HEALTH_CHART_MAX_POINTS=20)
+    def test_history_view_respects_setting(self):
+        """Test the weight history chart is capped by HEALTH_CHART_MAX_POINTS"""
+        user = get_user_model().objects.create_user(username='chartuser', email='chart@example.com', password='testpass123')
+        today = timezone.now().date()
+        WeightRecord.objects.bulk_create([
+            WeightRecord(user=user, date=today - timedelta(days=i), weight=80 + (i % 5), height=180.0)
+            for i in range(200)
+        ])
+        
+        self.client.login(username='chartuser', password='testpass123')
+        response = self.client.get('/health/weight/history/', {
+            'date_from': (today - timedelta(days=300)).strftime('%Y-%m-%d'),
+            'date_to': today.strftime('%Y-%m-%d'),
+        })
+        chart_dates = json.loads(response.context['chart_dates'])
+        self.assertLessEqual(len(chart_dates), 20)
+        self.assertEqual(len(json.loads(response.context['chart_bmi_data'])), len(chart_dates))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  DEBUG=True)
+class HistoryChartDataTestCase(TestCase):
+    """Test cases for the JSON chart data endpoints"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = get_user_model().objects.create_user(
+            username='chartuser',
+            email='chart@example.com',
+            password='testpass123'
+        )
+        self.client = Client()
+        self.client.login(username='chartuser', password='testpass123')
+        self.today = timezone.now().date()
+        for i in range(3):
+            StepsRecord.objects.create(user=self.user, date=self.today - timedelta(days=i), steps_count=1000 * (i + 1))
+        self.url = reverse('history_chart_data', args=['steps'])
+    
+    def test_chart_data_json(self):
+        """Test the endpoint returns the chart series oldest first with an ETag"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response['ETag'].startswith('W/'))
+        data = response.json()
+        self.assertEqual(data['data'], [3000, 2000, 1000])
+        self.assertEqual(data['dates'][-1], self.today.strftime('%Y-%m-%d'))
+    
+    def test_not_modified(self):
+        """Test a matching If-None-Match gets a 304"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_etag_changes_with_records(self):
+        """Test adding, editing and deleting records changes the ETag"""
+        first = self.client.get(self.url)['ETag']
+        record = StepsRecord.objects.create(user=self.user, date=self.today - timedelta(days=3), steps_count=500)
+        second = self.client.get(self.url)['ETag']
+        self.assertNotEqual(first, second)
+        
+        record.steps_count = 700
+        record.save()
+        third = self.client.get(self.url)['ETag']
+        self.assertNotEqual(second, third)
+        
+        record.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=third)
+        self.assertEqual(response.status_code, 200)
+    
+    def test_etag_depends_on_filters(self):
+        """Test different date ranges get different ETags"""
+        default = self.client.get(self.url)['ETag']
+        filtered = self.client.get(self.url, {'date_from': self.today.strftime('%Y-%m-%d')})
+        self.assertNotEqual(default, filtered['ETag'])
+        self.assertEqual(filtered.json()['data'], [1000])
+    
+    def test_weight_and_training_series(self):
+        """Test the weight and training endpoints return their extra series"""
+        WeightRecord.objects.create(user=self.user, date=self.today, weight=72.0, height=180.0)
+        TrainingRecord.objects.create(user=self.user, date=self.today, exercise_type='Squat', duration_minutes=30)
+        
+        weight = self.client.get(reverse('history_chart_data', args=['weight'])).json()
+        self.assertEqual(weight['bmi_data'], [22.22])
+        training = self.client.get(reverse('history_chart_data', args=['training'])).json()
+        self.assertEqual(training['exercise_data'], {'Squat': [30]})
+    
+    def test_history_page_loads_chart_ranges(self):
+        """Test the history page's chart range buttons fetch the series from the endpoint"""
+        response = self.client.get(reverse('steps_history'))
+        self.assertContains(response, f'class="chart-ranges" data-url="{self.url}"')
+        self.assertContains(response, 'data-range-days="90"')
+        self.assertContains(response, 'dates: ["')
+    
+    def test_unknown_type_and_login(self):
+        """Test unknown record types give 404 and anonymous users are redirected"""
+        self.assertEqual(self.client.get(reverse('history_chart_data', args=['unknown'])).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  DEBUG=True)
+class HistoryCacheTestCase(TestCase):
+    """Test cases for cached history page snapshots"""
+    
+    def setUp(self):
+        """Set up test data"""
+        from django.core.cache import cache
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='cacheuser',
+            email='cache@example.com',
+            password='testpass123'
+        )
+        self.client = Client()
+        self.client.login(username='cacheuser', password='testpass123')
+        self.today = timezone.now().date()
+        StepsRecord.objects.create(user=self.user, date=self.today, steps_count=4000)
+    
+    def assert_cached_until_write(self):
+        """Check a second load skips the stats queries and a new record shows up"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        url = reverse('steps_history')
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get(url)
+        self.assertEqual(response.context['record_count'], 1)
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(url)
+        self.assertEqual(response.context['record_count'], 1)
+        self.assertLess(len(second), len(first))
+        
+        StepsRecord.objects.create(user=self.user, date=self.today - timedelta(days=1), steps_count=6000)
+        response = self.client.get(url)
+        self.assertEqual(response.context['record_count'], 2)
+        self.assertEqual(response.context['max_steps'], 6000)
+    
+    def test_database_backend(self):
+        """Test snapshots with the configured database cache, which is not culled at Django's default of 300 entries"""
+        from django.core.cache import caches
+        
+        self.assert_cached_until_write()
+        self.assertGreaterEqual(caches['default']._max_entries, 10000)
+    
+    def test_locmem_backend(self):
+        """Test snapshots with the local-memory cache when a single process is declared"""
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                               'LOCATION': 'health-history-test'}},
+                           HEALTH_HISTORY_CACHE_LOCAL_MEMORY=True):
+            self.assert_cached_until_write()
+    
+    def test_locmem_backend_not_used_by_default(self):
+        """Test snapshots are not kept in a process-local cache that other workers could not invalidate"""
+        from .cache import get_history_snapshot
+        
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                               'LOCATION': 'health-history-test'}}):
+            self.assertEqual(get_history_snapshot(self.user.pk, StepsRecord, None, None, lambda: 'first'), 'first')
+            self.assertEqual(get_history_snapshot(self.user.pk, StepsRecord, None, None, lambda: 'second'), 'second')
+    
+    def test_filebased_backend(self):
+        """Test snapshots with the file-based cache"""
+        import tempfile
+        
+        with tempfile.TemporaryDirectory() as location:
+            with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                                   'LOCATION': location}}):
+                self.assert_cached_until_write()
+    
+    def test_keyed_by_range_and_type(self):
+        """Test different date ranges and record types get their own snapshots"""
+        from .cache import get_history_snapshot
+        
+        first = get_history_snapshot(self.user.pk, StepsRecord, None, None, lambda: 'all')
+        self.assertEqual(get_history_snapshot(self.user.pk, StepsRecord, None, None, lambda: 'rebuilt'), 'all')
+        self.assertEqual(get_history_snapshot(self.user.pk, StepsRecord, '2025-01-01', None, lambda: 'range'), 'range')
+        self.assertEqual(get_history_snapshot(self.user.pk, SleepRecord, None, None, lambda: 'sleep'), 'sleep')
+        self.assertEqual(first, 'all')
+    
+    def test_delete_invalidates(self):
+        """Test deleting a record drops the cached snapshot"""
+        url = reverse('steps_history')
+        self.assertEqual(self.client.get(url).context['record_count'], 1)
+        StepsRecord.objects.filter(user=self.user).get().delete()
+        self.assertEqual(self.client.get(url).context['record_count'], 0)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  DEBUG=True)
+class DashboardLoaderTestCase(TestCase):
+    """Test cases for the single-query dashboard loader"""
+    
+    def setUp(self):
+        """Set up today's records, an earlier training session and records of other days and users"""
+        self.user = get_user_model().objects.create_user(
+            username='dashuser',
+            email='dash@example.com',
+            password='testpass123'
+        )
+        self.other_user = get_user_model().objects.create_user(
+            username='otherdash',
+            email='otherdash@example.com',
+            password='testpass123'
+        )
+        self.today = timezone.now().date()
+        yesterday = self.today - timedelta(days=1)
+        
+        StepsRecord.objects.create(user=self.user, date=yesterday, steps_count=99999)
+        TrainingRecord.objects.create(user=self.user, date=self.today, exercise_type='Bench', sets=3, reps=8)
+        self.steps = StepsRecord.objects.create(user=self.user, date=self.today, steps_count=8000)
+        StepsRecord.objects.create(user=self.other_user, date=self.today, steps_count=1)
+        self.sleep = SleepRecord.objects.create(user=self.user, date=self.today, hours=7, minutes=30, quality='good')
+        self.running = RunningRecord.objects.create(user=self.user, date=self.today, distance=5.5, duration_minutes=30)
+        self.training = TrainingRecord.objects.create(user=self.user, date=self.today, exercise_type='Squat',
+                                                      sets=5, reps=5, weight=100.0)
+        self.mood = MoodRecord.objects.create(user=self.user, date=self.today, mood='good', stress_level=3)
+        self.weight = WeightRecord.objects.create(user=self.user, date=self.today, weight=72.0, height=180.0)
+        HealthGoal.objects.create(user=self.user, daily_steps_goal=10000)
+    
+    def test_loader_returns_latest_records(self):
+        """Test the loader returns today's latest record of each type with its field values"""
+        from .loaders import load_latest_records
+        
+        with self.assertNumQueries(1):
+            records = load_latest_records(self.user, self.today)
+        
+        self.assertEqual(records['steps_record'], self.steps)
+        self.assertEqual(records['steps_record'].steps_count, 8000)
+        self.assertEqual(records['sleep_record'].quality, 'good')
+        self.assertEqual(records['running_record'].distance, 5.5)
+        self.assertEqual(records['training_record'].exercise_type, 'Squat')
+        self.assertEqual(records['training_record'].weight, 100.0)
+        self.assertEqual(records['mood_record'].stress_level, 3)
+        self.assertEqual(records['weight_record'].bmi(), 22.22)
+        self.assertEqual(records['weight_record'].created_at, self.weight.created_at)
+        self.assertIsNone(records['diet_record'])
+    
+    def test_dashboard_query_count(self):
+        """Test the dashboard view needs at most two queries"""
+        from django.test import RequestFactory
+        from .views import dashboard
+        
+        request = RequestFactory().get(reverse('dashboard'))
+        request.user = self.user
+        with self.assertNumQueries(2):
+            response = dashboard(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '8000')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  DEBUG=True)
+class RecordHistoryViewTestCase(TestCase):
+    """Test cases for the declarative history pages"""
+    
+    def setUp(self):
+        """Set up one record of every type"""
+        from django.core.cache import cache
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='historyuser',
+            email='history@example.com',
+            password='testpass123'
+        )
+        self.client = Client()
+        self.client.login(username='historyuser', password='testpass123')
+        today = timezone.now().date()
+        StepsRecord.objects.create(user=self.user, date=today, steps_count=5000)
+        SleepRecord.objects.create(user=self.user, date=today, hours=8, minutes=0, quality='good')
+        DietRecord.objects.create(user=self.user, date=today, calories=2000, protein=100)
+        RunningRecord.objects.create(user=self.user, date=today, distance=5.0, duration_minutes=25)
+        TrainingRecord.objects.create(user=self.user, date=today, exercise_type='Squat', duration_minutes=40)
+        MoodRecord.objects.create(user=self.user, date=today, mood='good', stress_level=2)
+        WeightRecord.objects.create(user=self.user, date=today, weight=70.0, height=175.0)
+    
+    def test_every_page_declares_its_context(self):
+        """Test every history page renders its declared metrics and chart series"""
+        from .views import HISTORY_VIEWS
+        
+        for name, view_class in HISTORY_VIEWS.items():
+            with self.subTest(record_type=name):
+                response = self.client.get(reverse(f'{name}_history'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['record_count'], 1)
+                self.assertEqual(len(response.context[view_class.records_context_name]), 1)
+                for metric in view_class.metrics:
+                    self.assertIn(metric, response.context)
+                for series in view_class.chart_series if view_class.chart else []:
+                    self.assertIn(series, response.context)
+                self.assertEqual('chart_dates' in response.context, view_class.chart is not None)
+    
+    def test_invalid_filter_ignored(self):
+        """Test invalid date filters are ignored like before"""
+        response = self.client.get(reverse('steps_history'), {'date_from': 'not-a-date'})
+        self.assertEqual(response.context['record_count'], 1)
+        self.assertEqual(json.loads(response.context['chart_data']), [5000])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  DEBUG=True)
+class HealthExportTestCase(TestCase):
+    """Test cases for the streaming CSV export"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = get_user_model().objects.create_user(
+            username='exportuser',
+            email='export@example.com',
+            password='testpass123'
+        )
+        self.client = Client()
+        self.client.login(username='exportuser', password='testpass123')
+        self.today = timezone.now().date()
+        for i in range(5):
+            StepsRecord.objects.create(user=self.user, date=self.today - timedelta(days=i), steps_count=1000 + i)
+        DietRecord.objects.create(user=self.user, date=self.today, calories=2000, protein=0, notes='line one\nline two')
+        WeightRecord.objects.create(user=self.user, date=self.today, weight=72.0, height=180.0)
+    
+    def read_export(self):
+        """Download the export and return its rows"""
+        import csv
+        
+        response = self.client.get(reverse('export_health_data'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode()
+        return list(csv.reader(content.splitlines()))
+    
+    def test_export_sections(self):
+        """Test every section is exported oldest first with the expected formatting"""
+        rows = self.read_export()
+        self.assertEqual(rows[0], ['WellLog Health Data Export'])
+        self.assertEqual(rows[1], ['User: exportuser'])
+        
+        steps = rows.index(['STEPS RECORDS'])
+        self.assertEqual(rows[steps + 1], ['Date', 'Steps Count', 'Created At'])
+        self.assertEqual([row[1] for row in rows[steps + 2:steps + 7]], ['1004', '1003', '1002', '1001', '1000'])
+        self.assertEqual(rows[steps + 7], [])
+        
+        diet = rows[rows.index(['DIET RECORDS']) + 2]
+        self.assertEqual(diet[1:6], ['2000', '', '', '', 'line one line two'])
+        weight = rows[rows.index(['WEIGHT RECORDS']) + 2]
+        self.assertEqual(weight[1:4], ['72.0', '180.0', '22.22'])
+        self.assertEqual(rows[-1], weight)
+        
+        for title in ['SLEEP RECORDS', 'RUNNING RECORDS', 'TRAINING RECORDS', 'MOOD RECORDS']:
+            self.assertIn([title], rows)
+    
+    def test_small_chunks_and_blocks(self):
+        """Test rows spanning several fetches and output blocks are all written once"""
+        from .export import iter_export_rows, stream_csv
+        
+        blocks = list(stream_csv(iter_export_rows(self.user, chunk_size=2), block_size=10))
+        self.assertGreater(len(blocks), 1)
+        self.assertEqual(blocks[0], 'WellLog Health Data Export\r\n')
+        self.assertEqual(''.join(blocks).count('\r\n'), len(list(iter_export_rows(self.user))))
+    
+    def test_gzip_export(self):
+        """Test the gzip export decompresses to the CSV export"""
+        import gzip
+        
+        response = self.client.get(reverse('export_health_data'), {'format': 'csv.gz'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz"', response['Content-Disposition'])
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertTrue(content.startswith('WellLog Health Data Export\r\n'))
+        self.assertIn('STEPS RECORDS', content)
+        self.assertIn('22.22', content)
+    
+    def test_zip_export(self):
+        """Test the ZIP export has one CSV per record type"""
+        import io
+        import zipfile
+        
+        response = self.client.get(reverse('export_health_data'), {'format': 'zip'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), [
+            'steps.csv', 'sleep.csv', 'diet.csv', 'running.csv', 'training.csv', 'mood.csv', 'weight.csv'
+        ])
+        steps = archive.read('steps.csv').decode().splitlines()
+        self.assertEqual(steps[0], 'Date,Steps Count,Created At')
+        self.assertEqual(len(steps), 6)
+        self.assertEqual(archive.read('sleep.csv').decode().splitlines(), ['Date,Hours,Minutes,Quality,Created At'])
+    
+    def test_ndjson_export(self):
+        """Test the NDJSON export writes one typed object per record"""
+        response = self.client.get(reverse('export_health_data'), {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), 7)
+        self.assertEqual(records[0]['type'], 'steps')
+        self.assertEqual(records[0]['steps_count'], 1004)
+        diet = next(record for record in records if record['type'] == 'diet')
+        self.assertIsNone(diet['carbs'])
+        self.assertEqual(diet['date'], self.today.isoformat())
+        weight = records[-1]
+        self.assertEqual((weight['type'], weight['bmi']), ('weight', 22.22))
+    
+    def test_unknown_format(self):
+        """Test unknown export formats are rejected"""
+        response = self.client.get(reverse('export_health_data'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_delta_export(self):
+        """Test a delta export only contains records changed after the watermark"""
+        url = reverse('export_health_data')
+        full = self.client.get(url, {'format': 'ndjson'})
+        watermark = full['X-Export-Watermark']
+        self.assertEqual(len(b''.join(full.streaming_content).decode().splitlines()), 7)
+        
+        unchanged = self.client.get(url, {'format': 'ndjson', 'since': watermark})
+        self.assertEqual(b''.join(unchanged.streaming_content), b'')
+        self.assertEqual(unchanged['X-Export-Watermark'], watermark)
+        
+        steps = StepsRecord.objects.filter(user=self.user).earliest('date')
+        steps.steps_count = 4321
+        steps.save()
+        MoodRecord.objects.create(user=self.user, date=self.today, mood='good')
+        
+        delta = self.client.get(url, {'format': 'ndjson', 'since': watermark})
+        records = [json.loads(line) for line in b''.join(delta.streaming_content).decode().splitlines()]
+        self.assertEqual([(record['type'], record.get('steps_count')) for record in records],
+                         [('steps', 4321), ('mood', None)])
+        self.assertGreater(delta['X-Export-Watermark'], watermark)
+        
+        csv_delta = self.client.get(url, {'since': watermark})
+        content = b''.join(csv_delta.streaming_content).decode()
+        self.assertIn('4321', content)
+        self.assertNotIn('1003', content)
+    
+    def test_delta_export_invalid_since(self):
+        """Test an unparsable watermark is rejected"""
+        response = self.client.get(reverse('export_health_data'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  HEALTH_IMPORT_ROOT='/tmp/test-imports',
+                  DEBUG=True)
+class HealthImportTestCase(TestCase):
+    """Test cases for the batched CSV import and one-record-per-day rules"""
+    
+    CSV = (
+        "WellLog Health Data Export\n"
+        "User: someone\n"
+        "\n"
+        "STEPS RECORDS\n"
+        "Date,Steps Count,Created At\n"
+        "2025-01-01,5000,2025-01-01 10:00:00\n"
+        "2025-01-02,6000,2025-01-02 10:00:00\n"
+        "2025-01-02,6500,2025-01-02 11:00:00\n"
+        "not-a-date,1,\n"
+        "\n"
+        "TRAINING RECORDS\n"
+        "Date,Exercise Type,Sets,Reps,Weight,Duration Minutes,Calories Burned,Notes,Created At\n"
+        "2025-01-01,Squat,5,5,100,30,,,2025-01-01 10:00:00\n"
+        "2025-01-01,Bench,5,5,80,20,,,2025-01-01 10:30:00\n"
+        "\n"
+        "WEIGHT RECORDS\n"
+        "Date,Weight,Height,BMI,Notes,Created At\n"
+        "2025-01-02,72.0,180.0,22.22,,2025-01-02 08:00:00\n"
+    )
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = get_user_model().objects.create_user(
+            username='importuser',
+            email='import@example.com',
+            password='testpass123'
+        )
+        self.client = Client()
+        self.client.login(username='importuser', password='testpass123')
+    
+    def run_import(self, content):
+        import csv
+        from io import StringIO
+        from .importer import HealthDataImporter
+        
+        return HealthDataImporter(self.user, batch_size=2).run(csv.reader(StringIO(content)))
+    
+    def test_import_upserts_daily_records(self):
+        """Test daily records are upserted on (user, date) and training records appended"""
+        from datetime import date
+        
+        StepsRecord.objects.create(user=self.user, date=date(2025, 1, 1), steps_count=100)
+        counts = self.run_import(self.CSV)
+        
+        self.assertEqual((counts['steps'], counts['training'], counts['weight'], counts['errors']), (3, 2, 1, 1))
+        steps = dict(StepsRecord.objects.filter(user=self.user).values_list('date', 'steps_count'))
+        self.assertEqual(steps, {date(2025, 1, 1): 5000, date(2025, 1, 2): 6500})
+        self.assertEqual(TrainingRecord.objects.filter(user=self.user).count(), 2)
+        
+        # Importing the same file again updates the daily records and appends training again
+        self.run_import(self.CSV)
+        self.assertEqual(StepsRecord.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(TrainingRecord.objects.filter(user=self.user).count(), 4)
+        
+        summary = DailyHealthSummary.objects.get(user=self.user, date=date(2025, 1, 2))
+        self.assertEqual((summary.steps_total, summary.weight_latest), (6500, 72.0))
+    
+    def test_import_query_count(self):
+        """Test a large import needs far fewer queries than it has rows"""
+        from .importer import HealthDataImporter
+        import csv
+        from io import StringIO
+        
+        start = timezone.now().date() - timedelta(days=999)
+        lines = ["STEPS RECORDS", "Date,Steps Count,Created At"]
+        lines += [f"{start + timedelta(days=i)},{1000 + i}," for i in range(1000)]
+        rows = list(csv.reader(StringIO("\n".join(lines))))
+        
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            counts = HealthDataImporter(self.user).run(rows)
+        self.assertEqual(counts['steps'], 1000)
+        # Row-by-row upserts took several queries per row; SQLite's parameter limit splits the batches most
+        self.assertLess(len(queries), 100)
+        self.assertEqual(DailyHealthSummary.objects.filter(user=self.user).count(), 1000)
+    
+    def upload(self, upload):
+        """Post an upload to the import view, run the queued job and return its status JSON"""
+        from .jobs import run_pending_import_jobs
+        
+        response = self.client.post(reverse('import_health_data'), {'csv_file': upload})
+        job = ImportJob.objects.get(user=self.user)
+        self.assertRedirects(response, f"{reverse('dashboard')}?import_job={job.pk}")
+        self.assertEqual(job.status, 'pending')
+        
+        run_pending_import_jobs()
+        return self.client.get(reverse('import_job_status', args=[job.pk])).json()
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False)
+    def test_import_view(self):
+        """Test the import view queues a job whose status reports the imported rows"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        status = self.upload(SimpleUploadedFile('export.csv', self.CSV.encode(), content_type='text/csv'))
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['rows_processed'], 7)
+        self.assertEqual((status['stats']['steps'], status['stats']['errors']), (3, 1))
+        self.assertIn('3 steps records', status['message'])
+        self.assertIn('ignored 1 error records', status['message'])
+        # The uploaded file is removed once the job has finished
+        self.assertFalse(ImportJob.objects.get(pk=status['id']).file)
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False)
+    def test_import_view_gzip_upload(self):
+        """Test a gzip-compressed upload is decompressed while it is parsed"""
+        import gzip
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        upload = SimpleUploadedFile('export.csv.gz', gzip.compress(self.CSV.encode()), content_type='application/gzip')
+        status = self.upload(upload)
+        self.assertIn('3 steps records', status['message'])
+        self.assertEqual(WeightRecord.objects.filter(user=self.user).count(), 1)
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False, FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+    def test_import_view_temporary_file_upload(self):
+        """Test uploads spooled to a temporary file are stored and imported"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        status = self.upload(SimpleUploadedFile('export.csv', self.CSV.encode(), content_type='text/csv'))
+        self.assertIn('1 weight records', status['message'])
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False)
+    def test_import_job_failure(self):
+        """Test an unreadable file fails its job with an error message"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        status = self.upload(SimpleUploadedFile('export.csv.gz', b'\x1f\x8bnot gzip', content_type='application/gzip'))
+        self.assertEqual(status['status'], 'failed')
+        self.assertTrue(status['error'])
+        self.assertIsNone(status['message'])
+        self.assertFalse(ImportJob.objects.get(pk=status['id']).file)
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False)
+    def test_failed_import_job_refreshes_committed_batches(self):
+        """Test the summaries and cached history follow the batches committed before a job failed"""
+        from datetime import date
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .cache import get_history_version
+        
+        version = get_history_version(self.user.pk, StepsRecord)
+        rows = ''.join(f"{date(2020, 1, 1) + timedelta(days=day)},{1000 + day},\n" for day in range(1500))
+        content = f"STEPS RECORDS\nDate,Steps Count,Created At\n{rows}".encode() + b'2025-01-01,\xff\xfe,\n'
+        
+        status = self.upload(SimpleUploadedFile('export.csv', content, content_type='text/csv'))
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(StepsRecord.objects.filter(user=self.user).count(), 1000)
+        self.assertEqual(DailyHealthSummary.objects.filter(user=self.user).count(), 1000)
+        self.assertNotEqual(get_history_version(self.user.pk, StepsRecord), version)
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False, HEALTH_IMPORT_STALE_AFTER=60)
+    def test_stale_running_job_is_failed(self):
+        """Test a running job whose worker stopped is failed when polled or by the next worker"""
+        import os
+        from django.core.files.base import ContentFile
+        from .jobs import claim_import_job
+        
+        StepsRecord.objects.bulk_create([StepsRecord(user=self.user, date=timezone.now().date(), steps_count=500)])
+        lost = ImportJob.objects.create(user=self.user, file=ContentFile(self.CSV.encode(), name='lost.csv'))
+        other = ImportJob.objects.create(user=self.user, file=ContentFile(self.CSV.encode(), name='other.csv'))
+        lost_path = lost.file.path
+        self.assertEqual(claim_import_job(lost.pk).status, 'running')
+        self.assertEqual(claim_import_job(other.pk).status, 'running')
+        
+        # Still sending heartbeats
+        status = self.client.get(reverse('import_job_status', args=[lost.pk])).json()
+        self.assertEqual(status['status'], 'running')
+        
+        long_ago = timezone.now() - timedelta(minutes=5)
+        ImportJob.objects.update(heartbeat_at=long_ago)
+        status = self.client.get(reverse('import_job_status', args=[lost.pk])).json()
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn('interrupted', status['error'])
+        self.assertFalse(ImportJob.objects.get(pk=lost.pk).file)
+        self.assertFalse(os.path.exists(lost_path))
+        # Records written by the lost worker without signals get their summaries
+        self.assertTrue(DailyHealthSummary.objects.filter(user=self.user).exists())
+        
+        self.assertEqual(ImportJob.objects.get(pk=other.pk).status, 'running')
+        self.assertIsNone(claim_import_job())
+        self.assertEqual(ImportJob.objects.get(pk=other.pk).status, 'failed')
+    
+    def test_import_files_are_private(self):
+        """Test uploads are stored outside MEDIA_ROOT, and deleted with a job removed before it ended"""
+        import os
+        from django.core.files.base import ContentFile
+        
+        job = ImportJob.objects.create(user=self.user, file=ContentFile(self.CSV.encode(), name='export.csv'))
+        path = job.file.path
+        self.assertTrue(path.startswith('/tmp/test-imports/health_imports/'))
+        self.assertTrue(os.path.exists(path))
+        
+        job.delete()
+        self.assertFalse(os.path.exists(path))
+    
+    def test_import_job_runs_after_commit_in_process(self):
+        """Test the in-process worker is started once the upload's transaction has committed"""
+        from unittest.mock import patch
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        upload = SimpleUploadedFile('export.csv', self.CSV.encode(), content_type='text/csv')
+        with patch('health.jobs.start_import_thread') as start_thread:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('import_health_data'), {'csv_file': upload})
+        start_thread.assert_called_once_with(ImportJob.objects.get(user=self.user).pk)
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False)
+    def test_import_job_command_and_access(self):
+        """Test run_import_jobs claims pending jobs once and the status is private to the owner"""
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+        from io import StringIO
+        
+        job = ImportJob.objects.create(user=self.user, file=ContentFile(self.CSV.encode(), name='export.csv'))
+        output = StringIO()
+        call_command('run_import_jobs', stdout=output)
+        self.assertIn(f'Import job {job.pk} (importuser): done, 7 rows', output.getvalue())
+        self.assertEqual(StepsRecord.objects.filter(user=self.user).count(), 2)
+        
+        # Finished jobs are not claimed again
+        call_command('run_import_jobs', stdout=StringIO())
+        self.assertEqual(TrainingRecord.objects.filter(user=self.user).count(), 2)
+        
+        other = get_user_model().objects.create_user(username='other', email='other@example.com', password='testpass123')
+        self.client.force_login(other)
+        response = self.client.get(reverse('import_job_status', args=[job.pk]))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_parallel_import_matches_sequential(self):
+        """Test parsing byte ranges in a process pool imports exactly what the sequential import does"""
+        import os
+        import tempfile
+        from .importer import HealthDataImporter
+        from .parsing import plan_ranges
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export.csv')
+            with open(path, 'w', newline='') as file:
+                file.write(self.CSV)
+            
+            # Small ranges, so sections are split on line boundaries
+            ranges = plan_ranges(path, chunk_size=40)
+            self.assertGreater(len(ranges), 3)
+            with open(path, 'rb') as file:
+                data = file.read()
+            for _, start, end in ranges:
+                self.assertEqual(data[end - 1:end], b'\n')
+            
+            counts = HealthDataImporter(self.user, batch_size=2).run_parallel(path, workers=2, chunk_size=40)
+        
+        self.assertEqual(counts, self.run_import(self.CSV))
+        steps = StepsRecord.objects.filter(user=self.user).order_by('date').values_list('steps_count', flat=True)
+        self.assertEqual(list(steps), [5000, 6500])
+        self.assertEqual(TrainingRecord.objects.filter(user=self.user).count(), 4)
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False, HEALTH_IMPORT_PARALLEL_WORKERS=2,
+                       HEALTH_IMPORT_PARALLEL_MIN_SIZE=0)
+    def test_import_job_parallel(self):
+        """Test large plain files are parsed in parallel by import jobs, gzip files sequentially"""
+        import gzip
+        from unittest.mock import patch
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .importer import HealthDataImporter
+        
+        with patch.object(HealthDataImporter, 'run_parallel', autospec=True,
+                          side_effect=HealthDataImporter.run_parallel) as run_parallel:
+            status = self.upload(SimpleUploadedFile('export.csv', self.CSV.encode(), content_type='text/csv'))
+            self.assertEqual(run_parallel.call_count, 1)
+            self.assertIn('3 steps records', status['message'])
+            
+            ImportJob.objects.all().delete()
+            upload = SimpleUploadedFile('export.csv.gz', gzip.compress(self.CSV.encode()), content_type='application/gzip')
+            status = self.upload(upload)
+            self.assertEqual(run_parallel.call_count, 1)
+            self.assertEqual(status['status'], 'done')
+    
+    def test_validate_import_report(self):
+        """Test the dry run reports counts, existing and repeated days and invalid cells without writing"""
+        import csv
+        from datetime import date
+        from io import StringIO
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .importer import validate_import
+        
+        StepsRecord.objects.create(user=self.user, date=date(2025, 1, 2), steps_count=100)
+        content = self.CSV + "2025-01-03,heavy,180.0,,,\n2025-01-04,,,,,\n"
+        with CaptureQueriesContext(connection) as queries:
+            report = validate_import(self.user, csv.reader(StringIO(content)), max_errors=1)
+        
+        # One lookup per section with valid rows, and nothing written
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(StepsRecord.objects.filter(user=self.user).count(), 1)
+        self.assertEqual((report['rows'], report['valid'], report['invalid']), (9, 6, 3))
+        self.assertEqual(report['sections']['steps'],
+                         {'rows': 4, 'valid': 3, 'invalid': 1, 'existing': 2, 'duplicates': 1})
+        self.assertEqual(report['sections']['training']['duplicates'], 0)
+        self.assertEqual(report['errors']['steps']['Date'][0]['line'], 9)
+        self.assertEqual(report['errors']['steps']['Date'][0]['value'], 'not-a-date')
+        self.assertEqual(report['errors']['weight']['Weight'][0]['value'], 'heavy')
+        # Only the first invalid cell per column is listed
+        self.assertEqual(len(report['errors']['weight']['Weight']), 1)
+        self.assertEqual(report['errors']['weight']['Height'][0]['message'], 'missing value')
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False)
+    def test_import_view_dry_run(self):
+        """Test a dry-run upload stores a validation report and imports nothing"""
+        from .jobs import run_pending_import_jobs
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        
+        upload = SimpleUploadedFile('export.csv', self.CSV.encode(), content_type='text/csv')
+        self.client.post(reverse('import_health_data'), {'csv_file': upload, 'dry_run': '1'})
+        job = run_pending_import_jobs()[0]
+        status = self.client.get(reverse('import_job_status', args=[job.pk])).json()
+        
+        self.assertTrue(status['dry_run'])
+        self.assertEqual(status['stats']['steps'], 3)
+        self.assertEqual(status['report']['invalid'], 1)
+        self.assertIn('nothing was imported', status['message'])
+        self.assertFalse(StepsRecord.objects.filter(user=self.user).exists())
+    
+    def test_add_view_updates_existing_day(self):
+        """Test adding a record for a day that already has one updates it"""
+        today = timezone.now().date()
+        record = StepsRecord.objects.create(user=self.user, date=today, steps_count=1000)
+        
+        response = self.client.post(reverse('steps_add'), {'date': today.strftime('%Y-%m-%d'), 'steps_count': 7000},
+                                    follow=True)
+        self.assertRedirects(response, reverse('steps_history'))
+        record.refresh_from_db()
+        self.assertEqual(record.steps_count, 7000)
+        self.assertEqual(StepsRecord.objects.filter(user=self.user).count(), 1)
+        self.assertContains(response, f'You already had a steps record for {today:%Y-%m-%d}, so it was updated')
+        
+        response = self.client.post(reverse('steps_add'), {
+            'date': (today - timedelta(days=1)).strftime('%Y-%m-%d'), 'steps_count': 3000
+        }, follow=True)
+        self.assertNotContains(response, 'You already had')
+    
+    def test_edit_view_rejects_taken_day(self):
+        """Test moving a record onto a day that already has one shows a form error"""
+        today = timezone.now().date()
+        StepsRecord.objects.create(user=self.user, date=today, steps_count=1000)
+        record = StepsRecord.objects.create(user=self.user, date=today - timedelta(days=1), steps_count=2000)
+        
+        response = self.client.post(reverse('steps_edit', args=[record.pk]),
+                                    {'date': today.strftime('%Y-%m-%d'), 'steps_count': 2000})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('date', response.context['form'].errors)
+        
+        response = self.client.post(reverse('steps_edit', args=[record.pk]),
+                                    {'date': record.date.strftime('%Y-%m-%d'), 'steps_count': 2500})
+        self.assertRedirects(response, reverse('steps_history'))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                  MEDIA_ROOT='/tmp/test-media',
+                  HEALTH_IMPORT_ROOT='/tmp/test-imports',
+                  DEBUG=True)
+class AppleHealthImportTestCase(TestCase):
+    """Test cases for importing Apple Health export.xml files"""
+    
+    EXPORT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE HealthData [
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout)*)>
+<!ATTLIST HealthData locale CDATA #REQUIRED>
+]>
+<HealthData locale="en_GB">
+ <ExportDate value="2025-01-05 20:00:00 +0000"/>
+ <Me HKCharacteristicTypeIdentifierBiologicalSex="HKBiologicalSexNotSet"/>
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" startDate="2025-01-01 08:00:00 +0000" endDate="2025-01-01 08:10:00 +0000" value="1200"/>
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" startDate="2025-01-01 18:00:00 +0000" endDate="2025-01-01 18:30:00 +0000" value="3000"/>
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="Watch" unit="count" startDate="2025-01-01 08:00:00 +0000" endDate="2025-01-01 08:10:00 +0000" value="5000">
+  <MetadataEntry key="HKWasUserEntered" value="0"/>
+ </Record>
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" startDate="2025-01-02 09:00:00 +0000" endDate="2025-01-02 09:10:00 +0000" value="800"/>
+ <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="Watch" startDate="2025-01-01 23:00:00 +0000" endDate="2025-01-02 03:00:00 +0000" value="HKCategoryValueSleepAnalysisAsleepCore"/>
+ <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="Watch" startDate="2025-01-02 03:00:00 +0000" endDate="2025-01-02 03:20:00 +0000" value="HKCategoryValueSleepAnalysisAwake"/>
+ <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="Watch" startDate="2025-01-02 03:20:00 +0000" endDate="2025-01-02 06:50:00 +0000" value="HKCategoryValueSleepAnalysisAsleepREM"/>
+ <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="iPhone" startDate="2025-01-01 22:30:00 +0000" endDate="2025-01-02 07:00:00 +0000" value="HKCategoryValueSleepAnalysisInBed"/>
+ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="lb" startDate="2025-01-02 07:00:00 +0000" endDate="2025-01-02 07:00:00 +0000" value="170"/>
+ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="kg" startDate="2025-01-02 21:00:00 +0000" endDate="2025-01-02 21:00:00 +0000" value="77.5"/>
+ <Record type="HKQuantityTypeIdentifierHeight" sourceName="iPhone" unit="m" startDate="2024-06-01 10:00:00 +0000" endDate="2024-06-01 10:00:00 +0000" value="1.8"/>
+ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="stone" startDate="2025-01-03 07:00:00 +0000" endDate="2025-01-03 07:00:00 +0000" value="12"/>
+ <Correlation type="HKCorrelationTypeIdentifierFood" startDate="2025-01-02 12:00:00 +0000" endDate="2025-01-02 12:00:00 +0000">
+  <Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" startDate="2025-01-02 12:00:00 +0000" endDate="2025-01-02 12:00:00 +0000" value="99999"/>
+ </Correlation>
+ <Workout workoutActivityType="HKWorkoutActivityTypeRunning" duration="30" durationUnit="min" totalDistance="5" totalDistanceUnit="km" totalEnergyBurned="300" totalEnergyBurnedUnit="kcal" sourceName="Watch" startDate="2025-01-01 07:00:00 +0000" endDate="2025-01-01 07:30:00 +0000"/>
+ <Workout workoutActivityType="HKWorkoutActivityTypeRunning" duration="20" durationUnit="min" sourceName="Watch" startDate="2025-01-01 19:00:00 +0000" endDate="2025-01-01 19:20:00 +0000">
+  <WorkoutStatistics type="HKQuantityTypeIdentifierDistanceWalkingRunning" startDate="2025-01-01 19:00:00 +0000" endDate="2025-01-01 19:20:00 +0000" sum="2" unit="mi"/>
+  <WorkoutStatistics type="HKQuantityTypeIdentifierActiveEnergyBurned" startDate="2025-01-01 19:00:00 +0000" endDate="2025-01-01 19:20:00 +0000" sum="200" unit="kcal"/>
+ </Workout>
+ <Workout workoutActivityType="HKWorkoutActivityTypeTraditionalStrengthTraining" duration="45" durationUnit="min" sourceName="Watch" startDate="2025-01-02 18:00:00 +0000" endDate="2025-01-02 18:45:00 +0000">
+  <WorkoutStatistics type="HKQuantityTypeIdentifierActiveEnergyBurned" startDate="2025-01-02 18:00:00 +0000" endDate="2025-01-02 18:45:00 +0000" sum="1046" unit="kJ"/>
+ </Workout>
+</HealthData>
+"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = get_user_model().objects.create_user(
+            username='appleuser',
+            email='apple@example.com',
+            password='testpass123'
+        )
+        self.client = Client()
+        self.client.login(username='appleuser', password='testpass123')
+    
+    def run_import(self):
+        from io import BytesIO
+        from .apple_health import AppleHealthImporter
+        
+        return AppleHealthImporter(self.user).run(BytesIO(self.EXPORT_XML.encode()))
+    
+    def test_import_aggregates_per_day(self):
+        """Test samples are aggregated into daily records, workouts into running and training records"""
+        from datetime import date
+        
+        counts = self.run_import()
+        self.assertEqual((counts['steps'], counts['sleep'], counts['running'], counts['training'], counts['weight']),
+                         (2, 1, 1, 1, 1))
+        # The unsupported 'stone' unit
+        self.assertEqual(counts['errors'], 1)
+        
+        # The watch counted more steps than the phone on Jan 1; correlation samples are skipped
+        steps = dict(StepsRecord.objects.filter(user=self.user).values_list('date', 'steps_count'))
+        self.assertEqual(steps, {date(2025, 1, 1): 5000, date(2025, 1, 2): 800})
+        
+        # 4h + 3h30 asleep, the awake and in-bed samples are ignored
+        sleep = SleepRecord.objects.get(user=self.user)
+        self.assertEqual((sleep.date, sleep.hours, sleep.minutes), (date(2025, 1, 2), 7, 30))
+        
+        running = RunningRecord.objects.get(user=self.user)
+        self.assertEqual((running.distance, running.duration_minutes, running.calories_burned), (8.22, 50, 500))
+        
+        training = TrainingRecord.objects.get(user=self.user)
+        self.assertEqual((training.exercise_type, training.duration_minutes, training.calories_burned),
+                         ('Traditional Strength Training', 45, 250))
+        
+        weight = WeightRecord.objects.get(user=self.user)
+        self.assertEqual((weight.date, weight.weight, weight.height), (date(2025, 1, 2), 77.5, 180.0))
+        
+        self.assertEqual(DailyHealthSummary.objects.get(user=self.user, date=date(2025, 1, 1)).steps_total, 5000)
+    
+    def test_reimport_does_not_duplicate(self):
+        """Test importing the same export again updates the days and skips known workouts"""
+        self.run_import()
+        counts = self.run_import()
+        self.assertEqual(counts['training'], 0)
+        self.assertEqual(TrainingRecord.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(StepsRecord.objects.filter(user=self.user).count(), 2)
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False)
+    def test_import_view_zip_export(self):
+        """Test the Health app's export.zip is imported by a job, and can be dry-run first"""
+        import zipfile
+        from io import BytesIO
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .jobs import run_pending_import_jobs
+        
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED) as export:
+            export.writestr('apple_health_export/export_cda.xml', '<ClinicalDocument/>')
+            export.writestr('apple_health_export/export.xml', self.EXPORT_XML)
+        
+        for dry_run in ['1', '']:
+            upload = SimpleUploadedFile('export.zip', archive.getvalue(), content_type='application/zip')
+            self.client.post(reverse('import_health_data'), {'csv_file': upload, 'dry_run': dry_run})
+            job = run_pending_import_jobs()[0]
+            status = self.client.get(reverse('import_job_status', args=[job.pk])).json()
+            self.assertEqual(status['status'], 'done')
+            self.assertEqual(status['stats']['steps'], 2)
+            if dry_run:
+                self.assertEqual(status['report']['sections']['running']['existing'], 0)
+                self.assertFalse(StepsRecord.objects.filter(user=self.user).exists())
+        
+        self.assertEqual(RunningRecord.objects.filter(user=self.user).count(), 1)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage', MEDIA_ROOT='/tmp/test-media',
+                   HEALTH_IMPORT_ROOT='/tmp/test-imports', DEBUG=True)
+class TrackImportTestCase(TestCase):
+    """Test cases for importing GPX and TCX run files"""
+    
+    # Two segments 0.01 degrees of latitude (1.112 km) long each, with a 20 minute pause between them
+    GPX = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="Watch" xmlns="http://www.topografix.com/GPX/1/1">
+ <trk><name>Morning Run</name>
+  <trkseg>
+   <trkpt lat="51.500" lon="-0.120"><ele>10</ele><time>2025-03-01T07:00:00Z</time></trkpt>
+   <trkpt lat="51.505" lon="-0.120"><time>2025-03-01T07:03:00Z</time></trkpt>
+   <trkpt lat="51.510" lon="-0.120"><time>2025-03-01T07:06:00Z</time></trkpt>
+  </trkseg>
+  <trkseg>
+   <trkpt lat="51.600" lon="-0.120"><time>2025-03-01T07:26:00Z</time></trkpt>
+   <trkpt lat="51.610" lon="-0.120"><time>2025-03-01T07:32:00Z</time></trkpt>
+  </trkseg>
+ </trk>
+</gpx>
+"""
+    
+    # Evening run on the same day; the heart-rate-only point has no position
+    TCX = """<?xml version="1.0" encoding="UTF-8"?>
+<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">
+ <Activities><Activity Sport="Running"><Id>2025-03-01T18:00:00Z</Id>
+  <Lap StartTime="2025-03-01T18:00:00Z">
+   <TotalTimeSeconds>600</TotalTimeSeconds><DistanceMeters>2000</DistanceMeters><Calories>150</Calories>
+   <Track>
+    <Trackpoint><Time>2025-03-01T18:00:00Z</Time><Position><LatitudeDegrees>0.0</LatitudeDegrees><LongitudeDegrees>0.0</LongitudeDegrees></Position></Trackpoint>
+    <Trackpoint><Time>2025-03-01T18:05:00Z</Time><HeartRateBpm><Value>150</Value></HeartRateBpm></Trackpoint>
+    <Trackpoint><Time>2025-03-01T18:10:00Z</Time><Position><LatitudeDegrees>0.0</LatitudeDegrees><LongitudeDegrees>0.02</LongitudeDegrees></Position></Trackpoint>
+   </Track>
+  </Lap>
+ </Activity></Activities>
+</TrainingCenterDatabase>
+"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = get_user_model().objects.create_user(
+            username='trackuser',
+            email='track@example.com',
+            password='testpass123'
+        )
+        self.client = Client()
+        self.client.login(username='trackuser', password='testpass123')
+    
+    def test_read_gpx_segments(self):
+        """Test distance and duration leave out the pause between segments"""
+        from io import BytesIO
+        from .tracks import read_gpx_or_tcx
+        
+        track = read_gpx_or_tcx(BytesIO(self.GPX.encode()))
+        self.assertEqual(len(track), 5)
+        self.assertAlmostEqual(track.distance_km(), 2 * 1.112, places=2)
+        self.assertEqual(track.duration_minutes(), 12)
+    
+    def test_read_fractional_utc_times(self):
+        """Test times with fractional seconds and a 'Z' suffix, as watches write them, are read as UTC"""
+        from datetime import datetime, timezone as dt_timezone
+        from io import BytesIO
+        from .tracks import read_gpx_or_tcx
+        
+        gpx = self.GPX.replace('07:00:00Z', '07:00:00.250Z').replace('07:32:00Z', '07:32:00.750+00:00')
+        track = read_gpx_or_tcx(BytesIO(gpx.encode()))
+        self.assertEqual(track.start(), datetime(2025, 3, 1, 7, 0, 0, 250000, tzinfo=dt_timezone.utc).timestamp())
+        self.assertAlmostEqual(track.duration_minutes(), 12 + 0.5 / 60)
+    
+    def test_runs_on_one_day_are_added_up(self):
+        """Test a GPX and a TCX run on the same day become one running record, replacing the stored one"""
+        from datetime import date
+        from io import BytesIO
+        from .tracks import TrackImporter
+        
+        RunningRecord.objects.create(user=self.user, date=date(2025, 3, 1), distance=1, duration_minutes=5)
+        tracks = TrackImporter(self.user)
+        tracks.add_file('morning.gpx', BytesIO(self.GPX.encode()))
+        tracks.add_file('evening.tcx', BytesIO(self.TCX.encode()))
+        tracks.add_file('broken.gpx', BytesIO(b'<gpx><trk>'))
+        counts = tracks.run()
+        self.assertEqual((counts['running'], counts['errors']), (1, 1))
+        
+        running = RunningRecord.objects.get(user=self.user)
+        # 2.22 km + 2.22 km (0.02 degrees of longitude on the equator)
+        self.assertEqual((running.date, running.distance, running.duration_minutes, running.calories_burned),
+                         (date(2025, 3, 1), 4.45, 22, 150))
+    
+    def test_dry_run_report_counts_existing_days(self):
+        """Test the dry-run report counts one row per day, and the days that already have a running record"""
+        from datetime import date
+        from io import BytesIO
+        from .tracks import TrackImporter
+        
+        RunningRecord.objects.create(user=self.user, date=date(2025, 3, 1), distance=1, duration_minutes=5)
+        tracks = TrackImporter(self.user)
+        tracks.add_file('morning.gpx', BytesIO(self.GPX.encode()))
+        tracks.add_file('evening.tcx', BytesIO(self.TCX.encode()))
+        tracks.add_file('next_day.gpx', BytesIO(self.GPX.replace('2025-03-01', '2025-03-02').encode()))
+        report = tracks.report()
+        self.assertEqual((report['rows'], report['valid']), (3, 3))
+        self.assertEqual(report['sections']['running'],
+                         {'rows': 2, 'valid': 2, 'invalid': 0, 'existing': 1, 'duplicates': 0})
+        self.assertEqual(RunningRecord.objects.filter(user=self.user).count(), 1)
+    
+    @override_settings(HEALTH_IMPORT_IN_PROCESS=False)
+    def test_import_view_several_files(self):
+        """Test several run files uploaded together are imported as one job"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .jobs import run_pending_import_jobs
+        
+        second_day = self.GPX.replace('2025-03-01', '2025-03-02')
+        uploads = [
+            SimpleUploadedFile('run.gpx', self.GPX.encode()),
+            SimpleUploadedFile('run.gpx', second_day.encode()),
+            SimpleUploadedFile('evening.tcx', self.TCX.encode()),
+        ]
+        self.client.post(reverse('import_health_data'), {'csv_file': uploads})
+        job = run_pending_import_jobs()[0]
+        status = self.client.get(reverse('import_job_status', args=[job.pk])).json()
+        self.assertEqual((status['status'], status['rows_processed'], status['stats']['running']), ('done', 3, 2))
+        self.assertEqual(RunningRecord.objects.filter(user=self.user).count(), 2)
+        
+        # Other files cannot be mixed in
+        uploads = [SimpleUploadedFile('run.gpx', self.GPX.encode()), SimpleUploadedFile('data.csv', b'')]
+        response = self.client.post(reverse('import_health_data'), {'csv_file': uploads}, follow=True)
+        self.assertIn('Only GPX or TCX run files can be uploaded together',
+                      [str(message) for message in response.context['messages']])
+
+
+class DuplicateDaysMigrationTestCase(TransactionTestCase):
+    """Test cases for merging the same-day records stored before the one-per-day constraints"""
+    
+    def setUp(self):
+        """Go back to the schema before the constraints"""
+        from django.db import connection
+        from django.db.migrations.executor import MigrationExecutor
+        
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate([('health', '0007_healthrecord_updated_indexes')])
+        self.executor.loader.build_graph()
+        self.user = get_user_model().objects.create_user(
+            username='dupuser', email='dup@example.com', password='testpass123'
+        )
+        self.today = timezone.now().date()
+    
+    def tearDown(self):
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+    
+    def old_model(self, name):
+        return self.executor.loader.project_state(('health', '0007_healthrecord_updated_indexes')).apps.get_model(
+            'health', name
+        )
+    
+    def migrate_forward(self):
+        self.executor.migrate([('health', '0008_daily_record_unique_day')])
+    
+    def test_additive_records_are_merged(self):
+        """Test same-day steps and runs are added up into the latest record, keeping every note"""
+        steps = self.old_model('StepsRecord')
+        diet = self.old_model('DietRecord')
+        steps.objects.create(user_id=self.user.pk, date=self.today, steps_count=3000)
+        latest = steps.objects.create(user_id=self.user.pk, date=self.today, steps_count=4000)
+        steps.objects.create(user_id=self.user.pk, date=self.today - timedelta(days=1), steps_count=500)
+        diet.objects.create(user_id=self.user.pk, date=self.today, calories=600, protein=30, notes='Lunch')
+        diet.objects.create(user_id=self.user.pk, date=self.today, calories=900, protein=None, notes='Dinner')
+        
+        self.migrate_forward()
+        
+        self.assertEqual(list(StepsRecord.objects.filter(user=self.user, date=self.today).values_list('id', 'steps_count')),
+                         [(latest.pk, 7000)])
+        self.assertEqual(StepsRecord.objects.filter(user=self.user).count(), 2)
+        meal = DietRecord.objects.get(user=self.user, date=self.today)
+        self.assertEqual((meal.calories, meal.protein, meal.notes), (1500, 30, 'Lunch\nDinner'))
+    
+    def test_readings_stop_the_migration(self):
+        """Test same-day weights stop the migration until exported and merged by the command"""
+        import os
+        import tempfile
+        from django.core.management import call_command, CommandError
+        from io import StringIO
+        
+        weight = self.old_model('WeightRecord')
+        weight.objects.create(user_id=self.user.pk, date=self.today, weight=80.0, height=180.0)
+        weight.objects.create(user_id=self.user.pk, date=self.today, weight=79.5, height=180.0)
+        
+        with self.assertRaisesMessage(CommandError, 'merge_duplicate_days --export'):
+            self.migrate_forward()
+        self.assertEqual(weight.objects.filter(user_id=self.user.pk).count(), 2)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'duplicates.csv')
+            call_command('merge_duplicate_days', export=path, stdout=StringIO())
+            with open(path) as file:
+                exported = file.read()
+        self.assertIn('WeightRecord', exported)
+        self.assertIn('80.0', exported)
+        self.assertEqual(list(weight.objects.filter(user_id=self.user.pk).values_list('weight', flat=True)), [79.5])
+        
+        self.executor.loader.build_graph()
+        self.migrate_forward()
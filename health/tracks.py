@@ -0,0 +1,262 @@
+"""Import of GPS run files (GPX and TCX) as running records.
+
+Track points are read with defusedxml's ``iterparse``: each point's
+coordinates and timestamp are appended to compact ``array`` buffers and the
+element is cleared, so a file is never held as a tree. Distance and moving
+time are then computed over the whole coordinate arrays at once with numpy
+(haversine between consecutive points), not with per-point Python math.
+
+Segments (GPX ``trkseg``, TCX ``Track``) are measured separately, so the
+gap while a watch was paused counts neither as distance nor as time. A
+whole season can be uploaded at once, as several files or as a ZIP of
+them; runs on the same day are added up into that day's ``RunningRecord``,
+which replaces the one already stored for the day, as in every import.
+"""
+import os
+import tempfile
+import zipfile
+from array import array
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from defusedxml.ElementTree import iterparse
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .importer import HealthDataImporter, count_existing_days
+
+TRACK_SUFFIXES = ('.gpx', '.tcx')
+# Bundles of uploaded files up to this size are packed in memory
+TRACK_BUNDLE_MEMORY = 10 * 1024 * 1024
+# Mean Earth radius
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _local_name(tag):
+    """Tag without its XML namespace (GPX 1.0/1.1 and TCX use different ones)"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _epoch(value):
+    # parse_datetime, since datetime.fromisoformat only reads the usual trailing 'Z' from Python 3.11
+    moment = parse_datetime(value.strip())
+    if moment is None:
+        raise ValueError(f'invalid time {value!r}')
+    # GPX and TCX times are UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment.timestamp()
+
+
+def is_track_file(name):
+    return name.lower().endswith(TRACK_SUFFIXES)
+
+
+def is_track_archive(file):
+    """Whether a ZIP archive holds GPX or TCX files and is not an Apple Health export (which has routes too)"""
+    file.seek(0)
+    with zipfile.ZipFile(file) as archive:
+        names = [name.rsplit('/', 1)[-1] for name in archive.namelist()]
+    file.seek(0)
+    return 'export.xml' not in names and any(is_track_file(name) for name in names)
+
+
+def bundle_tracks(uploaded_files):
+    """Pack several uploaded GPX/TCX files into one ZIP archive, stored as a single import job file"""
+    bundle = tempfile.SpooledTemporaryFile(max_size=TRACK_BUNDLE_MEMORY)
+    with zipfile.ZipFile(bundle, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, uploaded_file in enumerate(uploaded_files):
+            # Prefixed, since a season of files from one watch may repeat names
+            with archive.open(f'{index:04d}-{os.path.basename(uploaded_file.name)}', 'w') as member:
+                for chunk in uploaded_file.chunks():
+                    member.write(chunk)
+    bundle.seek(0)
+    return File(bundle, name='tracks.zip')
+
+
+class Track:
+    """Coordinates (degrees), timestamps (epoch seconds, NaN if missing) and segment starts of one file"""
+
+    def __init__(self):
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self.times = array('d')
+        # Index of the first point of every segment after the first
+        self.breaks = []
+        self.calories = None
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def add_point(self, latitude, longitude, time):
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+        self.times.append(time)
+
+    def start_segment(self):
+        if len(self) and (not self.breaks or self.breaks[-1] != len(self)):
+            self.breaks.append(len(self))
+
+    def segment_mask(self):
+        """True for every pair of consecutive points within one segment"""
+        within = np.ones(max(len(self) - 1, 0), dtype=bool)
+        within[[index - 1 for index in self.breaks if 0 < index < len(self)]] = False
+        return within
+
+    def distance_km(self):
+        """Length of the track along the Earth's surface (haversine)"""
+        if len(self) < 2:
+            return 0.0
+        latitudes = np.radians(np.frombuffer(self.latitudes, dtype=np.float64))
+        longitudes = np.radians(np.frombuffer(self.longitudes, dtype=np.float64))
+        half_dlat = np.diff(latitudes) / 2
+        half_dlon = np.diff(longitudes) / 2
+        a = np.sin(half_dlat) ** 2 + np.cos(latitudes[:-1]) * np.cos(latitudes[1:]) * np.sin(half_dlon) ** 2
+        segments = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+        return float(segments[self.segment_mask()].sum())
+
+    def duration_minutes(self):
+        """Time spent within segments (pauses between segments are left out)"""
+        if len(self) < 2:
+            return 0.0
+        steps = np.diff(np.frombuffer(self.times, dtype=np.float64))[self.segment_mask()]
+        return float(np.nansum(np.clip(steps, 0, None)) / 60)
+
+    def start(self):
+        """Timestamp of the first timed point, or None"""
+        times = np.frombuffer(self.times, dtype=np.float64)
+        timed = times[~np.isnan(times)]
+        return float(timed[0]) if timed.size else None
+
+
+def read_gpx_or_tcx(file):
+    """Stream the track points of a GPX or TCX file into a ``Track``"""
+    track = Track()
+    point = None
+    for event, element in iterparse(file, events=('start', 'end')):
+        name = _local_name(element.tag)
+        if event == 'start':
+            if name in ('trkseg', 'Track'):
+                track.start_segment()
+            elif name in ('trkpt', 'Trackpoint'):
+                point = {'lat': element.get('lat'), 'lon': element.get('lon')}
+            continue
+
+        if point is not None:
+            if name in ('time', 'Time'):
+                point['time'] = element.text
+            elif name == 'LatitudeDegrees':
+                point['lat'] = element.text
+            elif name == 'LongitudeDegrees':
+                point['lon'] = element.text
+            elif name in ('trkpt', 'Trackpoint'):
+                # TCX points without a position (e.g. heart rate only) carry no distance
+                if point['lat'] is not None and point['lon'] is not None:
+                    time = _epoch(point['time']) if point.get('time') else float('nan')
+                    track.add_point(float(point['lat']), float(point['lon']), time)
+                point = None
+                element.clear()
+        elif name == 'Calories' and element.text:
+            # TCX laps carry the device's energy estimate
+            track.calories = (track.calories or 0) + int(float(element.text))
+        elif name in ('trkseg', 'Track', 'Lap', 'trk', 'Activity'):
+            element.clear()
+    return track
+
+
+class TrackImporter:
+    """Turn GPX/TCX files into one running record per day and import them for one user
+
+    Usage::
+
+        tracks = TrackImporter(user)
+        for name, file in uploads:
+            tracks.add_upload(name, file)
+        counts = tracks.run()
+    """
+
+    def __init__(self, user, importer=None):
+        self.user = user
+        self.importer = importer or HealthDataImporter(user)
+        self.files = 0
+        self.errors = 0
+        self.days = defaultdict(lambda: [0.0, 0.0, None])  # date -> [kilometers, minutes, kilocalories or None]
+
+    def add_file(self, name, file):
+        """Read one file and add its run to its day; unreadable files are counted as errors"""
+        self.files += 1
+        try:
+            track = read_gpx_or_tcx(file)
+            start = track.start()
+            if len(track) < 2 or start is None:
+                raise ValueError('no timed track points')
+        except (ValueError, SyntaxError, OSError) as e:
+            # SyntaxError covers XML parse errors, OSError broken compressed members
+            self.errors += 1
+            print(f"Error importing track {name}, Error: {e}")
+        else:
+            day = timezone.localtime(datetime.fromtimestamp(start, tz=dt_timezone.utc)).date()
+            totals = self.days[day]
+            totals[0] += track.distance_km()
+            totals[1] += track.duration_minutes()
+            if track.calories is not None:
+                totals[2] = (totals[2] or 0) + track.calories
+        self.report_progress()
+
+    def report_progress(self):
+        if self.importer.progress is not None:
+            self.importer.progress(self.files, dict(self.importer.counts, errors=self.errors))
+
+    def add_upload(self, name, file):
+        """Read an uploaded GPX/TCX file, or a ZIP archive of them"""
+        if name.lower().endswith('.zip'):
+            self.add_zip(file)
+        else:
+            self.add_file(name, file)
+
+    def add_zip(self, file):
+        """Read every GPX/TCX file of a ZIP archive, one member at a time"""
+        with zipfile.ZipFile(file) as archive:
+            for name in archive.namelist():
+                if is_track_file(name):
+                    with archive.open(name) as member:
+                        self.add_file(name, member)
+
+    def records(self):
+        """Yield ('running', values) per day, ready for HealthDataImporter.add_values"""
+        for day, (kilometers, minutes, kilocalories) in sorted(self.days.items()):
+            yield 'running', {
+                'date': day,
+                'distance': round(kilometers, 2),
+                'duration_minutes': round(minutes),
+                'calories_burned': kilocalories,
+            }
+
+    def run(self, atomic=True):
+        """Write the collected runs; return the number of written records per section plus 'errors'"""
+        with transaction.atomic() if atomic else nullcontext():
+            self.importer.rows_processed = self.files
+            self.importer.counts['errors'] += self.errors
+            for section, values in self.records():
+                self.importer.add_values(section, values)
+            self.importer.finish()
+        return self.importer.counts
+
+    def report(self):
+        """Dry-run report in the shape of ``validate_import``: files read, and the running records"""
+        # One running record per day, whatever the number of files
+        days = Counter(dict.fromkeys(self.days, 1))
+        return {
+            'rows': self.files,
+            'valid': self.files - self.errors,
+            'invalid': self.errors,
+            'sections': {
+                'running': {'rows': len(days), 'valid': len(days), 'invalid': 0,
+                            'existing': count_existing_days(self.user, 'running', days), 'duplicates': 0},
+            } if days else {},
+            'errors': {},
+        }
@@ -46,10 +46,14 @@ urlpatterns = [
     path('weight/delete/<int:pk>/', views.weight_record_delete, name='weight_delete'),
     path('weight/history/', views.weight_record_history, name='weight_history'),
     
+    # Chart data (JSON, supports If-None-Match)
+    path('<slug:record_type>/history/data/', views.history_chart_data, name='history_chart_data'),
+    
     # Health Goals
     path('goals/', views.health_goal_edit, name='health_goals'),
     
     # Data Import/Export
     path('export-data/', views.export_health_data, name='export_health_data'),
     path('import-data/', views.import_health_data, name='import_health_data'),
+    path('import-data/jobs/<int:pk>/', views.import_job_status, name='import_job_status'),
 ] 
\ No newline at end of file
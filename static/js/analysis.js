@@ -1,6 +1,6 @@
 /**
  * AI Health Advice JavaScript Module
- * Handles generating advice from user health data and formatting the results
+ * Generates advice from user health data, showing it paragraph by paragraph as it is written
  */
 
 document.addEventListener('DOMContentLoaded', function() {
@@ -9,174 +9,150 @@ document.addEventListener('DOMContentLoaded', function() {
   const advicePlaceholder = document.getElementById('advicePlaceholder');
   const adviceLoading = document.getElementById('adviceLoading');
   const adviceContent = document.getElementById('adviceContent');
+  const adviceTimestamp = document.getElementById('adviceTimestamp');
   const adviceError = document.getElementById('adviceError');
   const errorMessage = document.getElementById('errorMessage');
-  
+
   // If we're not on the AI advice page, exit early
   if (!generateBtn) return;
-  
+
+  // Show the saved advice, if there is any
+  if (adviceContent.dataset.hasAdvice === 'true') {
+    advicePlaceholder.classList.add('d-none');
+    adviceContent.classList.remove('d-none');
+    adviceTimestamp.classList.remove('d-none');
+    adviceTimestamp.textContent = `Generated on: ${adviceContent.dataset.createdAt}`;
+  }
+
   // Add click event listener to the generate button
   generateBtn.addEventListener('click', generateAdvice);
-  
+
   /**
-   * Generate advice by calling the backend API
+   * Generate advice through the streaming endpoint
    */
-  function generateAdvice() {
+  async function generateAdvice() {
     // Show loading state
     advicePlaceholder.classList.add('d-none');
     adviceContent.classList.add('d-none');
+    adviceTimestamp.classList.add('d-none');
     adviceError.classList.add('d-none');
     adviceLoading.classList.remove('d-none');
-    
+
     // Set button to loading state
     generateBtn.disabled = true;
     generateBtn.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span> Generating...';
-    
-    // Get CSRF token for the POST request
-    const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
-    
-    // Make API request to generate advice
-    fetch('/analysis/ai-advice/generate/', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'X-CSRFToken': csrfToken
-      },
-      body: JSON.stringify({}),
-    })
-    .then(response => {
+
+    try {
+      const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
+      const response = await fetch(generateBtn.dataset.streamUrl, {
+        method: 'POST',
+        headers: {
+          'X-CSRFToken': csrfToken,
+          'Accept': 'text/event-stream'
+        }
+      });
+
       if (!response.ok) {
-        throw new Error(`HTTP error! Status: ${response.status}`);
+        throw new Error(`Server error (HTTP ${response.status}). Please try again later.`);
       }
-      return response.json();
-    })
-    .then(data => {
-      // Hide loading, show content
-      adviceLoading.classList.add('d-none');
-      
-      if (data.error) {
-        // Show error if something went wrong
-        errorMessage.textContent = data.error;
-        adviceError.classList.remove('d-none');
-      } else {
-        // Format and display the advice
-        adviceContent.innerHTML = formatAdvice(data.advice);
-        adviceContent.classList.remove('d-none');
-        
-        // Add animation classes to elements
-        const elements = adviceContent.querySelectorAll('h3, p, .recommendation-item, .correlation-item');
-        elements.forEach((el, index) => {
-          el.classList.add('animate__animated', 'animate__fadeIn');
-          el.style.animationDelay = `${index * 0.1}s`;
-        });
-      }
-    })
-    .catch(error => {
-      // Handle errors
-      adviceLoading.classList.add('d-none');
-      errorMessage.textContent = error.message || 'Failed to generate advice. Please try again.';
-      adviceError.classList.remove('d-none');
+
+      const paragraphs = [];
+      await readEvents(response, (event, data) => {
+        if (event === 'delta') {
+          showDelta(paragraphs, data.paragraph, data.text);
+        } else if (event === 'error') {
+          showError(data.error);
+        } else {
+          showResult(data);
+        }
+      });
+    } catch (error) {
+      showError(error.message || 'Network or server error. Please try again later.');
       console.error('Error generating advice:', error);
-    })
-    .finally(() => {
+    } finally {
       // Reset button state
       generateBtn.disabled = false;
       generateBtn.innerHTML = '<i class="bi bi-magic me-2"></i> Generate AI Advice';
-    });
+    }
   }
-  
+
   /**
-   * Format the plain text advice into HTML with proper styling
-   * @param {string} adviceText - The raw text response from the API
-   * @return {string} Formatted HTML
+   * Call onEvent(event, data) for every server-sent event of a response as it arrives
+   * @param {Response} response - The fetch response of the streaming endpoint
+   * @param {Function} onEvent - Called with the event name and its parsed JSON data
    */
-  function formatAdvice(adviceText) {
-    // Split the text into sections
-    const sections = adviceText.split(/#{1,2}\s+/);
-    
-    let formattedHtml = '';
-    
-    // Process each section
-    sections.forEach((section, index) => {
-      // Skip the first empty section if it exists
-      if (index === 0 && !section.trim()) return;
-      
-      const lines = section.split('\n');
-      const title = lines[0].trim();
-      const content = lines.slice(1).join('\n').trim();
-      
-      // Add section title and format content based on section type
-      if (title.toLowerCase().includes('summary') || index === 0) {
-        formattedHtml += `<h3></i>${title}</h3>`;
-        formattedHtml += `<div class="advice-body">${formatParagraphs(content)}</div>`;
-      } 
-      else if (title.toLowerCase().includes('strength')) {
-        formattedHtml += `<h3><i class="bi bi-star me-2"></i>${title}</h3>`;
-        formattedHtml += `<div class="advice-body">${formatParagraphs(content)}</div>`;
-      }
-      else if (title.toLowerCase().includes('improv')) {
-        formattedHtml += `<h3><i class="bi bi-arrow-up-circle me-2"></i>${title}</h3>`;
-        formattedHtml += `<div class="advice-body">${formatParagraphs(content)}</div>`;
-      }
-      else if (title.toLowerCase().includes('recommend')) {
-        formattedHtml += `<h3><i class="bi bi-lightbulb me-2"></i>${title}</h3>`;
-        formattedHtml += formatRecommendations(content);
-      }
-      else if (title.toLowerCase().includes('pattern') || title.toLowerCase().includes('correlation')) {
-        formattedHtml += `<h3><i class="bi bi-graph-up me-2"></i>${title}</h3>`;
-        formattedHtml += formatCorrelations(content);
-      }
-      else {
-        formattedHtml += `<h3><i class="bi bi-info-circle me-2"></i>${title}</h3>`;
-        formattedHtml += `<div class="advice-body">${formatParagraphs(content)}</div>`;
+  async function readEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+      // Events end with a blank line
+      let end;
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, end);
+        buffer = buffer.slice(end + 2);
+
+        let event = 'message';
+        let data = '';
+        block.split('\n').forEach(line => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        if (data) onEvent(event, JSON.parse(data));
       }
-    });
-    
-    return formattedHtml;
+      if (done) break;
+    }
   }
-  
+
   /**
-   * Format plain text paragraphs into HTML paragraphs
-   * @param {string} text - Raw text with paragraphs
-   * @return {string} HTML paragraphs
+   * Append streamed text to its paragraph, showing the advice on the first piece
+   * @param {Array} paragraphs - The paragraph elements shown so far
+   * @param {number} index - Paragraph the text belongs to
+   * @param {string} text - The new text
    */
-  function formatParagraphs(text) {
-    return text.split('\n\n')
-      .filter(para => para.trim() !== '')
-      .map(para => `<p>${para.trim()}</p>`)
-      .join('');
+  function showDelta(paragraphs, index, text) {
+    if (paragraphs.length === 0) {
+      adviceLoading.classList.add('d-none');
+      adviceContent.innerHTML = '';
+      adviceContent.classList.remove('d-none');
+    }
+    while (paragraphs.length <= index) {
+      const paragraph = document.createElement('p');
+      adviceContent.appendChild(paragraph);
+      paragraphs.push(paragraph);
+    }
+    paragraphs[index].textContent += text;
   }
-  
+
   /**
-   * Format numbered recommendations into styled list items
-   * @param {string} text - Raw recommendations text
-   * @return {string} HTML formatted recommendations
+   * Show the finished advice, formatted as the saved advice is
+   * @param {Object} data - Data of the 'done' event
    */
-  function formatRecommendations(text) {
-    const recommendations = text.split(/\d+\.\s+/)
-      .filter(item => item.trim() !== '')
-      .map(item => `<div class="recommendation-item">${item.trim()}</div>`)
-      .join('');
-    
-    return `<div class="recommendations mb-4">${recommendations}</div>`;
+  function showResult(data) {
+    if (!data.advice) {
+      showError('Failed to generate advice. Please try again later.');
+      return;
+    }
+    adviceLoading.classList.add('d-none');
+    adviceContent.innerHTML = data.advice;
+    adviceContent.classList.remove('d-none');
+    adviceTimestamp.textContent = `Generated on: ${data.generated_time || 'Unknown'}`;
+    adviceTimestamp.classList.remove('d-none');
   }
-  
+
   /**
-   * Format correlation points into styled list items
-   * @param {string} text - Raw correlation text
-   * @return {string} HTML formatted correlations
+   * Show an error in the error alert, in place of any advice streamed so far
+   * @param {string} message - The error message
    */
-  function formatCorrelations(text) {
-    const items = text.split(/[-•]\s+/)
-      .filter(item => item.trim() !== '')
-      .map(item => {
-        return `<div class="correlation-item">
-          <i class="bi bi-arrow-left-right"></i>
-          <div>${item.trim()}</div>
-        </div>`;
-      })
-      .join('');
-    
-    return `<div class="correlations mb-4">${items}</div>`;
+  function showError(message) {
+    adviceLoading.classList.add('d-none');
+    adviceContent.classList.add('d-none');
+    adviceTimestamp.classList.add('d-none');
+    errorMessage.textContent = message || 'Failed to generate advice. Please try again later.';
+    adviceError.classList.remove('d-none');
   }
-}); 
\ No newline at end of file
+});
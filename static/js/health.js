@@ -58,6 +58,12 @@ document.addEventListener('DOMContentLoaded', function() {
     initDashboard();
   }
 
+  // Poll the progress of a background import started from the dashboard
+  const importJobStatus = document.getElementById('importJobStatus');
+  if (importJobStatus) {
+    pollImportJob(importJobStatus);
+  }
+
   // Health card animations
   animateHealthCards();
   
@@ -68,6 +74,57 @@ document.addEventListener('DOMContentLoaded', function() {
   initInteractions();
 });
 
+// Show the progress of an import job until it has finished
+function pollImportJob(container, interval = 2000) {
+  const message = container.querySelector('.import-job-message');
+  
+  fetch(container.dataset.statusUrl, { headers: { 'Accept': 'application/json' } })
+    .then(response => response.json())
+    .then(job => {
+      if (job.status === 'done') {
+        container.classList.replace('alert-info', job.dry_run && job.report.invalid ? 'alert-warning' : 'alert-success');
+        message.textContent = job.message;
+        if (job.dry_run) {
+          showImportReport(container.querySelector('.import-job-report'), job.report);
+        }
+      } else if (job.status === 'failed') {
+        container.classList.replace('alert-info', 'alert-danger');
+        message.textContent = `Import failed: ${job.error}`;
+      } else {
+        message.textContent = job.status === 'running'
+          ? `Importing... ${job.rows_processed} rows processed`
+          : 'Import queued...';
+        setTimeout(() => pollImportJob(container, interval), interval);
+      }
+    })
+    .catch(error => {
+      console.error('Error loading import progress:', error);
+      setTimeout(() => pollImportJob(container, interval * 2), interval * 2);
+    });
+}
+
+// List a dry run's per-section findings and the first invalid cells of each column
+function showImportReport(list, report) {
+  Object.entries(report.sections).forEach(([section, stats]) => {
+    if (!stats.rows) {
+      return;
+    }
+    const item = document.createElement('li');
+    item.textContent = `${section}: ${stats.valid} valid, ${stats.invalid} invalid, ` +
+      `${stats.existing} for days you already have records, ${stats.duplicates} repeated days`;
+    
+    Object.entries(report.errors[section] || {}).forEach(([column, errors]) => {
+      const details = document.createElement('div');
+      details.textContent = `${column}: ` + errors
+        .map(error => `line ${error.line} "${error.value}" (${error.message})`)
+        .join('; ');
+      item.appendChild(details);
+    });
+    list.appendChild(item);
+  });
+  list.classList.remove('d-none');
+}
+
 // Dashboard Initialization and Data Loading
 function initDashboard() {
   console.log('Initializing health dashboard');